@@ -0,0 +1,108 @@
+"""
+Admission control for the Flask application.
+
+At most `max_in_flight` requests call the endpoint at once and at most `max_queued` more wait
+for a slot. A request that finds the queue full, or that waits longer than its deadline, is
+shed immediately so callers can retry elsewhere instead of every request slowing down together.
+"""
+import contextlib
+import os
+import threading
+import time
+
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_MAX_QUEUED = 16
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 0.5
+DEFAULT_RETRY_AFTER_SECONDS = 1
+
+
+class Shed(Exception):
+    """Raised when a request is rejected by admission control."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded in-flight limit with a short bounded queue and per-request deadlines."""
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, max_queued=DEFAULT_MAX_QUEUED,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT_SECONDS,
+                 retry_after=DEFAULT_RETRY_AFTER_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.shed_queue_full_total = 0
+        self.shed_deadline_total = 0
+
+    @contextlib.contextmanager
+    def admit(self):
+        """Holds an in-flight slot for the duration of the block, raising Shed if none is free."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self):
+        with self.condition:
+            if self.in_flight < self.max_in_flight and self.queued == 0:
+                self.in_flight += 1
+                self.admitted_total += 1
+                return
+            if self.queued >= self.max_queued:
+                self.shed_queue_full_total += 1
+                raise Shed("queue full", self.retry_after)
+
+            self.queued += 1
+            self.queued_total += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed_deadline_total += 1
+                        raise Shed("deadline exceeded while queued", self.retry_after)
+                    self.condition.wait(remaining)
+            finally:
+                self.queued -= 1
+            self.in_flight += 1
+            self.admitted_total += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queued": self.max_queued,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "admitted_total": self.admitted_total,
+                "queued_total": self.queued_total,
+                "shed_total": self.shed_queue_full_total + self.shed_deadline_total,
+                "shed_queue_full_total": self.shed_queue_full_total,
+                "shed_deadline_total": self.shed_deadline_total,
+            }
+
+
+def from_environment():
+    """Builds the controller from the ADMISSION_* environment variables."""
+    return AdmissionController(
+        max_in_flight=int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)),
+        max_queued=int(os.environ.get("ADMISSION_MAX_QUEUED", DEFAULT_MAX_QUEUED)),
+        queue_timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS",
+                                           DEFAULT_QUEUE_TIMEOUT_SECONDS)),
+        retry_after=int(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS",
+                                       DEFAULT_RETRY_AFTER_SECONDS)))
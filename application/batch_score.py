@@ -0,0 +1,185 @@
+"""
+Offline batch scoring for headline files.
+
+Streams an input file (one headline per line) through predictor.preprocess and the
+endpoint, or any local engine exposing a `predict_batch(headlines)` style callable,
+and appends one JSON line per headline to the output file.
+
+Progress is checkpointed after every written batch: the checkpoint records how many
+input lines have been consumed and the matching byte offset in the output file. On
+restart the output is truncated back to that offset and scoring resumes from the
+next unconsumed line, so a crash never duplicates or drops rows. A checkpoint whose output
+file is missing or shorter than the recorded offset is refused rather than resumed: delete
+the checkpoint to start over.
+
+EXAMPLE:
+    python batch_score.py headlines.txt scored.jsonl --workers 8 --batch-size 64
+"""
+import argparse
+import collections
+import importlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_WORKERS = 4
+DEFAULT_ENGINE = "predictor:predict_batch"
+CHECKPOINT_SUFFIX = ".checkpoint"
+LINES_CONSUMED = "lines_consumed"
+OUTPUT_OFFSET = "output_offset"
+REPORT_INTERVAL_SECONDS = 5.0
+
+
+class CheckpointMismatch(Exception):
+    """Raised when the output file does not hold what the checkpoint says was written."""
+
+
+def main():
+    args = parse_args()
+    score_batch = load_engine(args.engine)
+    checkpoint_path = args.checkpoint or f"{args.output}{CHECKPOINT_SUFFIX}"
+    try:
+        run(input_path=args.input,
+            output_path=args.output,
+            checkpoint_path=checkpoint_path,
+            score_batch=score_batch,
+            workers=args.workers,
+            batch_size=args.batch_size)
+    except CheckpointMismatch as e:
+        sys.exit(f"Error: {e}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score a file of headlines, one per line.")
+    parser.add_argument("input", help="Input file with one headline per line")
+    parser.add_argument("output", help="Output JSON lines file, appended to incrementally")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of batches scored concurrently")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Number of headlines sent per scoring call")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE,
+                        help="Scoring callable as module:function, taking a list of headlines")
+    parser.add_argument("--checkpoint", default=None,
+                        help=f"Checkpoint file (default: <output>{CHECKPOINT_SUFFIX})")
+    args = parser.parse_args()
+    if args.workers < 1 or args.batch_size < 1:
+        parser.error("--workers and --batch-size must be positive")
+    return args
+
+
+def load_engine(spec):
+    """Resolves a `module:function` spec into the scoring callable."""
+    module_name, _, function_name = spec.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name)
+
+
+def read_checkpoint(checkpoint_path):
+    """Returns (lines_consumed, output_offset), or (0, 0) when starting fresh."""
+    if not os.path.exists(checkpoint_path):
+        return 0, 0
+    with open(checkpoint_path, "r") as f:
+        checkpoint = json.load(f)
+    return checkpoint[LINES_CONSUMED], checkpoint[OUTPUT_OFFSET]
+
+
+def write_checkpoint(checkpoint_path, lines_consumed, output_offset):
+    """Atomically replaces the checkpoint so a crash mid-write leaves the old one intact."""
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({LINES_CONSUMED: lines_consumed, OUTPUT_OFFSET: output_offset}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path)
+
+
+def read_batches(f, batch_size):
+    """Yields (lines_in_batch, headlines) so blank lines still advance the checkpoint."""
+    while True:
+        lines = list(itertools.islice(f, batch_size))
+        if not lines:
+            return
+        headlines = [line.strip() for line in lines if line.strip()]
+        yield len(lines), headlines
+
+
+def score(score_batch, headlines):
+    if not headlines:
+        return []
+    results = score_batch(headlines)
+    return [{"headline": headline, **result} for headline, result in zip(headlines, results)]
+
+
+def check_output(checkpoint_path, output_path, output_offset):
+    """Raises CheckpointMismatch unless the output holds the checkpointed `output_offset` bytes."""
+    if not os.path.exists(checkpoint_path):
+        return
+    if not os.path.exists(output_path):
+        raise CheckpointMismatch(f"{checkpoint_path} exists but {output_path} is missing, "
+                                 f"delete the checkpoint to start over")
+    output_size = os.path.getsize(output_path)
+    if output_size < output_offset:
+        raise CheckpointMismatch(f"{output_path} has {output_size} bytes, fewer than the "
+                                 f"{output_offset} recorded in {checkpoint_path}, delete the "
+                                 f"checkpoint to start over")
+
+
+def run(input_path, output_path, checkpoint_path, score_batch, workers, batch_size):
+    lines_consumed, output_offset = read_checkpoint(checkpoint_path)
+    check_output(checkpoint_path, output_path, output_offset)
+    if lines_consumed:
+        print(f"Resuming from checkpoint: {lines_consumed} lines already scored", file=sys.stderr)
+
+    mode = "r+" if os.path.exists(output_path) else "w"
+    with open(input_path, "r") as input_file, \
+            open(output_path, mode) as output_file, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        # drop anything written after the last checkpoint
+        output_file.seek(output_offset)
+        output_file.truncate()
+        for _ in itertools.islice(input_file, lines_consumed):
+            pass
+
+        # keep a bounded window of in-flight batches and write them back in input order
+        pending = collections.deque()
+        max_pending = workers * 2
+        rows_scored = 0
+        started_at = last_report_at = time.monotonic()
+
+        def drain_one():
+            nonlocal lines_consumed, rows_scored
+            n_lines, future = pending.popleft()
+            for row in future.result():
+                output_file.write(json.dumps(row) + "\n")
+                rows_scored += 1
+            output_file.flush()
+            os.fsync(output_file.fileno())
+            lines_consumed += n_lines
+            write_checkpoint(checkpoint_path, lines_consumed, output_file.tell())
+
+        for n_lines, headlines in read_batches(input_file, batch_size):
+            pending.append((n_lines, executor.submit(score, score_batch, headlines)))
+            if len(pending) >= max_pending:
+                drain_one()
+            now = time.monotonic()
+            if now - last_report_at >= REPORT_INTERVAL_SECONDS:
+                report(rows_scored, now - started_at)
+                last_report_at = now
+        while pending:
+            drain_one()
+
+    report(rows_scored, time.monotonic() - started_at)
+    print(f"Done: {lines_consumed} lines consumed, output in {output_path}", file=sys.stderr)
+
+
+def report(rows_scored, elapsed):
+    rate = rows_scored / elapsed if elapsed > 0 else 0.0
+    print(f"{rows_scored} rows scored in {elapsed:.1f}s ({rate:.1f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
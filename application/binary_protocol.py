@@ -0,0 +1,126 @@
+"""
+Compact binary batch protocol for internal callers of POST /analyze/batch.
+
+A request or response body is a sequence of frames. Each frame is a 4-byte big-endian length
+followed by that many bytes of MessagePack, so one HTTP round trip can carry several batches
+and a reader never has to scan for delimiters.
+
+Request frame:  {"headlines": [str, ...], "model_version": int | str | None}
+Response frame: {"labels": bin, "probabilities": bin}
+
+`labels` holds one uint8 label ID per headline, indexing LABELS, and `probabilities` holds one
+little-endian float32 per headline. Response frames are in the same order as request frames.
+"""
+import struct
+import urllib.request
+
+import msgpack
+
+CONTENT_TYPE = "application/x-msgpack"
+LABELS = ["bad", "good", "neutral"]
+LABEL_IDS = {label: label_id for (label_id, label) in enumerate(LABELS)}
+# guards the server against a corrupt or hostile length prefix
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+# bound the work one admitted request can carry, POST /analyze/batch answers larger bodies 413
+MAX_REQUEST_BYTES = 1024 * 1024
+MAX_FRAMES_PER_REQUEST = 32
+MAX_HEADLINES_PER_REQUEST = 2048
+HTTP_TIMEOUT_SECONDS = 10
+
+_LENGTH = struct.Struct(">I")
+
+
+class ProtocolError(ValueError):
+    """Raised when a body is not a valid sequence of frames."""
+
+
+def encode_frames(messages):
+    """Packs each message into a length-prefixed MessagePack frame."""
+    frames = []
+    for message in messages:
+        payload = msgpack.packb(message, use_bin_type=True)
+        frames.append(_LENGTH.pack(len(payload)))
+        frames.append(payload)
+    return b"".join(frames)
+
+
+def decode_frames(body):
+    """Unpacks every length-prefixed MessagePack frame of `body`."""
+    messages = []
+    view = memoryview(body)
+    offset = 0
+    while offset < len(view):
+        if offset + _LENGTH.size > len(view):
+            raise ProtocolError("truncated length prefix")
+        (length,) = _LENGTH.unpack_from(view, offset)
+        offset += _LENGTH.size
+        if length > MAX_FRAME_BYTES:
+            raise ProtocolError(f"frame of {length} bytes exceeds {MAX_FRAME_BYTES}")
+        if offset + length > len(view):
+            raise ProtocolError("truncated frame")
+        messages.append(msgpack.unpackb(view[offset:offset + length], raw=False))
+        offset += length
+    return messages
+
+
+def encode_request(batches, model_version=None):
+    """Encodes lists of headlines, one frame per list."""
+    return encode_frames({"headlines": list(headlines), "model_version": model_version}
+                         for headlines in batches)
+
+
+def decode_request(body):
+    """Returns (headlines, model_version) pairs, one per request frame.
+
+    Raises:
+        ProtocolError: The body is malformed or exceeds MAX_FRAMES_PER_REQUEST or
+            MAX_HEADLINES_PER_REQUEST.
+    """
+    requests = []
+    headline_count = 0
+    for message in decode_frames(body):
+        if not isinstance(message, dict) or not isinstance(message.get("headlines"), list):
+            raise ProtocolError("request frame must be a map with a 'headlines' list")
+        if not all(isinstance(headline, str) for headline in message["headlines"]):
+            raise ProtocolError("headlines must be strings")
+        if not isinstance(message.get("model_version"), (int, str, type(None))):
+            raise ProtocolError("model_version must be an integer or a string")
+        headline_count += len(message["headlines"])
+        if len(requests) == MAX_FRAMES_PER_REQUEST:
+            raise ProtocolError(f"more than {MAX_FRAMES_PER_REQUEST} frames")
+        if headline_count > MAX_HEADLINES_PER_REQUEST:
+            raise ProtocolError(f"more than {MAX_HEADLINES_PER_REQUEST} headlines")
+        requests.append((message["headlines"], message.get("model_version")))
+    return requests
+
+
+def encode_results(batches):
+    """Encodes lists of predictor results, one frame per list."""
+    return encode_frames(pack_results(results) for results in batches)
+
+
+def pack_results(results):
+    return {
+        "labels": bytes(LABEL_IDS[result["sentiment"]] for result in results),
+        "probabilities": struct.pack(f"<{len(results)}f",
+                                     *(result["probability"] for result in results)),
+    }
+
+
+def decode_results(body):
+    """Returns lists of {"sentiment", "probability"} results, one per response frame."""
+    batches = []
+    for message in decode_frames(body):
+        labels = message["labels"]
+        probabilities = struct.unpack(f"<{len(labels)}f", message["probabilities"])
+        batches.append([{"sentiment": LABELS[label_id], "probability": probability}
+                        for (label_id, probability) in zip(labels, probabilities)])
+    return batches
+
+
+def analyze_batches(url, batches, model_version=None, timeout=HTTP_TIMEOUT_SECONDS):
+    """Client helper, scores lists of headlines with one POST to `url` (.../analyze/batch)."""
+    request = urllib.request.Request(url, data=encode_request(batches, model_version),
+                                     headers={"Content-Type": CONTENT_TYPE}, method="POST")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return decode_results(response.read())
@@ -0,0 +1,196 @@
+"""
+Two-tier model cascade in front of the endpoint.
+
+The first tier is the linear classifier the Preprocessing step trains next to each model and
+registers with its model package, in the FirstTierUri metadata property. It scores normalized
+headlines in-process with first_tier_model.predict, the code the pipeline evaluates it with.
+Headlines it scores at or above `threshold` are answered directly; only the rest are escalated
+to the BlazingText endpoint.
+
+The first tier follows the model package serving the endpoint. While that is unknown, or the
+package has no first tier, every headline is escalated. CASCADE_FIRST_TIER_URI pins one
+first_tier.json instead.
+
+A small `audit_rate` share of the confident headlines is escalated as well. For those the
+endpoint's answer is returned, and its agreement with the first tier estimates the accuracy
+cost of not escalating.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+import first_tier_model
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_AUDIT_RATE = 0.02
+FIRST_TIER_URI_PROPERTY = "FirstTierUri"
+# a first tier that failed to load is retried after this long
+LOAD_RETRY_SECONDS = 60
+_NOT_LOADED = object()
+
+
+class FirstTierModel:
+    """The exported first-tier classifier."""
+
+    def __init__(self, model):
+        self.model = model
+
+    @classmethod
+    def load(cls, uri):
+        """Loads first_tier.json from a local path or an s3:// URI."""
+        if uri.startswith("s3://"):
+            bucket, _, key = uri.replace("s3://", "", 1).partition("/")
+            body = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read()
+        else:
+            with open(uri, "rb") as f:
+                body = f.read()
+        return cls(json.loads(body))
+
+    def predict(self, line):
+        """Returns (label, probability) of the most likely label of a normalized headline."""
+        return first_tier_model.predict(self.model, line)
+
+
+def load_for_model_package(model_package_name):
+    """Loads the first tier registered with a model package, None if it has none."""
+    sagemaker_client = boto3.client("sagemaker")
+    model_package = sagemaker_client.describe_model_package(ModelPackageName=model_package_name)
+    uri = model_package.get("CustomerMetadataProperties", {}).get(FIRST_TIER_URI_PROPERTY)
+    if uri is None:
+        logging.warning(f"{model_package_name} has no {FIRST_TIER_URI_PROPERTY}, "
+                        f"escalating every headline")
+        return None
+    return FirstTierModel.load(uri)
+
+
+class Cascade:
+    """Answers confident headlines with the first tier and escalates the others.
+
+    `loader(model_version)` returns the FirstTierModel of a model version, or None.
+    """
+
+    def __init__(self, loader, threshold=DEFAULT_THRESHOLD, audit_rate=DEFAULT_AUDIT_RATE):
+        self.loader = loader
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.model_lock = threading.Lock()
+        self.model_version = _NOT_LOADED
+        self.model = None
+        self.loaded_at = 0.0
+        # version whose first tier is being loaded, outside model_lock
+        self.loading = _NOT_LOADED
+        self.lock = threading.Lock()
+        self.total = 0
+        self.escalated = 0
+        self.audited = 0
+        self.audit_agreed = 0
+
+    def get_model(self, model_version):
+        """Returns the first tier of `model_version`, loading it when the version changed.
+
+        The load runs outside model_lock, so a slow download only holds up the request that
+        started it. Requests for the version meanwhile get the first tier loaded before, or
+        None, which escalates their headlines, if that belongs to another version.
+        """
+        with self.model_lock:
+            current = model_version == self.model_version
+            retry = self.model is None and \
+                time.monotonic() - self.loaded_at > LOAD_RETRY_SECONDS
+            if (current and not retry) or self.loading == model_version:
+                return self.model if current else None
+            self.loading = model_version
+
+        model = None
+        try:
+            model = self.loader(model_version)
+        except (BotoCoreError, ClientError, OSError, ValueError, KeyError):
+            logging.exception(f"Unable to load the first tier of {model_version}")
+        finally:
+            with self.model_lock:
+                # unless a load of another version started since
+                if self.loading == model_version:
+                    self.model = model
+                    self.model_version = model_version
+                    self.loaded_at = time.monotonic()
+                    self.loading = _NOT_LOADED
+        return model
+
+    def score(self, lines, escalate, model_version=None):
+        """Scores normalized headlines, calling `escalate(lines)` once for the uncertain ones.
+
+        `model_version` is the model serving the endpoint, whose first tier is used.
+        """
+        model = self.get_model(model_version)
+        results = [None] * len(lines)
+        escalated_indices = []
+        audited_labels = {}
+        for (i, line) in enumerate(lines):
+            if model is None:
+                escalated_indices.append(i)
+                continue
+            label, probability = model.predict(line)
+            if probability < self.threshold:
+                escalated_indices.append(i)
+            elif random.random() < self.audit_rate:
+                escalated_indices.append(i)
+                audited_labels[i] = label
+            else:
+                results[i] = {"sentiment": label, "probability": probability}
+
+        if escalated_indices:
+            escalated_results = escalate([lines[i] for i in escalated_indices])
+            for (i, result) in zip(escalated_indices, escalated_results):
+                results[i] = result
+
+        with self.lock:
+            self.total += len(lines)
+            self.escalated += len(escalated_indices) - len(audited_labels)
+            self.audited += len(audited_labels)
+            self.audit_agreed += sum(results[i]["sentiment"] == label
+                                     for (i, label) in audited_labels.items())
+        return results
+
+    def stats(self):
+        with self.model_lock:
+            model_version = None if self.model_version is _NOT_LOADED else self.model_version
+            first_tier_loaded = self.model is not None
+        with self.lock:
+            return {
+                "model_version": model_version,
+                "first_tier_loaded": first_tier_loaded,
+                "threshold": self.threshold,
+                "audit_rate": self.audit_rate,
+                "total": self.total,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / self.total if self.total else None,
+                "audited": self.audited,
+                # share of confident first-tier answers the endpoint agrees with
+                "audit_agreement": self.audit_agreed / self.audited if self.audited else None,
+            }
+
+
+def from_environment():
+    """Builds the cascade from the CASCADE_* environment variables, None when disabled.
+
+    CASCADE_ENABLED=true follows the first tier registered with the serving model package,
+    CASCADE_FIRST_TIER_URI pins a first_tier.json from a local path or an s3:// URI instead.
+    """
+    model_uri = os.environ.get("CASCADE_FIRST_TIER_URI")
+    if model_uri:
+        model = FirstTierModel.load(model_uri)
+        loader = lambda model_version: model
+    elif os.environ.get("CASCADE_ENABLED", "").lower() == "true":
+        loader = lambda model_version: \
+            load_for_model_package(model_version) if model_version else None
+    else:
+        return None
+    return Cascade(
+        loader,
+        threshold=float(os.environ.get("CASCADE_CONFIDENCE_THRESHOLD", DEFAULT_THRESHOLD)),
+        audit_rate=float(os.environ.get("CASCADE_AUDIT_RATE", DEFAULT_AUDIT_RATE)))
@@ -0,0 +1,311 @@
+"""
+Continuous headline ingestion.
+
+Polls a set of feed sources, normalizes headlines with predictor.preprocess, drops the
+ones already seen and feeds the rest to batched scoring through a bounded queue. When
+scoring slows down the queue fills up and pollers block on `put`, so sources are not
+read faster than the endpoint can keep up.
+
+A headline only counts as seen once it has been scored and written to the sink. Failed
+batches are retried with exponential backoff; a batch that still fails after
+MAX_SCORE_ATTEMPTS is logged and its headlines are accepted again the next time a
+source offers them.
+
+Sources are pluggable: anything with an async `fetch()` returning a list of raw
+headlines works, see FeedSource. FileSource and HttpSource cover local files and simple HTTP feeds.
+
+EXAMPLE:
+    python ingestion.py --file headlines.txt --url http://localhost:8000/feed --interval 30
+"""
+import argparse
+import array
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import typing
+import urllib.request
+
+import predictor
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_SEEN_CAPACITY = 1_000_000
+DEFAULT_POLL_INTERVAL_SECONDS = 30.0
+BATCH_LINGER_SECONDS = 0.5
+HTTP_TIMEOUT_SECONDS = 10
+MAX_SCORE_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 1.0
+MAX_RETRY_BACKOFF_SECONDS = 30.0
+
+
+class FeedSource(typing.Protocol):
+    """Headline source polled by the ingestion worker."""
+    name: str
+
+    async def fetch(self):
+        """Returns the raw headlines currently available from the source."""
+        ...
+
+
+class FileSource(FeedSource):
+    """
+    Reads headlines appended to a local file, one per line, since the last poll.
+
+    A file that shrank below the read offset or was replaced by another one, e.g. truncated or
+    rotated, is read again from the start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = f"file:{path}"
+        self.offset = 0
+        self.inode = None
+
+    async def fetch(self):
+        return await asyncio.to_thread(self._read_new_lines)
+
+    def _read_new_lines(self):
+        with open(self.path, "r") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < self.offset or stat.st_ino != self.inode:
+                self.offset = 0
+                self.inode = stat.st_ino
+            f.seek(self.offset)
+            lines = f.readlines()
+            self.offset = f.tell()
+        return [line.strip() for line in lines if line.strip()]
+
+
+class HttpSource(FeedSource):
+    """Fetches headlines from a URL returning either a JSON list of strings or plain text lines."""
+
+    def __init__(self, url):
+        self.url = url
+        self.name = f"http:{url}"
+
+    async def fetch(self):
+        return await asyncio.to_thread(self._get)
+
+    def _get(self):
+        with urllib.request.urlopen(self.url, timeout=HTTP_TIMEOUT_SECONDS) as response:
+            body = response.read().decode()
+        try:
+            headlines = json.loads(body)
+        except ValueError:
+            headlines = None
+        if not isinstance(headlines, list):
+            # anything but a JSON list, e.g. a headline that happens to parse as a number, is text
+            headlines = body.splitlines()
+        return [headline.strip() for headline in headlines
+                if isinstance(headline, str) and headline.strip()]
+
+
+def digest(headline):
+    """8-byte fingerprint of a normalized headline, never 0 since 0 marks an empty slot."""
+    value = int.from_bytes(hashlib.blake2b(headline.encode(), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class SeenSet:
+    """
+    Bounded set of normalized headline digests.
+
+    Digests live in two flat 8-byte arrays: a ring buffer in insertion order, used to evict
+    the oldest entry once `capacity` is reached, and an open-addressing hash table at most
+    half full, used for lookups. That is 24 to 40 bytes per entry (25 MB at the default
+    capacity), fixed when the set is created, however long the worker runs.
+    """
+
+    def __init__(self, capacity=DEFAULT_SEEN_CAPACITY):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.order = array.array("Q", [0]) * capacity
+        self.table_size = 1 << max(1, (2 * capacity - 1).bit_length())
+        self.table = array.array("Q", [0]) * self.table_size
+        self.count = 0
+        self.next = 0
+
+    def __contains__(self, value):
+        return self.table[self._find(value)] == value
+
+    def add(self, value):
+        """Records a digest, returning False if it was already present."""
+        slot = self._find(value)
+        if self.table[slot] == value:
+            return False
+        if self.count == self.capacity:
+            self._remove(self.order[self.next])
+            slot = self._find(value)
+        else:
+            self.count += 1
+        self.table[slot] = value
+        self.order[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, value):
+        """Slot holding `value`, or the empty slot where it would go (linear probing)."""
+        mask = self.table_size - 1
+        slot = value & mask
+        while self.table[slot] not in (0, value):
+            slot = (slot + 1) & mask
+        return slot
+
+    def _remove(self, value):
+        """Deletes with backward shifting, so no tombstones are needed."""
+        mask = self.table_size - 1
+        hole = self._find(value)
+        self.table[hole] = 0
+        slot = (hole + 1) & mask
+        while self.table[slot]:
+            home = self.table[slot] & mask
+            # move the entry into the hole unless its home lies cyclically in (hole, slot]
+            if (slot - home) & mask >= (slot - hole) & mask:
+                self.table[hole] = self.table[slot]
+                self.table[slot] = 0
+                hole = slot
+            slot = (slot + 1) & mask
+
+
+class IngestionWorker:
+    """Polls sources and scores new headlines in batches behind a bounded queue."""
+
+    def __init__(self, sources, sink, score_batch=predictor.predict_batch,
+                 batch_size=DEFAULT_BATCH_SIZE, queue_size=DEFAULT_QUEUE_SIZE,
+                 poll_interval=DEFAULT_POLL_INTERVAL_SECONDS, seen=None):
+        self.sources = sources
+        self.sink = sink
+        self.score_batch = score_batch
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.seen = seen if seen is not None else SeenSet()
+        # digests queued or being scored, not yet in `seen`
+        self.pending = set()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.duplicates = 0
+        self.scored = 0
+        self.failed = 0
+
+    async def run(self):
+        pollers = [asyncio.create_task(self.poll(source)) for source in self.sources]
+        scorer = asyncio.create_task(self.score_forever())
+        await asyncio.gather(*pollers, scorer)
+
+    async def poll(self, source):
+        while True:
+            try:
+                headlines = await source.fetch()
+            except Exception:
+                logging.exception(f"Failed to fetch from {source.name}")
+                headlines = []
+            for headline in headlines:
+                await self.enqueue(headline)
+            await asyncio.sleep(self.poll_interval)
+
+    async def enqueue(self, headline):
+        """Normalizes and dedups the headline, blocking while the queue is full."""
+        normalized = predictor.preprocess(headline)
+        key = digest(normalized)
+        if not normalized or key in self.pending or key in self.seen:
+            self.duplicates += 1
+            return
+        self.pending.add(key)
+        await self.queue.put((headline, normalized, key))
+
+    async def score_forever(self):
+        while True:
+            batch = await self.next_batch()
+            try:
+                results = await self.score_with_retries(batch)
+            finally:
+                for (_, _, key) in batch:
+                    self.pending.discard(key)
+                    self.queue.task_done()
+            if results is None:
+                self.failed += len(batch)
+                logging.error(f"Dropped batch after {MAX_SCORE_ATTEMPTS} attempts, it is "
+                              f"accepted again when re-offered: {[h for (h, _, _) in batch]}")
+                continue
+            for (headline, _, key), result in zip(batch, results):
+                self.sink({"headline": headline, **result})
+                self.seen.add(key)
+            self.scored += len(batch)
+            logging.info(f"scored={self.scored}, duplicates={self.duplicates}, "
+                         f"failed={self.failed}, queued={self.queue.qsize()}, "
+                         f"seen={len(self.seen)}")
+
+    async def score_with_retries(self, batch):
+        """Scores the batch, backing off between attempts. Returns None if every attempt failed."""
+        backoff = RETRY_BACKOFF_SECONDS
+        for attempt in range(1, MAX_SCORE_ATTEMPTS + 1):
+            try:
+                return await asyncio.to_thread(
+                    self.score_batch, [normalized for (_, normalized, _) in batch])
+            except Exception:
+                logging.exception(f"Attempt {attempt} to score batch of {len(batch)} "
+                                  f"headlines failed")
+            if attempt < MAX_SCORE_ATTEMPTS:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RETRY_BACKOFF_SECONDS)
+        return None
+
+    async def next_batch(self):
+        """Waits for one headline, then gathers more for up to BATCH_LINGER_SECONDS."""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + BATCH_LINGER_SECONDS
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+
+def print_sink(row):
+    print(json.dumps(row), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously ingest and score headlines.")
+    parser.add_argument("--file", action="append", default=[], help="Local file source")
+    parser.add_argument("--url", action="append", default=[], help="HTTP feed source")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL_SECONDS,
+                        help="Seconds between polls of each source")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--seen-capacity", type=int, default=DEFAULT_SEEN_CAPACITY)
+    args = parser.parse_args()
+    if args.seen_capacity < 1:
+        parser.error("--seen-capacity must be at least 1")
+
+    sources = [FileSource(path) for path in args.file] + [HttpSource(url) for url in args.url]
+    if not sources:
+        parser.error("at least one --file or --url source is required")
+
+    logging.basicConfig(level=logging.INFO)
+
+    worker = IngestionWorker(sources=sources,
+                             sink=print_sink,
+                             batch_size=args.batch_size,
+                             queue_size=args.queue_size,
+                             poll_interval=args.interval,
+                             seen=SeenSet(args.seen_capacity))
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Local multi-model engine.
+
+Keeps several versions of the news-headlines model package warm in one process. A version is
+loaded the first time it is requested: its artifacts are read from the model package, extracted
+and loaded with fastText (BlazingText supervised models are fastText compatible). At most
+`capacity` versions stay loaded, the least recently used one is evicted first.
+
+Only approved versions can be loaded. The approved versions are listed from the model package
+group and re-listed at most every APPROVED_VERSIONS_REFRESH_SECONDS, or fixed with the
+MODEL_VERSION_ALLOWLIST environment variable.
+"""
+import collections
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+
+import boto3
+import fasttext
+from botocore.exceptions import BotoCoreError, ClientError
+
+MODEL_PACKAGE_GROUP_NAME = "news-headlines"
+MODEL_BIN_FILE_NAME = "model.bin"
+DEFAULT_CAPACITY = 3
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "news-headlines-models")
+APPROVED_VERSIONS_REFRESH_SECONDS = 60
+# cold-load timings kept for /metrics
+MAX_LOAD_STATS = 32
+
+
+class InvalidModelVersion(ValueError):
+    """Raised when a model version is not a version number."""
+
+
+class UnknownModelVersion(LookupError):
+    """Raised when a model version is not an approved version of the model package group."""
+
+
+class ApprovedVersionsUnavailable(RuntimeError):
+    """Raised when the approved versions cannot be listed, e.g. the SageMaker API throttles."""
+
+
+def validate_version(version):
+    """Returns the version as a canonical string, raising InvalidModelVersion if malformed."""
+    version = str(version)
+    if not version.isdigit() or len(version) > 9:
+        raise InvalidModelVersion(f"model_version must be a version number, got {version!r}")
+    return str(int(version))
+
+
+def list_approved_versions():
+    """Lists the version numbers of the approved packages of the model package group."""
+    sagemaker_client = boto3.client("sagemaker")
+    paginator = sagemaker_client.get_paginator("list_model_packages")
+    versions = set()
+    for page in paginator.paginate(ModelPackageGroupName=MODEL_PACKAGE_GROUP_NAME,
+                                   ModelApprovalStatus="Approved"):
+        for package in page["ModelPackageSummaryList"]:
+            versions.add(str(package["ModelPackageVersion"]))
+    return versions
+
+
+def load_model_version(version, cache_dir=DEFAULT_CACHE_DIR):
+    """Downloads and loads the model of version `version` of the model package group."""
+    sagemaker_client = boto3.client("sagemaker")
+    s3_client = boto3.client("s3")
+    try:
+        model_package = sagemaker_client.describe_model_package(
+            ModelPackageName=f"{MODEL_PACKAGE_GROUP_NAME}/{version}")
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("ValidationException", "ResourceNotFound"):
+            raise UnknownModelVersion(f"model version {version} does not exist") from e
+        raise
+    model_data_url = model_package["InferenceSpecification"]["Containers"][0]["ModelDataUrl"]
+    bucket, _, key = model_data_url.replace("s3://", "", 1).partition("/")
+
+    version_dir = os.path.join(cache_dir, str(version))
+    os.makedirs(version_dir, exist_ok=True)
+    archive_path = os.path.join(version_dir, "model.tar.gz")
+    s3_client.download_file(bucket, key, archive_path)
+    with tarfile.open(archive_path) as archive:
+        archive.extractall(version_dir, members=safe_members(archive, version_dir))
+    os.remove(archive_path)
+    return fasttext.load_model(os.path.join(version_dir, MODEL_BIN_FILE_NAME))
+
+
+def remove_model_version(version, cache_dir=DEFAULT_CACHE_DIR):
+    """Deletes the extracted artifacts of version `version`."""
+    shutil.rmtree(os.path.join(cache_dir, str(version)), ignore_errors=True)
+
+
+def safe_members(archive, destination):
+    """Yields the regular files and directories of `archive` that extract inside `destination`."""
+    root = os.path.realpath(destination)
+    for member in archive.getmembers():
+        target = os.path.realpath(os.path.join(root, member.name))
+        if not (member.isfile() or member.isdir()) or os.path.commonpath([root, target]) != root:
+            raise tarfile.TarError(f"refusing to extract {member.name!r}")
+        yield member
+
+
+class ModelCache:
+    """Thread-safe LRU cache of loaded model versions with load time and occupancy metrics."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, loader=load_model_version,
+                 approved_versions=list_approved_versions, remover=remove_model_version):
+        self.capacity = capacity
+        self.loader = loader
+        self.remover = remover
+        self.approved_versions = approved_versions
+        self.models = collections.OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+        self.cold_load_seconds = collections.OrderedDict()
+        self.approved = set()
+        self.approved_fetched_at = None
+
+    def get(self, version):
+        """Returns the loaded model of `version`, loading it and evicting the LRU one if needed.
+
+        Raises:
+            InvalidModelVersion: The version is not a version number.
+            UnknownModelVersion: The version is not approved.
+            ApprovedVersionsUnavailable: The approved versions could not be listed.
+        """
+        version = validate_version(version)
+        with self.lock:
+            if version in self.models:
+                self.models.move_to_end(version)
+                self.hits += 1
+                return self.models[version]
+        self.check_approved(version)
+
+        with self.lock:
+            # one loader per version, other versions stay servable while it loads
+            loading_lock = self.loading.setdefault(version, threading.Lock())
+
+        with loading_lock:
+            with self.lock:
+                if version in self.models:
+                    self.models.move_to_end(version)
+                    self.hits += 1
+                    return self.models[version]
+                self.misses += 1
+            try:
+                started_at = time.perf_counter()
+                model = self.loader(version)
+                load_seconds = time.perf_counter() - started_at
+            except Exception:
+                with self.lock:
+                    self.loading.pop(version, None)
+                raise
+
+            with self.lock:
+                # published and unregistered together, so no request can start a second load
+                self.models[version] = model
+                self.loading.pop(version, None)
+                self.cold_load_seconds[version] = round(load_seconds, 3)
+                self.cold_load_seconds.move_to_end(version)
+                while len(self.cold_load_seconds) > MAX_LOAD_STATS:
+                    self.cold_load_seconds.popitem(last=False)
+                while len(self.models) > self.capacity:
+                    (evicted_version, _) = self.models.popitem(last=False)
+                    # under the lock: an evicted version cannot be loading again meanwhile
+                    self.remover(evicted_version)
+                    self.evictions += 1
+        return model
+
+    def check_approved(self, version):
+        """Raises UnknownModelVersion unless `version` is approved, re-listing when stale.
+
+        Raises:
+            ApprovedVersionsUnavailable: The approved versions could not be re-listed.
+        """
+        with self.lock:
+            now = time.monotonic()
+            approved = self.approved
+            stale = self.approved_fetched_at is None or \
+                now - self.approved_fetched_at > APPROVED_VERSIONS_REFRESH_SECONDS
+        if version not in approved and stale:
+            try:
+                approved = set(self.approved_versions())
+            except (BotoCoreError, ClientError) as e:
+                raise ApprovedVersionsUnavailable(
+                    f"unable to list the approved model versions: {e}") from e
+            with self.lock:
+                self.approved = approved
+                self.approved_fetched_at = now
+        if version not in approved:
+            with self.lock:
+                self.rejected += 1
+            raise UnknownModelVersion(f"model version {version} is not approved")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "capacity": self.capacity,
+                "loaded_versions": list(self.models),
+                "occupancy": len(self.models) / self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "rejected": self.rejected,
+                "cold_load_seconds": dict(self.cold_load_seconds),
+            }
+
+
+def from_environment():
+    """Builds the cache sized by MODEL_CACHE_CAPACITY, storing artifacts in MODEL_CACHE_DIR.
+
+    MODEL_VERSION_ALLOWLIST, a comma separated list of versions, replaces the lookup of the
+    approved versions.
+    """
+    cache_dir = os.environ.get("MODEL_CACHE_DIR", DEFAULT_CACHE_DIR)
+    approved_versions = list_approved_versions
+    if os.environ.get("MODEL_VERSION_ALLOWLIST"):
+        allowlist = {validate_version(version.strip())
+                     for version in os.environ["MODEL_VERSION_ALLOWLIST"].split(",")}
+        approved_versions = lambda: allowlist
+    return ModelCache(
+        capacity=int(os.environ.get("MODEL_CACHE_CAPACITY", DEFAULT_CAPACITY)),
+        loader=lambda version: load_model_version(version, cache_dir=cache_dir),
+        approved_versions=approved_versions,
+        remover=lambda version: remove_model_version(version, cache_dir=cache_dir))
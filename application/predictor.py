@@ -1,28 +1,223 @@
 import boto3
+import botocore.config
 import json
+import logging
 import nltk
+import os
+import threading
+import time
+from botocore.exceptions import BotoCoreError, ClientError
 from nltk.tokenize import RegexpTokenizer
 
+import cascade
+import model_cache
+import result_store
+
 nltk.download('punkt')
 
 ENDPOINT_NAME = "news-headlines-endpoint"
+MODEL_VERSION_REFRESH_SECONDS = 60
+# bounds how long an admitted online request can hold its slot waiting on the endpoint, retries
+# are disabled so one call takes at most connect + read timeout instead of that times the attempts
+ENDPOINT_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("ENDPOINT_CONNECT_TIMEOUT_SECONDS", 1))
+ENDPOINT_READ_TIMEOUT_SECONDS = float(os.environ.get("ENDPOINT_READ_TIMEOUT_SECONDS", 2))
+# large batches are split into several calls, each within the endpoint's 6 MB payload limit
+# and small enough to be scored within the read timeout
+ENDPOINT_MAX_INSTANCES = 512
+ENDPOINT_MAX_PAYLOAD_BYTES = 5 * 1024 * 1024
 
 tokenizer = RegexpTokenizer(r'\w+')
-sm_client = boto3.client("sagemaker-runtime")
+# offline callers (batch_score.py, ingestion.py) keep the SDK's bounded retries
+sm_client = boto3.client("sagemaker-runtime", config=botocore.config.Config(
+    retries={"mode": "standard"},
+))
+# requests served by server.py, which sheds load instead of retrying
+online_sm_client = boto3.client("sagemaker-runtime", config=botocore.config.Config(
+    connect_timeout=ENDPOINT_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=ENDPOINT_READ_TIMEOUT_SECONDS,
+    retries={"total_max_attempts": 1, "mode": "standard"},
+))
+sagemaker_client = boto3.client("sagemaker")
+store = result_store.from_environment()
+models = model_cache.from_environment()
+model_cascade = cascade.from_environment()
+
+_model_version = None
+_model_version_fetched_at = None
+_model_version_lock = threading.Lock()
+
+
+def predict(headline, model_version=None, online=False):
+    return predict_batch([headline], model_version=model_version, online=online)[0]
+
+
+def predict_batch(headlines, model_version=None, online=False):
+    """
+    Scores several headlines with a single invoke_endpoint round trip.
+
+    Results already in the result store for the model version serving the request are served
+    from there, only the misses are sent to the endpoint and then written back. The store is
+    skipped while the endpoint's serving model is ambiguous, and a failing store only costs the
+    hits: reads count as misses and failed writes are dropped.
+
+    When `model_version` names a version of the news-headlines model package group, the
+    headlines are scored in-process by that version from the local multi-model cache
+    instead of the endpoint. Otherwise, when the cascade is enabled, only the headlines the
+    serving model's first tier is unsure about reach the endpoint. First-tier answers are not
+    stored, the store only holds answers of the model its key names.
+
+    `online` requests call the endpoint once, without retries, see online_sm_client.
+    """
+    normalized = [preprocess(headline) for headline in headlines]
+    if model_version is not None:
+        model_version = model_cache.validate_version(model_version)
+        serving_version = f"{model_cache.MODEL_PACKAGE_GROUP_NAME}/{model_version}"
+    elif isinstance(store, result_store.NullResultStore) and model_cascade is None:
+        serving_version = None
+    else:
+        serving_version = get_model_version()
+
+    if serving_version is None:
+        # nothing is stored, the normalized headlines only deduplicate the batch
+        keys = normalized
+        found = {}
+    else:
+        keys = [result_store.make_key(serving_version, line) for line in normalized]
+        found = read_store(keys)
+
+    misses = list(dict.fromkeys(
+        (key, line) for (key, line) in zip(keys, normalized) if key not in found))
+    if misses:
+        lines = [line for (_, line) in misses]
+        stored_keys = [key for (key, _) in misses]
+        if model_version is None and model_cascade is not None:
+            escalated = set()
+
+            def escalate(escalated_lines):
+                escalated.update(escalated_lines)
+                return invoke_endpoint(escalated_lines, online=online)
+
+            scored = model_cascade.score(lines, escalate, model_version=serving_version)
+            stored_keys = [key for (key, line) in misses if line in escalated]
+        elif model_version is None:
+            scored = invoke_endpoint(lines, online=online)
+        else:
+            scored = predict_local(lines, model_version)
+        new_results = {key: result for ((key, _), result) in zip(misses, scored)}
+        if serving_version is not None:
+            write_store({key: new_results[key] for key in stored_keys})
+        found.update(new_results)
+    return [found[key] for key in keys]
+
+
+def read_store(keys):
+    try:
+        return store.get_many(keys)
+    except result_store.STORE_ERRORS:
+        logging.exception("Result store read failed, treating every headline as a miss")
+        return {}
+
+
+def write_store(results):
+    try:
+        store.put_many(results)
+    except result_store.STORE_ERRORS:
+        logging.exception(f"Result store write of {len(results)} results failed, dropping them")
 
-def predict(headline):
-    response = sm_client.invoke_endpoint(
+
+def invoke_endpoint(instances, online=False):
+    client = online_sm_client if online else sm_client
+    results = []
+    for chunk in chunk_instances(instances):
+        results.extend(invoke_endpoint_chunk(chunk, client))
+    return results
+
+
+def chunk_instances(instances):
+    """Splits instances into calls within ENDPOINT_MAX_INSTANCES and ENDPOINT_MAX_PAYLOAD_BYTES."""
+    chunk = []
+    chunk_bytes = 0
+    for instance in instances:
+        # the JSON encoded string plus its separator, json.dumps escapes to ASCII
+        instance_bytes = len(json.dumps(instance)) + 2
+        if chunk and (len(chunk) == ENDPOINT_MAX_INSTANCES
+                      or chunk_bytes + instance_bytes > ENDPOINT_MAX_PAYLOAD_BYTES):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(instance)
+        chunk_bytes += instance_bytes
+    if chunk:
+        yield chunk
+
+
+def invoke_endpoint_chunk(instances, client):
+    response = client.invoke_endpoint(
         EndpointName=ENDPOINT_NAME,
         ContentType='application/json',
-        Body=json.dumps({"instances": [preprocess(headline)]})
+        Body=json.dumps({"instances": instances})
     )
-    results = json.loads(response['Body'].read().decode())
-    result = results[0]
+    # the endpoint only speaks JSON, json.loads takes the raw bytes without a .decode() copy
+    results = json.loads(response['Body'].read())
+    return [parse_result(result) for result in results]
+
+
+def predict_local(instances, model_version):
+    labels, probabilities = models.get(model_version).predict(instances)
+    return [parse_result({"label": label, "prob": prob})
+            for (label, prob) in zip(labels, probabilities)]
+
+
+def parse_result(result):
     label = result["label"][0][9:]
-    probability = result["prob"][0]
+    probability = float(result["prob"][0])
     return {"sentiment": label, "probability": probability}
 
 
+def get_model_version():
+    """
+    Returns the model package version serving the endpoint, e.g. news-headlines/7.
+
+    MODEL_VERSION overrides the lookup. Otherwise the endpoint's production variant is resolved
+    to the model package its model was created from, re-read at most every
+    MODEL_VERSION_REFRESH_SECONDS. Returns None when that is not a single model: during a
+    blue/green update or rollback the old and new fleets serve under the same variant. A
+    blue/green update provisions the new fleet before shifting traffic to it, which leaves the
+    refresh time to notice the update. A failed lookup also returns None until the next refresh.
+    """
+    global _model_version, _model_version_fetched_at
+    if os.environ.get("MODEL_VERSION"):
+        return os.environ["MODEL_VERSION"]
+    with _model_version_lock:
+        now = time.monotonic()
+        if _model_version_fetched_at is None or \
+                now - _model_version_fetched_at > MODEL_VERSION_REFRESH_SECONDS:
+            try:
+                _model_version = describe_serving_model()
+            except (BotoCoreError, ClientError):
+                logging.exception(f"Unable to resolve the model behind {ENDPOINT_NAME}")
+                _model_version = None
+            _model_version_fetched_at = now
+        return _model_version
+
+
+def describe_serving_model():
+    """Returns the model package version behind the endpoint, None while it is updating."""
+    endpoint = sagemaker_client.describe_endpoint(EndpointName=ENDPOINT_NAME)
+    if endpoint["EndpointStatus"] != "InService" or "PendingDeploymentSummary" in endpoint:
+        return None
+    endpoint_config = sagemaker_client.describe_endpoint_config(
+        EndpointConfigName=endpoint["EndpointConfigName"])
+    model_name = endpoint_config["ProductionVariants"][0]["ModelName"]
+    model = sagemaker_client.describe_model(ModelName=model_name)
+    containers = model.get("Containers") or [model.get("PrimaryContainer", {})]
+    model_package_arn = containers[0].get("ModelPackageName")
+    if model_package_arn is None:
+        return model_name
+    # arn:aws:sagemaker:<region>:<account>:model-package/news-headlines/7
+    return model_package_arn.partition(":model-package/")[2] or model_package_arn
+
+
 def preprocess(line):
     tokens = tokenizer.tokenize(line.lower())
     return " ".join(tokens)
@@ -35,5 +230,3 @@ if __name__ == "__main__":
     for headline in input_data:
         result = predict(headline)
         print(headline, result)
-
-
@@ -0,0 +1,179 @@
+"""
+Persistent result tier for predictor.predict.
+
+Results are keyed on the normalized headline plus the model version, so a redeploy of a
+different model never serves stale predictions. Two backends are available:
+
+- SqliteResultStore: embedded on-disk store, the local stand-in used in development. It
+  survives restarts of the process on the same disk, not of an ECS task, whose storage is
+  ephemeral. Bounded by `max_entries` with least recently used eviction.
+- DynamoDBResultStore: shared by every ECS task behind the load balancer. Bounded by a
+  per-item TTL, since DynamoDB has no cheap way to cap the table by item count.
+
+from_environment() picks the backend: RESULT_STORE_TABLE selects DynamoDB, otherwise
+the sqlite file at RESULT_STORE_PATH is used. RESULT_STORE=none disables the tier.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_SQLITE_PATH = os.path.join(tempfile.gettempdir(), "news-headlines-results.sqlite3")
+DYNAMODB_BATCH_GET_LIMIT = 100
+SQLITE_MAX_VARIABLES = 500
+DYNAMODB_BATCH_WRITE_LIMIT = 25
+KEY = "key"
+RESULT = "result"
+EXPIRES_AT = "expires_at"
+# what a store may raise when its backend is unavailable, callers treat those as misses
+STORE_ERRORS = (sqlite3.Error, BotoCoreError, ClientError)
+
+
+def make_key(model_version, normalized_headline):
+    """Hashes the (model version, normalized headline) pair into a fixed-size key."""
+    return hashlib.sha256(f"{model_version}\n{normalized_headline}".encode()).hexdigest()
+
+
+class ResultStore:
+    """Interface of the result tier. Keys come from make_key, values are result dicts."""
+
+    def get_many(self, keys):
+        """Returns a dict of key -> result for the keys present in the store."""
+        raise NotImplementedError
+
+    def put_many(self, items):
+        """Stores a dict of key -> result."""
+        raise NotImplementedError
+
+
+class NullResultStore(ResultStore):
+    """Disabled tier, every lookup misses."""
+
+    def get_many(self, keys):
+        return {}
+
+    def put_many(self, items):
+        pass
+
+
+class SqliteResultStore(ResultStore):
+    """Embedded on-disk store with least recently used eviction past `max_entries`."""
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, result TEXT NOT NULL, last_access REAL NOT NULL)")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                chunk = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT key, result FROM results WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                if rows:
+                    self.connection.execute(
+                        f"UPDATE results SET last_access = ? WHERE key IN ({placeholders})",
+                        [time.time(), *chunk])
+                found.update((key, json.loads(result)) for (key, result) in rows)
+        return found
+
+    def put_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(result), now) for (key, result) in items.items()]
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO results (key, result, last_access) VALUES (?, ?, ?)",
+                    rows)
+                self.evict()
+                self.connection.execute("COMMIT")
+            except sqlite3.Error:
+                # an open transaction would make every later BEGIN fail
+                if self.connection.in_transaction:
+                    self.connection.execute("ROLLBACK")
+                raise
+
+    def evict(self):
+        """Drops the least recently used rows beyond max_entries."""
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY last_access LIMIT ?)", (excess,))
+
+
+class DynamoDBResultStore(ResultStore):
+    """Store shared across ECS tasks, entries expire through the table's TTL attribute."""
+
+    def __init__(self, table_name, ttl_seconds=DEFAULT_TTL_SECONDS, dynamodb_client=None):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.client = dynamodb_client or boto3.client("dynamodb")
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), DYNAMODB_BATCH_GET_LIMIT):
+            request = {self.table_name: {
+                "Keys": [{KEY: {"S": key}} for key in keys[start:start + DYNAMODB_BATCH_GET_LIMIT]],
+                "ProjectionExpression": f"#{KEY}, #{RESULT}",
+                "ExpressionAttributeNames": {f"#{KEY}": KEY, f"#{RESULT}": RESULT},
+            }}
+            while request:
+                response = self.client.batch_get_item(RequestItems=request)
+                for item in response["Responses"].get(self.table_name, []):
+                    found[item[KEY]["S"]] = json.loads(item[RESULT]["S"])
+                request = response.get("UnprocessedKeys")
+        return found
+
+    def put_many(self, items):
+        expires_at = str(int(time.time()) + self.ttl_seconds)
+        requests = [
+            {"PutRequest": {"Item": {
+                KEY: {"S": key},
+                RESULT: {"S": json.dumps(result)},
+                EXPIRES_AT: {"N": expires_at},
+            }}}
+            for (key, result) in items.items()
+        ]
+        for start in range(0, len(requests), DYNAMODB_BATCH_WRITE_LIMIT):
+            request = {self.table_name: requests[start:start + DYNAMODB_BATCH_WRITE_LIMIT]}
+            while request:
+                response = self.client.batch_write_item(RequestItems=request)
+                request = response.get("UnprocessedItems")
+
+
+def from_environment():
+    """Builds the result store selected by the RESULT_STORE* environment variables."""
+    if os.environ.get("RESULT_STORE", "").lower() == "none":
+        return NullResultStore()
+    table_name = os.environ.get("RESULT_STORE_TABLE")
+    if table_name:
+        ttl_seconds = int(os.environ.get("RESULT_STORE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+        return DynamoDBResultStore(table_name=table_name, ttl_seconds=ttl_seconds)
+    return SqliteResultStore(
+        path=os.environ.get("RESULT_STORE_PATH", DEFAULT_SQLITE_PATH),
+        max_entries=int(os.environ.get("RESULT_STORE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)))
@@ -0,0 +1,103 @@
+"""
+Serialization benchmark of the binary batch protocol against the JSON route.
+
+Measures, without calling the endpoint, the client and server side encode plus decode time and
+the bytes on the wire per headline for:
+- json-single: the /analyze route, one JSON request and response per headline
+- json-batch: the same results batched into one JSON array per request
+- msgpack-batch: /analyze/batch, length-prefixed MessagePack frames with uint8 label IDs and
+  float32 probabilities
+
+EXAMPLE:
+    python serialization_benchmark.py --headlines 10000 --batch-size 64
+    python serialization_benchmark.py --input headlines.txt
+"""
+import argparse
+import json
+import random
+import time
+
+import binary_protocol
+
+SAMPLE_HEADLINES = [
+    "Dow drops for a fourth straight day on U.S. default worries as debt ceiling talks stumble",
+    "Technopolis plans to develop in stages an area of no less than 100,000 square meters",
+    "The company has no plans to move all production to Russia",
+    "Net profit was 35.5 mln compared with 29.8 mln",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="headline file, one per line, instead of sample headlines")
+    parser.add_argument("--headlines", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per codec, the best is kept")
+    args = parser.parse_args()
+
+    headlines = read_headlines(args.input, args.headlines)
+    results = [{"sentiment": random.choice(binary_protocol.LABELS), "probability": random.random()}
+               for _ in headlines]
+    batches = [(headlines[i:i + args.batch_size], results[i:i + args.batch_size])
+               for i in range(0, len(headlines), args.batch_size)]
+
+    print(f"{len(headlines)} headlines, batch size {args.batch_size}")
+    print(f"{'codec':<14} {'us/headline':>12} {'bytes/headline':>15} {'speed-up':>9}")
+    baseline = None
+    for (name, codec) in [("json-single", json_single), ("json-batch", json_batch),
+                          ("msgpack-batch", msgpack_batch)]:
+        seconds, wire_bytes = min((codec(batches) for _ in range(args.repeat)),
+                                  key=lambda run: run[0])
+        baseline = baseline or seconds
+        print(f"{name:<14} {seconds / len(headlines) * 1e6:>12.2f} "
+              f"{wire_bytes / len(headlines):>15.1f} {baseline / seconds:>8.1f}x")
+
+
+def read_headlines(input_path, count):
+    if input_path:
+        with open(input_path) as f:
+            return [line.strip() for line in f if line.strip()]
+    return [SAMPLE_HEADLINES[i % len(SAMPLE_HEADLINES)] for i in range(count)]
+
+
+def json_single(batches):
+    """Client encodes, server decodes, server encodes, client decodes, per headline."""
+    wire_bytes = 0
+    started_at = time.perf_counter()
+    for (headlines, results) in batches:
+        for (headline, result) in zip(headlines, results):
+            request_body = json.dumps({"headline": headline}).encode()
+            json.loads(request_body)
+            response_body = json.dumps(result).encode()
+            json.loads(response_body)
+            wire_bytes += len(request_body) + len(response_body)
+    return time.perf_counter() - started_at, wire_bytes
+
+
+def json_batch(batches):
+    wire_bytes = 0
+    started_at = time.perf_counter()
+    for (headlines, results) in batches:
+        request_body = json.dumps({"headlines": headlines}).encode()
+        json.loads(request_body)
+        response_body = json.dumps(results).encode()
+        json.loads(response_body)
+        wire_bytes += len(request_body) + len(response_body)
+    return time.perf_counter() - started_at, wire_bytes
+
+
+def msgpack_batch(batches):
+    wire_bytes = 0
+    started_at = time.perf_counter()
+    for (headlines, results) in batches:
+        request_body = binary_protocol.encode_request([headlines])
+        binary_protocol.decode_request(request_body)
+        response_body = binary_protocol.encode_results([results])
+        binary_protocol.decode_results(response_body)
+        wire_bytes += len(request_body) + len(response_body)
+    return time.perf_counter() - started_at, wire_bytes
+
+
+if __name__ == "__main__":
+    main()
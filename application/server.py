@@ -1,9 +1,14 @@
-from flask import Flask, jsonify, request, render_template
+from botocore.exceptions import ConnectTimeoutError, ReadTimeoutError
+from flask import Flask, Response, jsonify, request, render_template
 from flask_cors import CORS
+import admission
+import binary_protocol
+import model_cache
 import predictor
 
 app = Flask(__name__)
 CORS(app)
+admission_controller = admission.from_environment()
 
 
 @app.route('/')
@@ -14,9 +19,99 @@ def index():
 @app.route('/analyze', methods=['POST'])
 def analyze_headline():
     headline = request.json['headline']
-    result = predictor.predict(headline)
+    model_version = request.json.get('model_version')
+    try:
+        with admission_controller.admit():
+            result = predictor.predict(headline, model_version=model_version, online=True)
+    except model_cache.InvalidModelVersion as e:
+        return bad_request(str(e), 400)
+    except model_cache.UnknownModelVersion as e:
+        return bad_request(str(e), 404)
+    except model_cache.ApprovedVersionsUnavailable as e:
+        return overloaded(str(e), admission_controller.retry_after)
+    except admission.Shed as e:
+        return overloaded(e.reason, e.retry_after)
+    except (ConnectTimeoutError, ReadTimeoutError):
+        return overloaded("endpoint timed out", admission_controller.retry_after)
     return jsonify(result)
 
 
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Scores length-prefixed MessagePack batches for internal callers, see binary_protocol."""
+    if request.mimetype != binary_protocol.CONTENT_TYPE:
+        return bad_request(f"Content-Type must be {binary_protocol.CONTENT_TYPE}", 415)
+    body = read_body(binary_protocol.MAX_REQUEST_BYTES)
+    if body is None:
+        return bad_request(f"request body exceeds {binary_protocol.MAX_REQUEST_BYTES} bytes", 413)
+    try:
+        batches = binary_protocol.decode_request(body)
+    except ValueError as e:  # ProtocolError or malformed MessagePack
+        return bad_request(str(e), 400)
+    try:
+        with admission_controller.admit():
+            results = predict_frames(batches)
+    except model_cache.InvalidModelVersion as e:
+        return bad_request(str(e), 400)
+    except model_cache.UnknownModelVersion as e:
+        return bad_request(str(e), 404)
+    except model_cache.ApprovedVersionsUnavailable as e:
+        return overloaded(str(e), admission_controller.retry_after)
+    except admission.Shed as e:
+        return overloaded(e.reason, e.retry_after)
+    except (ConnectTimeoutError, ReadTimeoutError):
+        return overloaded("endpoint timed out", admission_controller.retry_after)
+    return Response(binary_protocol.encode_results(results),
+                    mimetype=binary_protocol.CONTENT_TYPE)
+
+
+def read_body(max_bytes):
+    """Returns the request body, or None if it is larger than `max_bytes`.
+
+    A declared Content-Length over the limit is rejected before anything is read, a chunked
+    body is read at most one byte past the limit.
+    """
+    if request.content_length is not None and request.content_length > max_bytes:
+        return None
+    body = request.stream.read(max_bytes + 1)
+    return body if len(body) <= max_bytes else None
+
+
+def predict_frames(batches):
+    """Scores the frames with one predictor.predict_batch call per distinct model version."""
+    headlines_by_version = {}
+    for (headlines, model_version) in batches:
+        headlines_by_version.setdefault(model_version, []).extend(headlines)
+    results_by_version = {
+        model_version: iter(predictor.predict_batch(
+            headlines, model_version=model_version, online=True))
+        for (model_version, headlines) in headlines_by_version.items()
+    }
+    return [[next(results_by_version[model_version]) for _ in headlines]
+            for (headlines, model_version) in batches]
+
+
+def bad_request(reason, status_code):
+    response = jsonify({"error": "bad request", "reason": reason})
+    response.status_code = status_code
+    return response
+
+
+def overloaded(reason, retry_after):
+    response = jsonify({"error": "overloaded", "reason": reason})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    return jsonify({
+        "admission": admission_controller.stats(),
+        "model_cache": predictor.models.stats(),
+        "cascade": predictor.model_cascade.stats() if predictor.model_cascade else None,
+    })
+
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,96 @@
+"""
+Tests for the in-flight limit, queue and deadlines of admission.py.
+
+Run from application/: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admission  # noqa: E402
+
+
+class AdmissionControllerTest(unittest.TestCase):
+
+    def hold_slot(self, controller):
+        """Occupies one in-flight slot until the returned event is set."""
+        admitted = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with controller.admit():
+                admitted.set()
+                release.wait(timeout=5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        admitted.wait(timeout=5)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(release.set)
+        return release
+
+    def wait_until_queued(self, controller, queued):
+        deadline = time.monotonic() + 5
+        while controller.stats()["queued"] < queued and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_sheds_past_in_flight_limit_without_queue(self):
+        controller = admission.AdmissionController(max_in_flight=1, max_queued=0, retry_after=3)
+        self.hold_slot(controller)
+
+        with self.assertRaises(admission.Shed) as shed:
+            with controller.admit():
+                pass
+
+        self.assertEqual(shed.exception.reason, "queue full")
+        self.assertEqual(shed.exception.retry_after, 3)
+        self.assertEqual(controller.stats()["in_flight"], 1)
+
+    def test_sheds_when_queue_is_full(self):
+        controller = admission.AdmissionController(max_in_flight=1, max_queued=1,
+                                                   queue_timeout=5)
+        release = self.hold_slot(controller)
+        queued = threading.Thread(target=controller.acquire)
+        queued.start()
+        self.wait_until_queued(controller, 1)
+
+        with self.assertRaises(admission.Shed) as shed:
+            controller.acquire()
+
+        self.assertEqual(shed.exception.reason, "queue full")
+        self.assertEqual(controller.stats()["shed_queue_full_total"], 1)
+        release.set()
+        queued.join(timeout=5)
+        self.assertEqual(controller.stats()["admitted_total"], 2)
+
+    def test_sheds_queued_request_past_its_deadline(self):
+        controller = admission.AdmissionController(max_in_flight=1, max_queued=1,
+                                                   queue_timeout=0.05)
+        self.hold_slot(controller)
+
+        started_at = time.monotonic()
+        with self.assertRaises(admission.Shed) as shed:
+            controller.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.05)
+        self.assertEqual(shed.exception.reason, "deadline exceeded while queued")
+        stats = controller.stats()
+        self.assertEqual((stats["queued"], stats["shed_deadline_total"]), (0, 1))
+
+    def test_queued_request_is_admitted_when_a_slot_frees(self):
+        controller = admission.AdmissionController(max_in_flight=1, max_queued=1,
+                                                   queue_timeout=5)
+        release = self.hold_slot(controller)
+        threading.Timer(0.05, release.set).start()
+
+        with controller.admit():
+            self.assertEqual(controller.stats()["queued_total"], 1)
+        self.assertEqual(controller.stats()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
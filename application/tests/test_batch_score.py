@@ -0,0 +1,122 @@
+"""
+Tests for the checkpointing and resume of batch_score.py.
+
+Run from application/: python -m pytest tests
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+APPLICATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APPLICATION_DIR)
+
+import batch_score  # noqa: E402
+
+HEADLINES = [f"headline {i}" for i in range(10)]
+
+
+class Scorer:
+    """Labels every headline neutral, failing batches that contain `fail_on`."""
+
+    def __init__(self, fail_on=None, delays=None):
+        self.fail_on = fail_on
+        # seconds to sleep per headline, to finish batches out of order
+        self.delays = delays or {}
+        self.scored = []
+        self.lock = threading.Lock()
+
+    def __call__(self, headlines):
+        if self.fail_on in headlines:
+            raise RuntimeError("endpoint unavailable")
+        time.sleep(max(self.delays.get(headline, 0) for headline in headlines))
+        with self.lock:
+            self.scored.extend(headlines)
+        return [{"sentiment": "neutral", "probability": 0.9} for _ in headlines]
+
+
+class RunTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.input_path = os.path.join(directory.name, "headlines.txt")
+        self.output_path = os.path.join(directory.name, "scored.jsonl")
+        self.checkpoint_path = f"{self.output_path}{batch_score.CHECKPOINT_SUFFIX}"
+        with open(self.input_path, "w") as f:
+            f.write("".join(f"{headline}\n" for headline in HEADLINES))
+
+    def run_batch_score(self, scorer, workers=1, batch_size=2):
+        batch_score.run(input_path=self.input_path,
+                        output_path=self.output_path,
+                        checkpoint_path=self.checkpoint_path,
+                        score_batch=scorer,
+                        workers=workers,
+                        batch_size=batch_size)
+
+    def output_headlines(self):
+        with open(self.output_path) as f:
+            return [json.loads(line)["headline"] for line in f]
+
+    def test_interrupted_run_resumes_without_duplicates_or_gaps(self):
+        with self.assertRaises(RuntimeError):
+            self.run_batch_score(Scorer(fail_on="headline 6"))
+
+        lines_consumed, output_offset = batch_score.read_checkpoint(self.checkpoint_path)
+        self.assertEqual(lines_consumed, 6)
+        self.assertEqual(output_offset, os.path.getsize(self.output_path))
+        self.assertEqual(self.output_headlines(), HEADLINES[:6])
+
+        scorer = Scorer()
+        self.run_batch_score(scorer)
+
+        self.assertEqual(scorer.scored, HEADLINES[6:])
+        self.assertEqual(self.output_headlines(), HEADLINES)
+
+    def test_resume_truncates_rows_written_after_the_checkpoint(self):
+        with self.assertRaises(RuntimeError):
+            self.run_batch_score(Scorer(fail_on="headline 4"))
+        # a crash between writing a batch and checkpointing it
+        with open(self.output_path, "a") as f:
+            f.write(json.dumps({"headline": "headline 4"}) + "\n{\"headline\": \"headl")
+
+        self.run_batch_score(Scorer())
+
+        self.assertEqual(self.output_headlines(), HEADLINES)
+
+    def test_rows_are_written_in_input_order(self):
+        # earlier batches finish last
+        delays = {headline: 0.01 * (len(HEADLINES) - i) for (i, headline) in enumerate(HEADLINES)}
+        scorer = Scorer(delays=delays)
+
+        self.run_batch_score(scorer, workers=4, batch_size=1)
+
+        self.assertNotEqual(scorer.scored, HEADLINES)
+        self.assertEqual(self.output_headlines(), HEADLINES)
+        self.assertEqual(batch_score.read_checkpoint(self.checkpoint_path),
+                         (len(HEADLINES), os.path.getsize(self.output_path)))
+
+    def test_refuses_checkpoint_without_output(self):
+        batch_score.write_checkpoint(self.checkpoint_path, 4, 100)
+
+        with self.assertRaises(batch_score.CheckpointMismatch):
+            self.run_batch_score(Scorer())
+
+        self.assertFalse(os.path.exists(self.output_path))
+
+    def test_refuses_output_shorter_than_checkpoint(self):
+        batch_score.write_checkpoint(self.checkpoint_path, 4, 100)
+        with open(self.output_path, "w") as f:
+            f.write(json.dumps({"headline": "headline 0"}) + "\n")
+
+        with self.assertRaises(batch_score.CheckpointMismatch):
+            self.run_batch_score(Scorer())
+
+        self.assertEqual(self.output_headlines(), ["headline 0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests for the framing and limits of binary_protocol.py.
+
+Run from application/: python -m pytest tests
+"""
+import os
+import struct
+import sys
+import unittest
+
+APPLICATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APPLICATION_DIR)
+
+import binary_protocol  # noqa: E402
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def test_request_round_trip(self):
+        batches = [["Profits rose", "Shares fell"], [], ["Rates cut"]]
+
+        body = binary_protocol.encode_request(batches, model_version=3)
+
+        self.assertEqual(binary_protocol.decode_request(body),
+                         [(batch, 3) for batch in batches])
+
+    def test_results_round_trip(self):
+        batches = [
+            [{"sentiment": "good", "probability": 0.5}, {"sentiment": "bad", "probability": 0.25}],
+            [],
+            [{"sentiment": "neutral", "probability": 1.0}],
+        ]
+
+        body = binary_protocol.encode_results(batches)
+
+        # probabilities chosen to be exact in float32
+        self.assertEqual(binary_protocol.decode_results(body), batches)
+
+    def test_empty_body_has_no_frames(self):
+        self.assertEqual(binary_protocol.decode_request(b""), [])
+
+
+class RejectionTest(unittest.TestCase):
+
+    def assert_rejected(self, body, reason):
+        with self.assertRaises(binary_protocol.ProtocolError) as context:
+            binary_protocol.decode_request(body)
+        self.assertIn(reason, str(context.exception))
+
+    def test_truncated_length_prefix(self):
+        body = binary_protocol.encode_request([["Profits rose"]])
+        self.assert_rejected(body + b"\x00\x00", "truncated length prefix")
+
+    def test_truncated_frame(self):
+        body = binary_protocol.encode_request([["Profits rose"]])
+        self.assert_rejected(body[:-1], "truncated frame")
+
+    def test_oversized_frame_length(self):
+        length = struct.pack(">I", binary_protocol.MAX_FRAME_BYTES + 1)
+        self.assert_rejected(length, f"exceeds {binary_protocol.MAX_FRAME_BYTES}")
+
+    def test_frame_limit(self):
+        frames = [["Profits rose"]] * binary_protocol.MAX_FRAMES_PER_REQUEST
+        self.assertEqual(len(binary_protocol.decode_request(
+            binary_protocol.encode_request(frames))), binary_protocol.MAX_FRAMES_PER_REQUEST)
+
+        self.assert_rejected(binary_protocol.encode_request(frames + [["Shares fell"]]),
+                             f"more than {binary_protocol.MAX_FRAMES_PER_REQUEST} frames")
+
+    def test_headline_limit(self):
+        headlines = ["Profits rose"] * binary_protocol.MAX_HEADLINES_PER_REQUEST
+        self.assertEqual(len(binary_protocol.decode_request(
+            binary_protocol.encode_request([headlines]))[0][0]),
+            binary_protocol.MAX_HEADLINES_PER_REQUEST)
+
+        self.assert_rejected(binary_protocol.encode_request([headlines[:1000], headlines[1000:],
+                                                             ["Shares fell"]]),
+                             f"more than {binary_protocol.MAX_HEADLINES_PER_REQUEST} headlines")
+
+    def test_non_string_headlines(self):
+        self.assert_rejected(binary_protocol.encode_request([["Profits rose", 7]]),
+                             "headlines must be strings")
+        self.assert_rejected(binary_protocol.encode_request([[b"Profits rose"]]),
+                             "headlines must be strings")
+
+    def test_frame_without_headlines_list(self):
+        self.assert_rejected(binary_protocol.encode_frames([["Profits rose"]]),
+                             "'headlines' list")
+        self.assert_rejected(binary_protocol.encode_frames([{"headlines": "Profits rose"}]),
+                             "'headlines' list")
+
+    def test_malformed_messagepack_is_a_value_error(self):
+        # server.py answers ValueError with 400
+        payload = b"\xc1"  # never used by MessagePack
+        with self.assertRaises(ValueError):
+            binary_protocol.decode_request(struct.pack(">I", len(payload)) + payload)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+"""
+Tests for the escalation, audit accounting and first-tier loading of cascade.py, and for
+the result store writes of predictor.py with the cascade enabled.
+
+Run from application/: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+APPLICATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APPLICATION_DIR)
+sys.path.insert(0, os.path.join(os.path.dirname(APPLICATION_DIR), "sm-pipeline", "scripts"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("RESULT_STORE", "none")
+
+import cascade  # noqa: E402
+import predictor  # noqa: E402
+import result_store  # noqa: E402
+
+SERVING_VERSION = "news-headlines/3"
+
+
+class FakeFirstTier:
+    """Answers each normalized headline with a fixed (label, probability)."""
+
+    def __init__(self, answers):
+        self.answers = answers
+
+    def predict(self, line):
+        return self.answers[line]
+
+
+FIRST_TIER = FakeFirstTier({
+    "profit rose": ("good", 0.97),
+    "shares fell": ("bad", 0.95),
+    "company holds meeting": ("neutral", 0.55),
+})
+
+
+class RecordingEscalation:
+    """Stands in for the endpoint, labelling every escalated headline `sentiment`."""
+
+    def __init__(self, sentiment="neutral"):
+        self.sentiment = sentiment
+        self.calls = []
+
+    def __call__(self, lines):
+        self.calls.append(list(lines))
+        return [{"sentiment": self.sentiment, "probability": 0.8} for _ in lines]
+
+
+class RecordingStore(result_store.ResultStore):
+
+    def __init__(self):
+        self.items = {}
+
+    def get_many(self, keys):
+        return {key: self.items[key] for key in keys if key in self.items}
+
+    def put_many(self, items):
+        self.items.update(items)
+
+
+class ScoreTest(unittest.TestCase):
+
+    def test_escalates_only_below_threshold(self):
+        model_cascade = cascade.Cascade(lambda model_version: FIRST_TIER, threshold=0.9,
+                                        audit_rate=0.0)
+        escalate = RecordingEscalation()
+
+        results = model_cascade.score(["profit rose", "company holds meeting", "shares fell"],
+                                      escalate, model_version=SERVING_VERSION)
+
+        self.assertEqual(escalate.calls, [["company holds meeting"]])
+        self.assertEqual([result["sentiment"] for result in results], ["good", "neutral", "bad"])
+        self.assertEqual(results[0]["probability"], 0.97)
+        stats = model_cascade.stats()
+        self.assertEqual((stats["total"], stats["escalated"], stats["audited"]), (3, 1, 0))
+
+    def test_without_first_tier_every_headline_is_escalated(self):
+        model_cascade = cascade.Cascade(lambda model_version: None)
+        escalate = RecordingEscalation()
+
+        model_cascade.score(["profit rose", "shares fell"], escalate)
+
+        self.assertEqual(escalate.calls, [["profit rose", "shares fell"]])
+        self.assertEqual(model_cascade.stats()["escalated"], 2)
+
+    def test_audited_answers_come_from_the_endpoint_and_count_agreement(self):
+        model_cascade = cascade.Cascade(lambda model_version: FIRST_TIER, threshold=0.9,
+                                        audit_rate=0.5)
+        escalate = RecordingEscalation(sentiment="good")
+
+        # the first confident headline is audited, the second is not
+        with mock.patch.object(cascade.random, "random", side_effect=[0.1, 0.9, 0.1]):
+            results = model_cascade.score(["profit rose", "shares fell"], escalate)
+            model_cascade.score(["shares fell"], escalate)
+
+        self.assertEqual(escalate.calls, [["profit rose"], ["shares fell"]])
+        self.assertEqual(results[0], {"sentiment": "good", "probability": 0.8})
+        self.assertEqual(results[1], {"sentiment": "bad", "probability": 0.95})
+        stats = model_cascade.stats()
+        self.assertEqual((stats["total"], stats["escalated"], stats["audited"]), (3, 0, 2))
+        self.assertEqual(stats["audit_agreement"], 0.5)
+
+
+class GetModelTest(unittest.TestCase):
+
+    def test_slow_load_does_not_block_other_requests(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def loader(model_version):
+            started.set()
+            release.wait(5)
+            return FIRST_TIER
+
+        model_cascade = cascade.Cascade(loader)
+        loading = threading.Thread(target=model_cascade.get_model, args=(SERVING_VERSION,))
+        loading.start()
+        self.addCleanup(loading.join)
+        self.addCleanup(release.set)
+        self.assertTrue(started.wait(5))
+
+        # answered while the load is still running, without a first tier
+        self.assertIsNone(model_cascade.get_model(SERVING_VERSION))
+        self.assertFalse(model_cascade.stats()["first_tier_loaded"])
+
+        release.set()
+        loading.join()
+        self.assertIs(model_cascade.get_model(SERVING_VERSION), FIRST_TIER)
+
+    def test_failed_load_is_retried_later(self):
+        loader = mock.Mock(side_effect=[OSError("unreachable"), FIRST_TIER])
+        model_cascade = cascade.Cascade(loader)
+
+        self.assertIsNone(model_cascade.get_model(SERVING_VERSION))
+        self.assertIsNone(model_cascade.get_model(SERVING_VERSION))
+        retry_at = model_cascade.loaded_at + cascade.LOAD_RETRY_SECONDS + 1
+        with mock.patch.object(cascade.time, "monotonic", return_value=retry_at):
+            self.assertIs(model_cascade.get_model(SERVING_VERSION), FIRST_TIER)
+        self.assertEqual(loader.call_count, 2)
+
+
+class PredictBatchTest(unittest.TestCase):
+
+    def test_first_tier_answers_are_not_stored(self):
+        store = RecordingStore()
+        model_cascade = cascade.Cascade(lambda model_version: FIRST_TIER, threshold=0.9,
+                                        audit_rate=0.0)
+        escalate = RecordingEscalation()
+        for (name, value) in {"store": store, "model_cascade": model_cascade,
+                              "invoke_endpoint": lambda lines, online=False: escalate(lines),
+                              "get_model_version": lambda: SERVING_VERSION}.items():
+            patcher = mock.patch.object(predictor, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        results = predictor.predict_batch(["Profit rose!", "Company holds meeting"])
+
+        self.assertEqual([result["sentiment"] for result in results], ["good", "neutral"])
+        self.assertEqual(list(store.items), [
+            result_store.make_key(SERVING_VERSION, "company holds meeting")])
+
+        # the stored answer is a hit, the first tier answers the other headline again
+        predictor.predict_batch(["Profit rose!", "Company holds meeting"])
+        self.assertEqual(escalate.calls, [["company holds meeting"]])
+        self.assertEqual(model_cascade.stats()["total"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+"""
+Tests for ingestion.py against a local file source and a local HTTP feed.
+
+Run from application/: python -m pytest tests
+"""
+import asyncio
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+APPLICATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APPLICATION_DIR)
+# first_tier_model.py, copied next to the application in the image
+sys.path.insert(0, os.path.join(os.path.dirname(APPLICATION_DIR), "sm-pipeline", "scripts"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("RESULT_STORE", "none")
+
+import ingestion  # noqa: E402
+
+
+class FlakyScorer:
+    """Fails the first `failures` calls, then labels every headline neutral."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, headlines):
+        self.calls.append(list(headlines))
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("endpoint unavailable")
+        return [{"sentiment": "neutral", "probability": 0.9} for _ in headlines]
+
+
+class FeedHandler(http.server.BaseHTTPRequestHandler):
+    headlines = []
+    # served as is instead of the JSON encoded headlines when set
+    body = None
+
+    def do_GET(self):
+        body = self.body if self.body is not None else json.dumps(self.headlines).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def run_polls(worker, polls, expected_rows, rows):
+    """Polls every source `polls` times, then waits until `expected_rows` rows reached the sink."""
+    scorer = asyncio.create_task(worker.score_forever())
+    for _ in range(polls):
+        for source in worker.sources:
+            for headline in await source.fetch():
+                await worker.enqueue(headline)
+        await worker.queue.join()
+    for _ in range(200):
+        if len(rows) >= expected_rows:
+            break
+        await asyncio.sleep(0.01)
+    scorer.cancel()
+
+
+class IngestionWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.patches = {"BATCH_LINGER_SECONDS": 0.01, "RETRY_BACKOFF_SECONDS": 0.01}
+        self.saved = {name: getattr(ingestion, name) for name in self.patches}
+        for (name, value) in self.patches.items():
+            setattr(ingestion, name, value)
+
+    def tearDown(self):
+        for (name, value) in self.saved.items():
+            setattr(ingestion, name, value)
+
+    def test_file_source_failed_batch_is_retried_not_lost(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("Profits rose\nShares fell\nProfits rose\n")
+        self.addCleanup(os.remove, f.name)
+        rows = []
+        scorer = FlakyScorer(failures=2)
+        worker = ingestion.IngestionWorker([ingestion.FileSource(f.name)], rows.append,
+                                           score_batch=scorer)
+
+        asyncio.run(run_polls(worker, polls=1, expected_rows=2, rows=rows))
+
+        self.assertEqual(["Profits rose", "Shares fell"], [row["headline"] for row in rows])
+        self.assertEqual(3, len(scorer.calls))
+        self.assertEqual(1, worker.duplicates)
+        self.assertEqual(0, worker.failed)
+        self.assertEqual(2, len(worker.seen))
+
+    def test_http_source_headlines_are_accepted_again_after_giving_up(self):
+        server = http.server.HTTPServer(("127.0.0.1", 0), FeedHandler)
+        FeedHandler.headlines = ["Profits rose", "Shares fell"]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_port}/feed"
+        rows = []
+        scorer = FlakyScorer(failures=ingestion.MAX_SCORE_ATTEMPTS)
+        worker = ingestion.IngestionWorker([ingestion.HttpSource(url)], rows.append,
+                                           score_batch=scorer)
+
+        asyncio.run(run_polls(worker, polls=3, expected_rows=2, rows=rows))
+
+        # first poll exhausts its attempts, second scores, third only finds duplicates
+        self.assertEqual(["Profits rose", "Shares fell"], [row["headline"] for row in rows])
+        self.assertEqual(2, worker.failed)
+        self.assertEqual(2, worker.duplicates)
+        self.assertEqual(ingestion.MAX_SCORE_ATTEMPTS + 1, len(scorer.calls))
+
+
+class SourceTest(unittest.TestCase):
+
+    def write(self, path, text, mode="a"):
+        with open(path, mode) as f:
+            f.write(text)
+
+    def test_file_source_rereads_truncated_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "headlines.txt")
+            self.write(path, "Profits rose\nShares fell\n")
+            source = ingestion.FileSource(path)
+            self.assertEqual(["Profits rose", "Shares fell"], asyncio.run(source.fetch()))
+
+            self.write(path, "Rates cut\n", mode="w")
+
+            self.assertEqual(["Rates cut"], asyncio.run(source.fetch()))
+
+    def test_file_source_rereads_rotated_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "headlines.txt")
+            self.write(path, "Profits rose\n")
+            source = ingestion.FileSource(path)
+            self.assertEqual(["Profits rose"], asyncio.run(source.fetch()))
+
+            os.rename(path, f"{path}.1")
+            self.write(path, "Rates cut for the first time\n")
+
+            self.assertEqual(["Rates cut for the first time"], asyncio.run(source.fetch()))
+            self.write(path, "Shares fell\n")
+            self.assertEqual(["Shares fell"], asyncio.run(source.fetch()))
+
+    def test_http_source_reads_non_list_json_as_lines(self):
+        server = http.server.HTTPServer(("127.0.0.1", 0), FeedHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        self.addCleanup(setattr, FeedHandler, "body", None)
+        source = ingestion.HttpSource(f"http://127.0.0.1:{server.server_port}/feed")
+
+        FeedHandler.body = b"2024"
+        self.assertEqual(["2024"], asyncio.run(source.fetch()))
+        FeedHandler.body = b'["Profits rose", 7, "Shares fell"]'
+        self.assertEqual(["Profits rose", "Shares fell"], asyncio.run(source.fetch()))
+
+
+class SeenSetTest(unittest.TestCase):
+
+    def test_rejects_capacity_below_one(self):
+        with self.assertRaises(ValueError):
+            ingestion.SeenSet(capacity=0)
+
+    def test_evicts_oldest_once_full(self):
+        seen = ingestion.SeenSet(capacity=3)
+        keys = [ingestion.digest(f"headline {i}") for i in range(5)]
+        for key in keys:
+            self.assertTrue(seen.add(key))
+        self.assertFalse(seen.add(keys[4]))
+        self.assertEqual(3, len(seen))
+        self.assertEqual([False, False, True, True, True], [key in seen for key in keys])
+
+    def test_lookups_survive_many_evictions(self):
+        seen = ingestion.SeenSet(capacity=64)
+        keys = [ingestion.digest(f"headline {i}") for i in range(10_000)]
+        for key in keys:
+            seen.add(key)
+        self.assertTrue(all(key in seen for key in keys[-64:]))
+        self.assertFalse(any(key in seen for key in keys[:-64]))
+
+    def test_memory_is_fixed_per_entry(self):
+        seen = ingestion.SeenSet(capacity=1_000)
+        allocated = seen.order.itemsize * len(seen.order) + seen.table.itemsize * len(seen.table)
+        self.assertLessEqual(allocated, 1_000 * 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Tests for the loading, eviction and approval checks of model_cache.py.
+
+Run from application/: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+from botocore.exceptions import ClientError
+
+APPLICATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APPLICATION_DIR)
+sys.path.insert(0, os.path.join(os.path.dirname(APPLICATION_DIR), "sm-pipeline", "scripts"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("RESULT_STORE", "none")
+
+import model_cache  # noqa: E402
+
+
+class RecordingLoader:
+    """Loads a placeholder model per version, blocking until `release` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.loads = []
+        self.lock = threading.Lock()
+
+    def __call__(self, version):
+        with self.lock:
+            self.loads.append(version)
+        self.release.wait(timeout=5)
+        return f"model-{version}"
+
+
+class ModelCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = RecordingLoader()
+        self.removed = []
+
+    def make_cache(self, capacity=2, approved_versions=lambda: {"1", "2", "3"}):
+        return model_cache.ModelCache(capacity=capacity, loader=self.loader,
+                                      approved_versions=approved_versions,
+                                      remover=self.removed.append)
+
+    def test_concurrent_requests_load_a_version_once(self):
+        cache = self.make_cache()
+        self.loader.release.clear()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("1")))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        while not self.loader.loads:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        self.loader.release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+        # a request arriving right after the load finds the model, not a stale loading entry
+        results.append(cache.get("1"))
+
+        self.assertEqual(self.loader.loads, ["1"])
+        self.assertEqual(results, ["model-1"] * 9)
+        self.assertEqual(cache.loading, {})
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_evicts_least_recently_used_version_and_its_files(self):
+        cache = self.make_cache(capacity=2)
+        cache.get("1")
+        cache.get("2")
+        cache.get("1")
+        cache.get("3")
+
+        stats = cache.stats()
+        self.assertEqual(stats["loaded_versions"], ["1", "3"])
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(self.removed, ["2"])
+
+    def test_failed_load_can_be_retried(self):
+        cache = self.make_cache()
+        cache.loader = lambda version: (_ for _ in ()).throw(OSError("download failed"))
+        with self.assertRaises(OSError):
+            cache.get("1")
+        self.assertEqual(cache.loading, {})
+
+        cache.loader = self.loader
+        self.assertEqual(cache.get("1"), "model-1")
+
+    def test_unlisted_version_is_rejected(self):
+        cache = self.make_cache()
+        with self.assertRaises(model_cache.UnknownModelVersion):
+            cache.get("9")
+        with self.assertRaises(model_cache.InvalidModelVersion):
+            cache.get("latest")
+
+    def test_listing_failure_is_reported_as_unavailable(self):
+        def approved_versions():
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}},
+                              "ListModelPackages")
+
+        cache = self.make_cache(approved_versions=approved_versions)
+        with self.assertRaises(model_cache.ApprovedVersionsUnavailable):
+            cache.get("1")
+
+
+if __name__ == "__main__":
+    unittest.main()
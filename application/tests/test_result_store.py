@@ -0,0 +1,123 @@
+"""
+Tests for the sqlite and DynamoDB backends of result_store.py.
+
+Run from application/: python -m pytest tests
+"""
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import boto3
+from botocore.stub import ANY, Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import result_store  # noqa: E402
+
+POSITIVE = {"sentiment": "good", "probability": 0.9}
+NEGATIVE = {"sentiment": "bad", "probability": 0.8}
+
+
+class SqliteResultStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "results.sqlite3")
+        # strictly increasing access times, so the LRU order does not depend on clock resolution
+        patcher = mock.patch.object(result_store.time, "time", side_effect=itertools.count())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_store(self, max_entries=result_store.DEFAULT_MAX_ENTRIES):
+        store = result_store.SqliteResultStore(path=self.path, max_entries=max_entries)
+        self.addCleanup(store.connection.close)
+        return store
+
+    def test_returns_stored_results_and_misses_others(self):
+        store = self.make_store()
+        store.put_many({"a": POSITIVE, "b": NEGATIVE})
+
+        self.assertEqual(store.get_many(["a", "b", "c"]), {"a": POSITIVE, "b": NEGATIVE})
+        self.assertEqual(store.get_many(["c"]), {})
+
+    def test_evicts_least_recently_used_past_max_entries(self):
+        store = self.make_store(max_entries=2)
+        store.put_many({"a": POSITIVE})
+        store.put_many({"b": NEGATIVE})
+        store.get_many(["a"])
+        store.put_many({"c": POSITIVE})
+
+        self.assertEqual(set(store.get_many(["a", "b", "c"])), {"a", "c"})
+
+    def test_recovers_after_failed_write(self):
+        store = self.make_store()
+        with mock.patch.object(store, "evict",
+                               side_effect=sqlite3.OperationalError("database is locked")):
+            with self.assertRaises(sqlite3.OperationalError):
+                store.put_many({"a": POSITIVE})
+
+        self.assertFalse(store.connection.in_transaction)
+        self.assertEqual(store.get_many(["a"]), {})
+        store.put_many({"b": NEGATIVE})
+        self.assertEqual(store.get_many(["b"]), {"b": NEGATIVE})
+
+    def test_results_outlive_the_connection(self):
+        self.make_store().put_many({"a": POSITIVE})
+
+        self.assertEqual(self.make_store().get_many(["a"]), {"a": POSITIVE})
+
+
+class DynamoDBResultStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        client = boto3.client("dynamodb", region_name="us-east-1",
+                              aws_access_key_id="testing", aws_secret_access_key="testing")
+        self.store = result_store.DynamoDBResultStore("results", ttl_seconds=60,
+                                                      dynamodb_client=client)
+        self.dynamodb = Stubber(client)
+        self.dynamodb.activate()
+        self.addCleanup(self.dynamodb.deactivate)
+
+    def item(self, key, result):
+        return {result_store.KEY: {"S": key},
+                result_store.RESULT: {"S": result_store.json.dumps(result)}}
+
+    def test_get_many_returns_hits_and_follows_unprocessed_keys(self):
+        self.dynamodb.add_response(
+            "batch_get_item",
+            {"Responses": {"results": [self.item("a", POSITIVE)]},
+             "UnprocessedKeys": {"results": {"Keys": [{result_store.KEY: {"S": "b"}}]}}})
+        self.dynamodb.add_response(
+            "batch_get_item", {"Responses": {"results": [self.item("b", NEGATIVE)]}})
+
+        found = self.store.get_many(["a", "b", "c", "a"])
+
+        self.assertEqual(found, {"a": POSITIVE, "b": NEGATIVE})
+        self.dynamodb.assert_no_pending_responses()
+
+    def test_put_many_writes_in_batches_with_expiry(self):
+        items = {f"key-{i}": POSITIVE for i in range(result_store.DYNAMODB_BATCH_WRITE_LIMIT + 1)}
+        self.dynamodb.add_response("batch_write_item", {}, {"RequestItems": ANY})
+        self.dynamodb.add_response("batch_write_item", {}, {"RequestItems": ANY})
+
+        with mock.patch.object(result_store.time, "time", return_value=1000):
+            with mock.patch.object(self.store.client, "batch_write_item",
+                                   wraps=self.store.client.batch_write_item) as batch_write_item:
+                self.store.put_many(items)
+
+        batches = [call.kwargs["RequestItems"]["results"]
+                   for call in batch_write_item.call_args_list]
+        self.assertEqual([len(batch) for batch in batches],
+                         [result_store.DYNAMODB_BATCH_WRITE_LIMIT, 1])
+        self.assertEqual(batches[0][0]["PutRequest"]["Item"][result_store.EXPIRES_AT],
+                         {"N": "1060"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Tests for the error mapping and body limits of server.py, with predictor stubbed out.
+
+Run from application/: python -m pytest tests
+"""
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ReadTimeoutError
+
+APPLICATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APPLICATION_DIR)
+sys.path.insert(0, os.path.join(os.path.dirname(APPLICATION_DIR), "sm-pipeline", "scripts"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("RESULT_STORE", "none")
+
+import admission  # noqa: E402
+import binary_protocol  # noqa: E402
+import model_cache  # noqa: E402
+import server  # noqa: E402
+
+
+class AnalyzeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def analyze(self, **body):
+        return self.client.post("/analyze", json={"headline": "profit rose", **body})
+
+    def test_online_requests_use_the_no_retry_client(self):
+        with mock.patch.object(server.predictor, "predict",
+                               return_value={"sentiment": "good"}) as predict:
+            self.assertEqual(self.analyze().status_code, 200)
+
+        self.assertTrue(predict.call_args.kwargs["online"])
+
+    def test_shed_request_gets_503_with_retry_after(self):
+        full = admission.AdmissionController(max_in_flight=0, max_queued=0, retry_after=7)
+        with mock.patch.object(server, "admission_controller", full), \
+                mock.patch.object(server.predictor, "predict") as predict:
+            response = self.analyze()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "7")
+        self.assertEqual(response.json["reason"], "queue full")
+        predict.assert_not_called()
+
+    def test_endpoint_timeout_gets_503_with_retry_after(self):
+        timeout = ReadTimeoutError(endpoint_url="https://runtime.sagemaker")
+        with mock.patch.object(server.predictor, "predict", side_effect=timeout):
+            response = self.analyze()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"],
+                         str(server.admission_controller.retry_after))
+        self.assertEqual(server.admission_controller.stats()["in_flight"], 0)
+
+    def test_unlisted_approved_versions_are_unavailable_not_an_error(self):
+        unavailable = model_cache.ApprovedVersionsUnavailable("throttled")
+        with mock.patch.object(server.predictor, "predict", side_effect=unavailable):
+            response = self.analyze(model_version="3")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"],
+                         str(server.admission_controller.retry_after))
+
+    def test_unknown_version_is_not_found(self):
+        unknown = model_cache.UnknownModelVersion("model version 9 is not approved")
+        with mock.patch.object(server.predictor, "predict", side_effect=unknown):
+            self.assertEqual(self.analyze(model_version="9").status_code, 404)
+
+
+class AnalyzeBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def analyze_batch(self, body, **kwargs):
+        return self.client.post("/analyze/batch", data=body,
+                                content_type=binary_protocol.CONTENT_TYPE, **kwargs)
+
+    def test_scores_frames_in_order(self):
+        results = [{"sentiment": "good", "probability": 0.5},
+                   {"sentiment": "bad", "probability": 0.25}]
+        with mock.patch.object(server.predictor, "predict_batch",
+                               return_value=results) as predict_batch:
+            response = self.analyze_batch(
+                binary_protocol.encode_request([["profit rose"], ["shares fell"]]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(binary_protocol.decode_results(response.data),
+                         [[results[0]], [results[1]]])
+        predict_batch.assert_called_once_with(["profit rose", "shares fell"], model_version=None,
+                                              online=True)
+
+    def test_body_over_the_limit_gets_413(self):
+        body = b"\x00" * (binary_protocol.MAX_REQUEST_BYTES + 1)
+        with mock.patch.object(server.predictor, "predict_batch") as predict_batch:
+            response = self.analyze_batch(body)
+
+        self.assertEqual(response.status_code, 413)
+        predict_batch.assert_not_called()
+
+    def test_undeclared_body_over_the_limit_gets_413(self):
+        body = io.BytesIO(b"\x00" * (binary_protocol.MAX_REQUEST_BYTES + 1))
+        response = self.analyze_batch(body, environ_overrides={"wsgi.input_terminated": True},
+                                      headers={"Transfer-Encoding": "chunked"})
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_body_limit_only_applies_to_batches(self):
+        headline = "profit rose " * (binary_protocol.MAX_REQUEST_BYTES // 10)
+        with mock.patch.object(server.predictor, "predict",
+                               return_value={"sentiment": "good"}) as predict:
+            response = self.client.post("/analyze", json={"headline": headline})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(predict.call_args.args[0], headline)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,14 @@
-from botocore.exceptions import ClientError, WaiterError
+from botocore.exceptions import ClientError
 import boto3
+import contextlib
 import datetime
+import endpoint_autoscaling
+import endpoint_rollout
+import endpoint_shadow
 import json
 import os
 import setup_logging
+import time
 import traceback
 
 ENDPOINT_CONFIG_NAME = "news-headlines-endpoint-config"
@@ -12,9 +17,23 @@ INITIAL_INSTANCE_COUNT = 1
 INSTANCE_TYPE = "ml.m5.xlarge"
 MODEL_NAME_PREFIX = "news-headlines-"
 MODEL_PACKAGE_ARN = "ModelPackageArn"
-
-sagemaker_client = boto3.client("sagemaker")
-codepipeline_client = boto3.client('codepipeline')
+DEPLOYMENT_MODE = "DeploymentMode"
+PRODUCTION = "Production"
+SHADOW = "Shadow"
+VARIANT_NAME = "variant-1"
+
+CONTINUATION_TOKEN = "continuationToken"
+TOKEN_ENDPOINT_CONFIG_NAME = "EndpointConfigName"
+TOKEN_MODEL_PACKAGE_ARN = "ModelPackageArn"
+TOKEN_DEPLOYED_AT = "DeployedAt"
+TOKEN_PHASE_DURATIONS = "PhaseDurations"
+IN_SERVICE = "InService"
+# RollingBack: an alarm tripped during the canary, the endpoint returns to InService afterwards
+IN_PROGRESS_STATUSES = ("Creating", "Updating", "SystemUpdating", "RollingBack")
+
+# AWS_ENDPOINT_URL points the clients at a local AWS API stand-in when testing
+sagemaker_client = boto3.client("sagemaker", endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
+codepipeline_client = boto3.client('codepipeline', endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
 log = setup_logging.setup_logging()
 
 
@@ -26,6 +45,14 @@ def lambda_handler(event, context):
     update or create an endpoint in Amazon SageMaker. It loads input data from S3 designated by
     CodePipeline, creates a model, and creates/updates an endpoint with the created model.
 
+    When the input carries "DeploymentMode": "Shadow" the model package is deployed as a shadow
+    variant next to the current production variant instead of replacing it, see endpoint_shadow.
+
+    Deployments are idempotent: if the endpoint already serves the approved ModelPackageArn the
+    job succeeds immediately without creating anything. The Lambda does not wait for the endpoint
+    to become InService. It hands CodePipeline a continuation token instead, and CodePipeline
+    re-invokes the Lambda with that token until the deployment finishes.
+
     Parameters:
         event (dict): The event object containing information about the triggering event.
         context (object): The context object passed by Lambda.
@@ -33,7 +60,7 @@ def lambda_handler(event, context):
     Raises:
         AssertionError: If the EXECUTION_ROLE_ARN environment variable is not specified.
     """
-    global job_id_global
+    global job_id_global, phase_durations_global
 
     now = datetime.datetime.now()
     now_str = now.isoformat().split('.')[0].replace(':', '-')
@@ -44,22 +71,89 @@ def lambda_handler(event, context):
         "EXECUTION_ROLE_ARN environment variable must be specified"
 
     job_id_global = event["CodePipeline.job"]["id"]
+    phase_durations_global = {}
     log.info(f"CodePipeline JobId={job_id_global}")
 
+    job_data = event["CodePipeline.job"]["data"]
+    if CONTINUATION_TOKEN in job_data:
+        log.info("Continuation of an earlier invocation, checking deployment progress")
+        check_deployment_progress(json.loads(job_data[CONTINUATION_TOKEN]))
+        return
+
+    with timed_phase("ReadInput"):
+        model_package_arn, deployment_mode = read_deployment_request(job_data)
+
+    if deployment_mode == SHADOW:
+        deploy_shadow(execution_role_arn=execution_role_arn,
+                      model_package_arn=model_package_arn,
+                      now_str=now_str)
+        return
+
+    with timed_phase("DescribeCurrentDeployment"):
+        current_model_package_arn, endpoint_status, current_endpoint_config_name, \
+            shadow_model_name = describe_current_deployment()
+    if current_model_package_arn == model_package_arn:
+        if endpoint_status == IN_SERVICE:
+            log.info(f"Endpoint {ENDPOINT_NAME} already serves {model_package_arn}, "
+                     f"only re-applying the scaling policy")
+            apply_endpoint_scaling()
+            put_job_success(summary=f"{model_package_arn} already deployed")
+            return
+        if endpoint_status in IN_PROGRESS_STATUSES:
+            log.info(f"Endpoint {ENDPOINT_NAME} is already deploying {model_package_arn}, "
+                     f"waiting for it")
+            put_job_continuation(endpoint_config_name=current_endpoint_config_name,
+                                 model_package_arn=model_package_arn)
+            return
+        log.info(f"Endpoint {ENDPOINT_NAME} has status {endpoint_status}, redeploying")
+
+    if shadow_model_name is not None:
+        # the production endpoint config has no shadow variant
+        log.warning(f"Deploying {model_package_arn} to production drops the shadow variant "
+                    f"serving {shadow_model_name}")
+
+    model_name = f"{MODEL_NAME_PREFIX}{now_str}"
+    log.info(f"Creating model model_name={model_name} with ModelPackageName={model_package_arn}")
+    with timed_phase("CreateModel"):
+        create_sagemaker_model(execution_role_arn=execution_role_arn,
+                               model_package_arn=model_package_arn,
+                               model_name=model_name)
+
+    endpoint_config_name = upsert_endpoint(model_name=model_name, now_str=now_str)
+
+    put_job_continuation(endpoint_config_name=endpoint_config_name,
+                         model_package_arn=model_package_arn)
+
+
+@contextlib.contextmanager
+def timed_phase(phase):
+    """Records how long the wrapped deployment phase took in phase_durations_global."""
+    started_at = time.monotonic()
+    try:
+        yield
+    finally:
+        duration = time.monotonic() - started_at
+        phase_durations_global[phase] = round(duration, 3)
+        log.info(f"Phase {phase} took {duration:.3f}s")
+
+
+def read_deployment_request(job_data):
+    """Reads the approved ModelPackageArn and DeploymentMode from the CodePipeline input artifact."""
     log.info("Reading artifact credentials")
-    artifact_credentials = event["CodePipeline.job"]["data"]["artifactCredentials"]
+    artifact_credentials = job_data["artifactCredentials"]
     aws_access_key_id_global = artifact_credentials["accessKeyId"]
     aws_secret_access_key_global = artifact_credentials["secretAccessKey"]
     aws_session_token_global = artifact_credentials["sessionToken"]
 
     log.info("Reading input S3 information from the event")
-    input_artifact = event["CodePipeline.job"]["data"]["inputArtifacts"][0]
+    input_artifact = job_data["inputArtifacts"][0]
     input_s3_location = input_artifact["location"]["s3Location"]
     input_bucket_name = input_s3_location["bucketName"]
     input_object_key = input_s3_location["objectKey"]
 
     log.info(f"Load input from s3://{input_bucket_name}/{input_object_key} with artifact creds")
     s3_client_for_codepipeline = boto3.client("s3",
+                                              endpoint_url=os.environ.get("AWS_ENDPOINT_URL"),
                                               aws_access_key_id=aws_access_key_id_global,
                                               aws_secret_access_key=aws_secret_access_key_global,
                                               aws_session_token=aws_session_token_global)
@@ -68,17 +162,206 @@ def lambda_handler(event, context):
                                    input_object_key=input_object_key,)
     input_data = json.loads(input_response["Body"].read())
     model_package_arn = input_data[MODEL_PACKAGE_ARN]
-    log.info(f"Loaded {MODEL_PACKAGE_ARN}={model_package_arn}")
+    deployment_mode = input_data.get(DEPLOYMENT_MODE, PRODUCTION)
+    log.info(f"Loaded {MODEL_PACKAGE_ARN}={model_package_arn}, {DEPLOYMENT_MODE}={deployment_mode}")
+    return model_package_arn, deployment_mode
 
-    model_name = f"{MODEL_NAME_PREFIX}{now_str}"
-    log.info(f"Creating model model_name={model_name} with ModelPackageName={model_package_arn}")
-    create_sagemaker_model(execution_role_arn=execution_role_arn,
-                           model_package_arn=model_package_arn,
-                           model_name=model_name)
 
-    upsert_endpoint(model_name=model_name, now_str=now_str)
+def describe_current_deployment():
+    """
+    Finds which model package the endpoint currently serves, or is being updated to.
 
-    put_job_success()
+    While an update is in progress the endpoint still names its old EndpointConfig, the config
+    being deployed is the one of its PendingDeploymentSummary. That one is reported, so a retried
+    deployment of the package already rolling out is recognized.
+
+    Returns:
+        (model_package_arn, endpoint_status, endpoint_config_name, shadow_model_name), or
+        (None, None, None, None) if the endpoint does not exist. shadow_model_name is None
+        without a shadow variant.
+    """
+    try:
+        endpoint = sagemaker_client.describe_endpoint(EndpointName=ENDPOINT_NAME)
+        endpoint_config_name = endpoint.get("PendingDeploymentSummary", {}).get(
+            "EndpointConfigName", endpoint["EndpointConfigName"])
+        endpoint_config = sagemaker_client.describe_endpoint_config(
+            EndpointConfigName=endpoint_config_name)
+        model_package_arn = get_model_package_arn(
+            endpoint_config["ProductionVariants"][0]["ModelName"])
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ValidationException":
+            log.info(f"Endpoint {ENDPOINT_NAME} or its model does not exist")
+            return None, None, None, None
+        log.exception("Unexpected error")
+        put_job_failure(e)
+        raise e
+
+    endpoint_status = endpoint["EndpointStatus"]
+    shadow_variants = endpoint_config.get("ShadowProductionVariants", [])
+    shadow_model_name = shadow_variants[0]["ModelName"] if shadow_variants else None
+    log.info(f"Endpoint {ENDPOINT_NAME} serves {model_package_arn} with {endpoint_config_name}, "
+             f"status={endpoint_status}, shadow={shadow_model_name}")
+    return model_package_arn, endpoint_status, endpoint_config_name, shadow_model_name
+
+
+def get_model_package_arn(model_name):
+    """Returns the ModelPackageName the SageMaker model was created from."""
+    model = sagemaker_client.describe_model(ModelName=model_name)
+    containers = model.get("Containers") or [model.get("PrimaryContainer", {})]
+    return containers[0].get("ModelPackageName")
+
+
+def deploy_shadow(execution_role_arn, model_package_arn, now_str):
+    """
+    Deploys the model package as a shadow variant receiving mirrored production traffic.
+
+    The production variants of the current endpoint config are kept as they are. Like production
+    deployments this is a no-op when the shadow already serves the package, and waiting for
+    InService is left to the continuation.
+    """
+    try:
+        with timed_phase("DescribeCurrentDeployment"):
+            endpoint = sagemaker_client.describe_endpoint(EndpointName=ENDPOINT_NAME)
+            endpoint_config = sagemaker_client.describe_endpoint_config(
+                EndpointConfigName=endpoint["EndpointConfigName"])
+            shadow_variants = endpoint_config.get("ShadowProductionVariants", [])
+            current_shadow_model_package_arn = \
+                get_model_package_arn(shadow_variants[0]["ModelName"]) if shadow_variants else None
+    except ClientError as e:
+        log.exception(f"Endpoint {ENDPOINT_NAME} must serve production before adding a shadow")
+        put_job_failure(e)
+        raise e
+
+    if current_shadow_model_package_arn == model_package_arn:
+        if endpoint["EndpointStatus"] == IN_SERVICE:
+            log.info(f"Endpoint {ENDPOINT_NAME} already shadows {model_package_arn}, "
+                     f"only re-applying the scaling policy")
+            apply_endpoint_scaling()
+            put_job_success(summary=f"{model_package_arn} already deployed as shadow")
+            return
+        if endpoint["EndpointStatus"] in IN_PROGRESS_STATUSES:
+            put_job_continuation(endpoint_config_name=endpoint["EndpointConfigName"],
+                                 model_package_arn=model_package_arn)
+            return
+
+    model_name = f"{MODEL_NAME_PREFIX}shadow-{now_str}"
+    log.info(f"Creating shadow model model_name={model_name} "
+             f"with ModelPackageName={model_package_arn}")
+    with timed_phase("CreateModel"):
+        create_sagemaker_model(execution_role_arn=execution_role_arn,
+                               model_package_arn=model_package_arn,
+                               model_name=model_name)
+
+    endpoint_config_name = f"{ENDPOINT_NAME}-config-shadow-{now_str}"
+    try:
+        with timed_phase("CreateEndpointConfig"):
+            log.info(f"Create EndpointConfig {endpoint_config_name} with shadow {model_name}")
+            sagemaker_client.create_endpoint_config(
+                EndpointConfigName=endpoint_config_name,
+                **endpoint_shadow.build_shadow_endpoint_config(endpoint_config, model_name))
+        with timed_phase("DeregisterScalableTarget"):
+            endpoint_autoscaling.deregister_scalable_target(endpoint_name=ENDPOINT_NAME,
+                                                            variant_name=VARIANT_NAME)
+        with timed_phase("UpdateEndpoint"):
+            sagemaker_client.update_endpoint(EndpointName=ENDPOINT_NAME,
+                                             EndpointConfigName=endpoint_config_name)
+    except ClientError as e:
+        log.exception("Unexpected error")
+        put_job_failure(e)
+        raise e
+
+    put_job_continuation(endpoint_config_name=endpoint_config_name,
+                         model_package_arn=model_package_arn)
+
+
+def check_deployment_progress(token):
+    """
+    Completes, continues or fails the job depending on the endpoint status.
+
+    Parameters:
+        token (dict): The continuation token written by put_job_continuation.
+    """
+    global phase_durations_global
+    phase_durations_global = token[TOKEN_PHASE_DURATIONS]
+    endpoint_config_name = token[TOKEN_ENDPOINT_CONFIG_NAME]
+
+    try:
+        endpoint = sagemaker_client.describe_endpoint(EndpointName=ENDPOINT_NAME)
+    except ClientError as e:
+        log.exception("Unexpected error")
+        put_job_failure(e)
+        raise e
+
+    endpoint_status = endpoint["EndpointStatus"]
+    log.info(f"Endpoint {ENDPOINT_NAME} status={endpoint_status}, "
+             f"EndpointConfigName={endpoint['EndpointConfigName']}")
+    if endpoint_status in IN_PROGRESS_STATUSES:
+        put_job_continuation(endpoint_config_name=endpoint_config_name,
+                             model_package_arn=token[TOKEN_MODEL_PACKAGE_ARN],
+                             deployed_at=token[TOKEN_DEPLOYED_AT])
+        return
+
+    phase_durations_global["WaitForInService"] = round(time.time() - token[TOKEN_DEPLOYED_AT], 3)
+    rollout_summary = summarize_rollout(token[TOKEN_DEPLOYED_AT])
+    if endpoint_status == IN_SERVICE and endpoint["EndpointConfigName"] == endpoint_config_name:
+        apply_endpoint_scaling()
+        put_job_success(summary=f"Deployed {token[TOKEN_MODEL_PACKAGE_ARN]}, latency "
+                                f"before/after rollout (ms) {json.dumps(rollout_summary)}")
+        return
+
+    # a failed or alarmed update rolls the endpoint back to its previous config, left InService
+    # without the scaling target upsert_endpoint deregistered
+    if endpoint_status == IN_SERVICE:
+        restore_endpoint_scaling()
+    failure_reason = endpoint.get("FailureReason", f"EndpointStatus={endpoint_status}, "
+                                                   f"EndpointConfigName={endpoint['EndpointConfigName']}")
+    e = RuntimeError(f"Endpoint {ENDPOINT_NAME} failed to deploy {endpoint_config_name}: "
+                     f"{failure_reason}, latency before/after rollout (ms) "
+                     f"{json.dumps(rollout_summary)}")
+    log.error(str(e))
+    put_job_failure(e)
+    raise e
+
+
+def summarize_rollout(deployed_at):
+    """Compares latency before and after the rollout, a missing summary never fails the deploy."""
+    try:
+        return endpoint_rollout.summarize_rollout(endpoint_name=ENDPOINT_NAME,
+                                                  variant_name=VARIANT_NAME,
+                                                  deployed_at=deployed_at)
+    except ClientError:
+        log.exception("Unable to summarize rollout latency")
+        return None
+
+
+def apply_endpoint_scaling():
+    """Attaches the target-tracking scaling policy to the production variant."""
+    try:
+        with timed_phase("ApplyScalingPolicy"):
+            endpoint_autoscaling.apply_scaling_policy(
+                endpoint_name=ENDPOINT_NAME,
+                variant_name=VARIANT_NAME,
+                config=endpoint_autoscaling.load_scaling_config())
+    except ClientError as e:
+        log.exception("Unexpected error")
+        put_job_failure(e)
+        raise e
+
+
+def restore_endpoint_scaling():
+    """
+    Re-attaches the scaling policy after a failed update rolled the endpoint back.
+
+    Errors are only logged, the job reports the failed deployment rather than the scaling error.
+    """
+    try:
+        with timed_phase("ApplyScalingPolicy"):
+            endpoint_autoscaling.apply_scaling_policy(
+                endpoint_name=ENDPOINT_NAME,
+                variant_name=VARIANT_NAME,
+                config=endpoint_autoscaling.load_scaling_config())
+    except ClientError:
+        log.exception(f"Unable to re-apply the scaling policy to {ENDPOINT_NAME} after rollback")
 
 
 def create_sagemaker_model(execution_role_arn, model_package_arn, model_name):
@@ -110,28 +393,47 @@ def upsert_endpoint(model_name, now_str):
     Upsert the endpoint in Amazon SageMaker.
 
     This function checks if the endpoint already exists and either updates the existing endpoint
-    configuration or creates a new one if the endpoint does not exist. It waits for the endpoint to
-    be in-service before returning.
+    configuration or creates a new one if the endpoint does not exist. It returns as soon as the
+    update or creation has been accepted, waiting for InService is left to the continuation.
 
     Parameters:
         model_name (str): The name of the model to associate with the endpoint.
+
+    Returns:
+        str: The name of the EndpointConfig being deployed.
     """
     log.info(f"Upserting Endpoint for model_name={model_name}")
 
     endpoint_config_name = f"{ENDPOINT_NAME}-config-{now_str}"
     log.info(f"Create EndpointConfig {endpoint_config_name}")
-    create_sagemaker_endpoint_config(model_name=model_name,
-                                     endpoint_config_name=endpoint_config_name)
+    with timed_phase("CreateEndpointConfig"):
+        create_sagemaker_endpoint_config(model_name=model_name,
+                                         endpoint_config_name=endpoint_config_name)
+    try:
+        # SageMaker rejects updates to registered scalable targets, re-applied once InService
+        with timed_phase("DeregisterScalableTarget"):
+            endpoint_autoscaling.deregister_scalable_target(endpoint_name=ENDPOINT_NAME,
+                                                            variant_name=VARIANT_NAME)
+        with timed_phase("EnsureRollbackAlarms"):
+            endpoint_rollout.ensure_rollback_alarms(endpoint_name=ENDPOINT_NAME,
+                                                    variant_name=VARIANT_NAME)
+    except ClientError as e:
+        log.exception("Unexpected error")
+        put_job_failure(e)
+        raise e
+
     try:
         log.info(f"Checking if Endpoint {ENDPOINT_NAME} already exists")
         sagemaker_client.describe_endpoint(EndpointName=ENDPOINT_NAME)
 
         log.info(f"Endpoint {ENDPOINT_NAME} exists, "
                  f"update EndpointConfig to {endpoint_config_name}")
-        sagemaker_client.update_endpoint(
-            EndpointName=ENDPOINT_NAME,
-            EndpointConfigName=endpoint_config_name,
-        )
+        with timed_phase("UpdateEndpoint"):
+            sagemaker_client.update_endpoint(
+                EndpointName=ENDPOINT_NAME,
+                EndpointConfigName=endpoint_config_name,
+                DeploymentConfig=endpoint_rollout.build_deployment_config(),
+            )
     except ClientError as e:
         # ValidationException => triggered by describe-endpoint (ok) or update-endpoint (bad)
         if e.response["Error"]["Code"] == "ValidationException":
@@ -144,20 +446,14 @@ def upsert_endpoint(model_name, now_str):
 
             log.info(f"Endpoint does not exist, creating Endpoint {ENDPOINT_NAME} "
                      f"with EndpointConfig {endpoint_config_name}")
-            create_sagemaker_endpoint(endpoint_config_name)
+            with timed_phase("CreateEndpoint"):
+                create_sagemaker_endpoint(endpoint_config_name)
         else:
             log.exception("Unexpected error")
             put_job_failure(e)
             raise e
 
-    try:
-        log.info(f"Waiting for Endpoint {ENDPOINT_NAME} to be InService")
-        waiter = sagemaker_client.get_waiter("endpoint_in_service")
-        waiter.wait(EndpointName=ENDPOINT_NAME)
-    except WaiterError as e:
-        log.exception("Waiter timedout, possibly endpoint failed to deploy ?")
-        put_job_failure(e)
-        raise e
+    return endpoint_config_name
 
 
 def create_sagemaker_endpoint_config(model_name, endpoint_config_name):
@@ -166,7 +462,7 @@ def create_sagemaker_endpoint_config(model_name, endpoint_config_name):
             EndpointConfigName=endpoint_config_name,
             ProductionVariants=[
                 {
-                    "VariantName": "variant-1",
+                    "VariantName": VARIANT_NAME,
                     "ModelName": model_name,
                     "InitialInstanceCount": INITIAL_INSTANCE_COUNT,
                     "InstanceType": INSTANCE_TYPE,
@@ -192,11 +488,39 @@ def create_sagemaker_endpoint(endpoint_config_name):
         raise e
 
 
-def put_job_success():
+def put_job_success(summary):
     """Notifies AWS CodePipeline of a successful job execution."""
-    log.info(f"JobSuccess, job_id={job_id_global}")
+    log.info(f"JobSuccess, job_id={job_id_global}, phase_durations={phase_durations_global}")
+    response = codepipeline_client.put_job_success_result(
+        jobId=job_id_global,
+        executionDetails={
+            "summary": f"{summary}, phase durations (s): {json.dumps(phase_durations_global)}",
+            "percentComplete": 100,
+        },
+    )
+    return response
+
+
+def put_job_continuation(endpoint_config_name, model_package_arn, deployed_at=None):
+    """
+    Notifies AWS CodePipeline that the job is still running.
+
+    CodePipeline re-invokes the Lambda with the returned continuation token, which carries
+    everything check_deployment_progress needs, including the phase durations so far.
+    """
+    continuation_token = json.dumps({
+        TOKEN_ENDPOINT_CONFIG_NAME: endpoint_config_name,
+        TOKEN_MODEL_PACKAGE_ARN: model_package_arn,
+        TOKEN_DEPLOYED_AT: deployed_at if deployed_at is not None else time.time(),
+        TOKEN_PHASE_DURATIONS: phase_durations_global,
+    })
+    log.info(f"JobContinuation, job_id={job_id_global}, continuation_token={continuation_token}")
     response = codepipeline_client.put_job_success_result(
         jobId=job_id_global,
+        continuationToken=continuation_token,
+        executionDetails={
+            "summary": f"Waiting for Endpoint {ENDPOINT_NAME} to serve {endpoint_config_name}",
+        },
     )
     return response
 
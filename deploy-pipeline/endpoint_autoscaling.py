@@ -0,0 +1,103 @@
+import os
+import boto3
+from botocore.exceptions import ClientError
+import setup_logging
+
+SERVICE_NAMESPACE = "sagemaker"
+SCALABLE_DIMENSION = "sagemaker:variant:DesiredInstanceCount"
+PREDEFINED_METRIC_TYPE = "SageMakerVariantInvocationsPerInstance"
+POLICY_NAME = "news-headlines-invocations-per-instance"
+
+DEFAULT_MIN_CAPACITY = 1
+DEFAULT_MAX_CAPACITY = 4
+DEFAULT_TARGET_INVOCATIONS_PER_INSTANCE = 70.0
+DEFAULT_SCALE_IN_COOLDOWN = 300
+DEFAULT_SCALE_OUT_COOLDOWN = 60
+
+autoscaling_client = boto3.client("application-autoscaling",
+                                  endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
+log = setup_logging.setup_logging()
+
+
+def load_scaling_config():
+    """
+    Reads the scaling configuration from the environment.
+
+    AUTOSCALING_MIN_CAPACITY, AUTOSCALING_MAX_CAPACITY, AUTOSCALING_TARGET_INVOCATIONS_PER_INSTANCE,
+    AUTOSCALING_SCALE_IN_COOLDOWN and AUTOSCALING_SCALE_OUT_COOLDOWN override the defaults.
+    """
+    config = {
+        "min_capacity": int(os.environ.get("AUTOSCALING_MIN_CAPACITY", DEFAULT_MIN_CAPACITY)),
+        "max_capacity": int(os.environ.get("AUTOSCALING_MAX_CAPACITY", DEFAULT_MAX_CAPACITY)),
+        "target_value": float(os.environ.get("AUTOSCALING_TARGET_INVOCATIONS_PER_INSTANCE",
+                                             DEFAULT_TARGET_INVOCATIONS_PER_INSTANCE)),
+        "scale_in_cooldown": int(os.environ.get("AUTOSCALING_SCALE_IN_COOLDOWN",
+                                                DEFAULT_SCALE_IN_COOLDOWN)),
+        "scale_out_cooldown": int(os.environ.get("AUTOSCALING_SCALE_OUT_COOLDOWN",
+                                                 DEFAULT_SCALE_OUT_COOLDOWN)),
+    }
+    assert 1 <= config["min_capacity"] <= config["max_capacity"], \
+        f"Invalid capacity range {config['min_capacity']}..{config['max_capacity']}"
+    return config
+
+
+def get_resource_id(endpoint_name, variant_name):
+    return f"endpoint/{endpoint_name}/variant/{variant_name}"
+
+
+def apply_scaling_policy(endpoint_name, variant_name, config):
+    """
+    Registers the variant as a scalable target and attaches the target-tracking policy.
+
+    Both calls are upserts, so this is safe to run after every deployment. The endpoint must be
+    InService, Application Auto Scaling rejects variants of an endpoint that is updating.
+    """
+    resource_id = get_resource_id(endpoint_name, variant_name)
+    log.info(f"Registering scalable target {resource_id} with "
+             f"capacity {config['min_capacity']}..{config['max_capacity']}")
+    autoscaling_client.register_scalable_target(
+        ServiceNamespace=SERVICE_NAMESPACE,
+        ResourceId=resource_id,
+        ScalableDimension=SCALABLE_DIMENSION,
+        MinCapacity=config["min_capacity"],
+        MaxCapacity=config["max_capacity"],
+    )
+
+    log.info(f"Putting scaling policy {POLICY_NAME} on {resource_id}, "
+             f"target {config['target_value']} invocations per instance")
+    autoscaling_client.put_scaling_policy(
+        PolicyName=POLICY_NAME,
+        ServiceNamespace=SERVICE_NAMESPACE,
+        ResourceId=resource_id,
+        ScalableDimension=SCALABLE_DIMENSION,
+        PolicyType="TargetTrackingScaling",
+        TargetTrackingScalingPolicyConfiguration={
+            "TargetValue": config["target_value"],
+            "PredefinedMetricSpecification": {
+                "PredefinedMetricType": PREDEFINED_METRIC_TYPE,
+            },
+            "ScaleInCooldown": config["scale_in_cooldown"],
+            "ScaleOutCooldown": config["scale_out_cooldown"],
+        },
+    )
+
+
+def deregister_scalable_target(endpoint_name, variant_name):
+    """
+    Removes the variant from Application Auto Scaling before an endpoint update.
+
+    SageMaker refuses to update an endpoint whose variants are registered scalable targets, the
+    policy is re-applied by apply_scaling_policy once the update is InService.
+    """
+    resource_id = get_resource_id(endpoint_name, variant_name)
+    try:
+        log.info(f"Deregistering scalable target {resource_id}")
+        autoscaling_client.deregister_scalable_target(
+            ServiceNamespace=SERVICE_NAMESPACE,
+            ResourceId=resource_id,
+            ScalableDimension=SCALABLE_DIMENSION,
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ObjectNotFoundException":
+            raise e
+        log.info(f"Scalable target {resource_id} was not registered")
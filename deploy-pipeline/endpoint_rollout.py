@@ -0,0 +1,184 @@
+import datetime
+import os
+import boto3
+import setup_logging
+
+METRICS_NAMESPACE = "AWS/SageMaker"
+MODEL_LATENCY = "ModelLatency"
+INVOCATION_5XX_ERRORS = "Invocation5XXErrors"
+
+# Rollback alarm thresholds, evaluated per minute while traffic shifts to the new fleet
+MODEL_LATENCY_ALARM_NAME = "news-headlines-endpoint-model-latency"
+MODEL_LATENCY_THRESHOLD_MICROSECONDS = 100_000
+# share of the new fleet's requests allowed above the latency threshold
+NEW_FLEET_LATENCY_TAIL_PERCENT = 10
+MODEL_LATENCY_EVALUATION_PERIODS = 2
+ERRORS_ALARM_NAME = "news-headlines-endpoint-5xx-errors"
+ERRORS_THRESHOLD = 5
+ERRORS_EVALUATION_PERIODS = 1
+ALARM_PERIOD_SECONDS = 60
+
+CANARY = "CANARY"
+LINEAR = "LINEAR"
+ALL_AT_ONCE = "ALL_AT_ONCE"
+DEFAULT_ROLLOUT_TYPE = CANARY
+DEFAULT_TRAFFIC_STEP_PERCENT = 10
+DEFAULT_WAIT_INTERVAL_SECONDS = 300
+DEFAULT_TERMINATION_WAIT_SECONDS = 300
+SUMMARY_PERCENTILES = ["p50", "p90", "p99"]
+
+cloudwatch_client = boto3.client("cloudwatch", endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
+log = setup_logging.setup_logging()
+
+
+def ensure_rollback_alarms(endpoint_name, variant_name):
+    """
+    Creates or updates the latency and error alarms that trigger an automatic rollback.
+
+    Both fleets report under the same variant name during a blue/green update, so the metrics mix
+    the new fleet's share of the traffic with the old fleet's. An average would dilute a slow
+    canary, the latency alarm watches a tail percentile instead: with the new fleet serving
+    step% of requests, more than NEW_FLEET_LATENCY_TAIL_PERCENT of its requests above the
+    threshold puts the endpoint-wide latency_alarm_statistic above it as well. The error alarm
+    sums errors, which the old fleet cannot dilute.
+    """
+    dimensions = [
+        {"Name": "EndpointName", "Value": endpoint_name},
+        {"Name": "VariantName", "Value": variant_name},
+    ]
+    latency_statistic = latency_alarm_statistic(get_traffic_step_percent())
+    log.info(f"Putting alarm {MODEL_LATENCY_ALARM_NAME}, {latency_statistic} "
+             f"threshold={MODEL_LATENCY_THRESHOLD_MICROSECONDS}us")
+    cloudwatch_client.put_metric_alarm(
+        AlarmName=MODEL_LATENCY_ALARM_NAME,
+        Namespace=METRICS_NAMESPACE,
+        MetricName=MODEL_LATENCY,
+        Dimensions=dimensions,
+        ExtendedStatistic=latency_statistic,
+        Period=ALARM_PERIOD_SECONDS,
+        EvaluationPeriods=MODEL_LATENCY_EVALUATION_PERIODS,
+        Threshold=MODEL_LATENCY_THRESHOLD_MICROSECONDS,
+        ComparisonOperator="GreaterThanThreshold",
+        TreatMissingData="notBreaching",
+    )
+    log.info(f"Putting alarm {ERRORS_ALARM_NAME}, threshold={ERRORS_THRESHOLD}")
+    cloudwatch_client.put_metric_alarm(
+        AlarmName=ERRORS_ALARM_NAME,
+        Namespace=METRICS_NAMESPACE,
+        MetricName=INVOCATION_5XX_ERRORS,
+        Dimensions=dimensions,
+        Statistic="Sum",
+        Period=ALARM_PERIOD_SECONDS,
+        EvaluationPeriods=ERRORS_EVALUATION_PERIODS,
+        Threshold=ERRORS_THRESHOLD,
+        ComparisonOperator="GreaterThanOrEqualToThreshold",
+        TreatMissingData="notBreaching",
+    )
+
+
+def latency_alarm_statistic(step_percent):
+    """
+    Returns the endpoint-wide percentile that exceeds the threshold once the new fleet's does.
+
+    The new fleet serving step_percent of the traffic, its slowest NEW_FLEET_LATENCY_TAIL_PERCENT
+    are the endpoint's slowest step_percent * NEW_FLEET_LATENCY_TAIL_PERCENT / 100 percent, e.g.
+    p99 for a 10% canary and p90 for an all at once update.
+    """
+    tail_percent = step_percent * NEW_FLEET_LATENCY_TAIL_PERCENT / 100
+    return f"p{round(100 - tail_percent, 2):g}"
+
+
+def get_traffic_step_percent():
+    """Returns the share of traffic the new fleet serves first, 100 for ALL_AT_ONCE."""
+    if get_rollout_type() == ALL_AT_ONCE:
+        return 100
+    return int(os.environ.get("ROLLOUT_TRAFFIC_STEP_PERCENT", DEFAULT_TRAFFIC_STEP_PERCENT))
+
+
+def get_rollout_type():
+    rollout_type = os.environ.get("ROLLOUT_TYPE", DEFAULT_ROLLOUT_TYPE).upper()
+    assert rollout_type in (CANARY, LINEAR, ALL_AT_ONCE), f"Unknown ROLLOUT_TYPE={rollout_type}"
+    return rollout_type
+
+
+def build_deployment_config():
+    """
+    Builds the update_endpoint DeploymentConfig for a blue/green traffic shift.
+
+    ROLLOUT_TYPE selects CANARY, LINEAR or ALL_AT_ONCE. ROLLOUT_TRAFFIC_STEP_PERCENT is the canary
+    size or the linear step, ROLLOUT_WAIT_INTERVAL_SECONDS the bake time between shifts and
+    ROLLOUT_TERMINATION_WAIT_SECONDS how long the old fleet is kept after the shift completes.
+    """
+    rollout_type = get_rollout_type()
+    step_percent = get_traffic_step_percent()
+    wait_interval = int(os.environ.get("ROLLOUT_WAIT_INTERVAL_SECONDS",
+                                       DEFAULT_WAIT_INTERVAL_SECONDS))
+    termination_wait = int(os.environ.get("ROLLOUT_TERMINATION_WAIT_SECONDS",
+                                          DEFAULT_TERMINATION_WAIT_SECONDS))
+
+    traffic_routing = {"Type": rollout_type, "WaitIntervalInSeconds": wait_interval}
+    step = {"Type": "CAPACITY_PERCENT", "Value": step_percent}
+    if rollout_type == CANARY:
+        traffic_routing["CanarySize"] = step
+    elif rollout_type == LINEAR:
+        traffic_routing["LinearStepSize"] = step
+
+    return {
+        "BlueGreenUpdatePolicy": {
+            "TrafficRoutingConfiguration": traffic_routing,
+            "TerminationWaitInSeconds": termination_wait,
+        },
+        "AutoRollbackConfiguration": {
+            "Alarms": [
+                {"AlarmName": MODEL_LATENCY_ALARM_NAME},
+                {"AlarmName": ERRORS_ALARM_NAME},
+            ],
+        },
+    }
+
+
+def get_latency_percentiles(endpoint_name, variant_name, start_time, end_time):
+    """Returns ModelLatency percentiles in milliseconds over the window, None if no traffic."""
+    response = cloudwatch_client.get_metric_statistics(
+        Namespace=METRICS_NAMESPACE,
+        MetricName=MODEL_LATENCY,
+        Dimensions=[
+            {"Name": "EndpointName", "Value": endpoint_name},
+            {"Name": "VariantName", "Value": variant_name},
+        ],
+        StartTime=start_time,
+        EndTime=end_time,
+        Period=get_period(start_time, end_time),
+        ExtendedStatistics=SUMMARY_PERCENTILES,
+    )
+    datapoints = response["Datapoints"]
+    if not datapoints:
+        return None
+    datapoint = max(datapoints, key=lambda d: d["Timestamp"])
+    return {p: round(datapoint["ExtendedStatistics"][p] / 1000, 2) for p in SUMMARY_PERCENTILES}
+
+
+def get_period(start_time, end_time):
+    """A single CloudWatch period spanning the window, in whole minutes."""
+    return max(ALARM_PERIOD_SECONDS,
+               int((end_time - start_time).total_seconds()) // ALARM_PERIOD_SECONDS
+               * ALARM_PERIOD_SECONDS)
+
+
+def summarize_rollout(endpoint_name, variant_name, deployed_at):
+    """
+    Compares endpoint-wide model latency before the rollout with latency since it started.
+
+    This is a before/after comparison, not a comparison of the fleets: both fleets report under
+    the same variant name during a blue/green update, so "after" mixes the old fleet's traffic
+    until the shift completes. "before" covers an equally long window just before deployed_at.
+    """
+    started = datetime.datetime.fromtimestamp(deployed_at, tz=datetime.timezone.utc)
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    window = max(now - started, datetime.timedelta(seconds=ALARM_PERIOD_SECONDS))
+    summary = {
+        "before": get_latency_percentiles(endpoint_name, variant_name, started - window, started),
+        "after": get_latency_percentiles(endpoint_name, variant_name, started, now),
+    }
+    log.info(f"Rollout latency summary before/after deployment (ms): {summary}")
+    return summary
@@ -0,0 +1,261 @@
+"""
+Shadow testing of candidate model packages.
+
+A candidate deployed as a shadow variant receives a mirrored copy of the production traffic,
+its responses are captured but never returned to callers. The deploy Lambda creates the shadow
+when approved-model.json carries "DeploymentMode": "Shadow". This module builds that endpoint
+config and provides the operator commands that follow it:
+
+    python endpoint_shadow.py report --minutes 60
+    python endpoint_shadow.py promote
+    python endpoint_shadow.py teardown
+
+report compares latency distribution, error rate and prediction agreement of the shadow and
+production variants, promote makes the shadow model the production variant and teardown drops
+the shadow, each as a single endpoint update rolled out like a production deploy: blue/green
+behind the rollback alarms of endpoint_rollout.
+"""
+import argparse
+import base64
+import collections
+import datetime
+import json
+import os
+import boto3
+import endpoint_autoscaling
+import endpoint_rollout
+import setup_logging
+
+ENDPOINT_NAME = "news-headlines-endpoint"
+SHADOW_VARIANT_NAME = "shadow-1"
+SHADOW_INSTANCE_TYPE = "ml.m5.xlarge"
+SHADOW_INITIAL_INSTANCE_COUNT = 1
+DEFAULT_SHADOW_SAMPLING_PERCENT = 100
+CAPTURE_SAMPLING_PERCENT = 100
+PRODUCTION_VARIANT_FIELDS = ("VariantName", "ModelName", "InitialInstanceCount", "InstanceType",
+                             "InitialVariantWeight")
+
+sagemaker_client = boto3.client("sagemaker", endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
+cloudwatch_client = boto3.client("cloudwatch", endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
+s3_client = boto3.client("s3", endpoint_url=os.environ.get("AWS_ENDPOINT_URL"))
+log = setup_logging.setup_logging()
+
+
+def get_production_variants(endpoint_config):
+    """Returns the production variants of a described endpoint config, as create-time input."""
+    return [
+        {field: variant[field] for field in PRODUCTION_VARIANT_FIELDS if field in variant}
+        for variant in endpoint_config["ProductionVariants"]
+    ]
+
+
+def build_shadow_endpoint_config(current_endpoint_config, shadow_model_name):
+    """
+    Builds create_endpoint_config arguments that keep the production variants and add a shadow.
+
+    SHADOW_SAMPLING_PERCENT sets the share of production requests mirrored to the shadow and
+    SHADOW_CAPTURE_S3_URI, when set, enables data capture of both variants for the report.
+    """
+    sampling_percent = int(os.environ.get("SHADOW_SAMPLING_PERCENT",
+                                          DEFAULT_SHADOW_SAMPLING_PERCENT))
+    config = {
+        "ProductionVariants": get_production_variants(current_endpoint_config),
+        "ShadowProductionVariants": [
+            {
+                "VariantName": SHADOW_VARIANT_NAME,
+                "ModelName": shadow_model_name,
+                "InitialInstanceCount": SHADOW_INITIAL_INSTANCE_COUNT,
+                "InstanceType": SHADOW_INSTANCE_TYPE,
+                "InitialVariantWeight": sampling_percent / 100,
+            }
+        ],
+    }
+    capture_s3_uri = os.environ.get("SHADOW_CAPTURE_S3_URI")
+    if capture_s3_uri:
+        config["DataCaptureConfig"] = {
+            "EnableCapture": True,
+            "InitialSamplingPercentage": CAPTURE_SAMPLING_PERCENT,
+            "DestinationS3Uri": capture_s3_uri,
+            "CaptureOptions": [{"CaptureMode": "Input"}, {"CaptureMode": "Output"}],
+        }
+    return config
+
+
+def describe_current_endpoint_config(endpoint_name):
+    endpoint = sagemaker_client.describe_endpoint(EndpointName=endpoint_name)
+    return sagemaker_client.describe_endpoint_config(
+        EndpointConfigName=endpoint["EndpointConfigName"])
+
+
+def get_metric_sum(endpoint_name, variant_name, metric_name, start_time, end_time):
+    response = cloudwatch_client.get_metric_statistics(
+        Namespace=endpoint_rollout.METRICS_NAMESPACE,
+        MetricName=metric_name,
+        Dimensions=[
+            {"Name": "EndpointName", "Value": endpoint_name},
+            {"Name": "VariantName", "Value": variant_name},
+        ],
+        StartTime=start_time,
+        EndTime=end_time,
+        Period=endpoint_rollout.get_period(start_time, end_time),
+        Statistics=["Sum"],
+    )
+    return sum(datapoint["Sum"] for datapoint in response["Datapoints"])
+
+
+def get_error_rate(endpoint_name, variant_name, start_time, end_time):
+    invocations = get_metric_sum(endpoint_name, variant_name, "Invocations", start_time, end_time)
+    errors = sum(get_metric_sum(endpoint_name, variant_name, metric_name, start_time, end_time)
+                 for metric_name in ("Invocation4XXErrors", "Invocation5XXErrors"))
+    return {"invocations": invocations,
+            "error_rate": errors / invocations if invocations else None}
+
+
+def read_captured_predictions(capture_s3_uri, endpoint_name, variant_name, start_time, end_time):
+    """
+    Reads data capture records of a variant and maps each request body to its top labels.
+
+    Capture files are written under <capture uri>/<endpoint>/<variant>/yyyy/mm/dd/hh/.
+    """
+    bucket, _, prefix = capture_s3_uri.replace("s3://", "", 1).partition("/")
+    predictions = {}
+    hour = start_time.replace(minute=0, second=0, microsecond=0)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    while hour <= end_time:
+        hour_prefix = "/".join(part for part in [prefix.strip("/"), endpoint_name, variant_name,
+                                                  hour.strftime("%Y/%m/%d/%H")] if part)
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{hour_prefix}/"):
+            for obj in page.get("Contents", []):
+                body = s3_client.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read()
+                for line in body.decode().splitlines():
+                    capture_data = json.loads(line)["captureData"]
+                    request = decode_capture(capture_data["endpointInput"])
+                    response = json.loads(decode_capture(capture_data["endpointOutput"]))
+                    predictions[request] = [result["label"][0] for result in response]
+        hour += datetime.timedelta(hours=1)
+    return predictions
+
+
+def decode_capture(capture):
+    if capture.get("encoding") == "BASE64":
+        return base64.b64decode(capture["data"]).decode()
+    return capture["data"]
+
+
+def get_prediction_agreement(production_predictions, shadow_predictions):
+    """Fraction of headlines seen by both variants that got the same label."""
+    agreed = compared = 0
+    for request, shadow_labels in shadow_predictions.items():
+        production_labels = production_predictions.get(request)
+        if production_labels is None:
+            continue
+        for production_label, shadow_label in zip(production_labels, shadow_labels):
+            compared += 1
+            agreed += production_label == shadow_label
+    return {"compared": compared, "agreement": agreed / compared if compared else None}
+
+
+def report(endpoint_name, minutes):
+    """Compares the shadow variant against production over the last `minutes`."""
+    endpoint_config = describe_current_endpoint_config(endpoint_name)
+    assert endpoint_config.get("ShadowProductionVariants"), \
+        f"Endpoint {endpoint_name} has no shadow variant"
+    production_variant_name = endpoint_config["ProductionVariants"][0]["VariantName"]
+    shadow_variant_name = endpoint_config["ShadowProductionVariants"][0]["VariantName"]
+
+    end_time = datetime.datetime.now(tz=datetime.timezone.utc)
+    start_time = end_time - datetime.timedelta(minutes=minutes)
+    comparison = collections.OrderedDict()
+    for role, variant_name in [("production", production_variant_name),
+                               ("shadow", shadow_variant_name)]:
+        comparison[role] = {
+            "variant": variant_name,
+            "latency_ms": endpoint_rollout.get_latency_percentiles(endpoint_name, variant_name,
+                                                                   start_time, end_time),
+            **get_error_rate(endpoint_name, variant_name, start_time, end_time),
+        }
+
+    capture_config = endpoint_config.get("DataCaptureConfig")
+    if capture_config:
+        capture_s3_uri = capture_config["DestinationS3Uri"]
+        comparison["prediction_agreement"] = get_prediction_agreement(
+            read_captured_predictions(capture_s3_uri, endpoint_name, production_variant_name,
+                                      start_time, end_time),
+            read_captured_predictions(capture_s3_uri, endpoint_name, shadow_variant_name,
+                                      start_time, end_time))
+    else:
+        log.info("Data capture is disabled, prediction agreement is unavailable")
+    return comparison
+
+
+def promote(endpoint_name):
+    """Replaces the production model by the shadow model and drops the shadow variant."""
+    endpoint_config = describe_current_endpoint_config(endpoint_name)
+    assert endpoint_config.get("ShadowProductionVariants"), \
+        f"Endpoint {endpoint_name} has no shadow variant to promote"
+    production_variants = get_production_variants(endpoint_config)
+    production_variants[0]["ModelName"] = \
+        endpoint_config["ShadowProductionVariants"][0]["ModelName"]
+    update_production_variants(endpoint_name, production_variants, action="promote")
+
+
+def teardown(endpoint_name):
+    """Drops the shadow variant, leaving production untouched."""
+    endpoint_config = describe_current_endpoint_config(endpoint_name)
+    update_production_variants(endpoint_name, get_production_variants(endpoint_config),
+                               action="teardown")
+
+
+def update_production_variants(endpoint_name, production_variants, action):
+    """
+    Updates the endpoint to `production_variants` through the blue/green rollout of a deploy.
+
+    Raises:
+        RuntimeError: The rollback alarms rolled the update back.
+    """
+    now_str = datetime.datetime.now().isoformat().split('.')[0].replace(':', '-')
+    endpoint_config_name = f"{endpoint_name}-config-{action}-{now_str}"
+    variant_name = production_variants[0]["VariantName"]
+    log.info(f"Create EndpointConfig {endpoint_config_name} with {production_variants}")
+    sagemaker_client.create_endpoint_config(EndpointConfigName=endpoint_config_name,
+                                            ProductionVariants=production_variants)
+
+    # SageMaker rejects updates to registered scalable targets, re-applied once InService
+    endpoint_autoscaling.deregister_scalable_target(endpoint_name=endpoint_name,
+                                                    variant_name=variant_name)
+    endpoint_rollout.ensure_rollback_alarms(endpoint_name=endpoint_name,
+                                            variant_name=variant_name)
+    log.info(f"Updating Endpoint {endpoint_name} to {endpoint_config_name}")
+    sagemaker_client.update_endpoint(EndpointName=endpoint_name,
+                                     EndpointConfigName=endpoint_config_name,
+                                     DeploymentConfig=endpoint_rollout.build_deployment_config())
+    sagemaker_client.get_waiter("endpoint_in_service").wait(EndpointName=endpoint_name)
+    endpoint_autoscaling.apply_scaling_policy(endpoint_name=endpoint_name,
+                                              variant_name=variant_name,
+                                              config=endpoint_autoscaling.load_scaling_config())
+
+    endpoint = sagemaker_client.describe_endpoint(EndpointName=endpoint_name)
+    if endpoint["EndpointConfigName"] != endpoint_config_name:
+        raise RuntimeError(f"Endpoint {endpoint_name} rolled back to "
+                           f"{endpoint['EndpointConfigName']}, {action} did not complete")
+    log.info(f"Endpoint {endpoint_name} is InService with {endpoint_config_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shadow variant report, promotion and teardown.")
+    parser.add_argument("command", choices=["report", "promote", "teardown"])
+    parser.add_argument("--endpoint-name", default=ENDPOINT_NAME)
+    parser.add_argument("--minutes", type=int, default=60,
+                        help="Window of live traffic compared by report")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print(json.dumps(report(args.endpoint_name, args.minutes), indent=4))
+    elif args.command == "promote":
+        promote(args.endpoint_name)
+    else:
+        teardown(args.endpoint_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Tests for the continuation handling of create_or_update_endpoint.py against stubbed AWS clients.
+
+Run from deploy-pipeline/: python -m pytest tests
+"""
+import io
+import json
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import create_or_update_endpoint as deploy  # noqa: E402
+import endpoint_autoscaling  # noqa: E402
+
+NEW_CONFIG = "news-headlines-endpoint-config-new"
+OLD_CONFIG = "news-headlines-endpoint-config-old"
+MODEL_PACKAGE_ARN = "arn:aws:sagemaker:us-east-1:1:model-package/news/2"
+RESOURCE_ID = f"endpoint/{deploy.ENDPOINT_NAME}/variant/{deploy.VARIANT_NAME}"
+
+
+def make_token():
+    return {
+        deploy.TOKEN_ENDPOINT_CONFIG_NAME: NEW_CONFIG,
+        deploy.TOKEN_MODEL_PACKAGE_ARN: MODEL_PACKAGE_ARN,
+        deploy.TOKEN_DEPLOYED_AT: time.time() - 60,
+        deploy.TOKEN_PHASE_DURATIONS: {},
+    }
+
+
+class CheckDeploymentProgressTest(unittest.TestCase):
+
+    def setUp(self):
+        deploy.job_id_global = "job"
+        self.sagemaker = Stubber(deploy.sagemaker_client)
+        self.autoscaling = Stubber(endpoint_autoscaling.autoscaling_client)
+        self.sagemaker.activate()
+        self.autoscaling.activate()
+        self.addCleanup(self.sagemaker.deactivate)
+        self.addCleanup(self.autoscaling.deactivate)
+        for name in ("put_job_success", "put_job_failure", "put_job_continuation"):
+            patcher = mock.patch.object(deploy, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(deploy, "summarize_rollout", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def describe_endpoint(self, status, endpoint_config_name):
+        self.sagemaker.add_response(
+            "describe_endpoint",
+            {"EndpointName": deploy.ENDPOINT_NAME,
+             "EndpointArn": f"arn:aws:sagemaker:us-east-1:1:endpoint/{deploy.ENDPOINT_NAME}",
+             "EndpointStatus": status,
+             "EndpointConfigName": endpoint_config_name,
+             "CreationTime": 0, "LastModifiedTime": 0},
+            {"EndpointName": deploy.ENDPOINT_NAME})
+
+    def expect_scaling_policy(self):
+        self.autoscaling.add_response(
+            "register_scalable_target", {},
+            {"ServiceNamespace": "sagemaker", "ResourceId": RESOURCE_ID,
+             "ScalableDimension": endpoint_autoscaling.SCALABLE_DIMENSION,
+             "MinCapacity": endpoint_autoscaling.DEFAULT_MIN_CAPACITY,
+             "MaxCapacity": endpoint_autoscaling.DEFAULT_MAX_CAPACITY})
+        self.autoscaling.add_response("put_scaling_policy", {"PolicyARN": "arn:aws:autoscaling:us-east-1:1:scalingPolicy:policy"}, None)
+
+    def test_in_service_applies_scaling_and_succeeds(self):
+        self.describe_endpoint(deploy.IN_SERVICE, NEW_CONFIG)
+        self.expect_scaling_policy()
+
+        deploy.check_deployment_progress(make_token())
+
+        self.autoscaling.assert_no_pending_responses()
+        self.put_job_success.assert_called_once()
+        self.put_job_failure.assert_not_called()
+
+    def test_rolling_back_waits(self):
+        self.describe_endpoint("RollingBack", NEW_CONFIG)
+
+        deploy.check_deployment_progress(make_token())
+
+        self.put_job_continuation.assert_called_once()
+        self.put_job_failure.assert_not_called()
+
+    def test_rollback_restores_scaling_and_fails(self):
+        self.describe_endpoint(deploy.IN_SERVICE, OLD_CONFIG)
+        self.expect_scaling_policy()
+
+        with self.assertRaises(RuntimeError):
+            deploy.check_deployment_progress(make_token())
+
+        self.autoscaling.assert_no_pending_responses()
+        self.put_job_failure.assert_called_once()
+        self.put_job_success.assert_not_called()
+
+    def test_scaling_error_after_rollback_still_reports_deployment_failure(self):
+        self.describe_endpoint(deploy.IN_SERVICE, OLD_CONFIG)
+        self.autoscaling.add_client_error("register_scalable_target", "ValidationException")
+
+        with self.assertRaises(RuntimeError):
+            deploy.check_deployment_progress(make_token())
+
+        self.put_job_failure.assert_called_once()
+        self.assertIsInstance(self.put_job_failure.call_args.args[0], RuntimeError)
+
+    def test_failed_endpoint_fails_without_scaling(self):
+        self.describe_endpoint("Failed", NEW_CONFIG)
+
+        with self.assertRaises(RuntimeError):
+            deploy.check_deployment_progress(make_token())
+
+        self.put_job_failure.assert_called_once()
+
+
+class RetriedDeploymentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sagemaker = Stubber(deploy.sagemaker_client)
+        self.sagemaker.activate()
+        self.addCleanup(self.sagemaker.deactivate)
+        for (name, kwargs) in [("put_job_success", {}), ("put_job_failure", {}),
+                               ("put_job_continuation", {}),
+                               ("read_deployment_request",
+                                {"return_value": (MODEL_PACKAGE_ARN, deploy.PRODUCTION)})]:
+            patcher = mock.patch.object(deploy, name, **kwargs)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(os.environ, {"EXECUTION_ROLE_ARN": "arn:aws:iam::1:role/r"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def describe_config(self, endpoint_config_name, model_name, model_package_arn):
+        self.sagemaker.add_response(
+            "describe_endpoint_config",
+            {"EndpointConfigName": endpoint_config_name,
+             "EndpointConfigArn": f"arn:aws:sagemaker:us-east-1:1:endpoint-config/"
+                                  f"{endpoint_config_name}",
+             "ProductionVariants": [{"VariantName": deploy.VARIANT_NAME,
+                                     "ModelName": model_name}],
+             "CreationTime": 0},
+            {"EndpointConfigName": endpoint_config_name})
+        self.sagemaker.add_response(
+            "describe_model",
+            {"ModelName": model_name,
+             "ModelArn": f"arn:aws:sagemaker:us-east-1:1:model/{model_name}",
+             "CreationTime": 0,
+             "PrimaryContainer": {"ModelPackageName": model_package_arn}},
+            {"ModelName": model_name})
+
+    def test_retry_during_rollout_of_same_package_waits_instead_of_updating(self):
+        self.sagemaker.add_response(
+            "describe_endpoint",
+            {"EndpointName": deploy.ENDPOINT_NAME,
+             "EndpointArn": f"arn:aws:sagemaker:us-east-1:1:endpoint/{deploy.ENDPOINT_NAME}",
+             "EndpointStatus": "Updating",
+             "EndpointConfigName": OLD_CONFIG,
+             "PendingDeploymentSummary": {"EndpointConfigName": NEW_CONFIG},
+             "CreationTime": 0, "LastModifiedTime": 0},
+            {"EndpointName": deploy.ENDPOINT_NAME})
+        self.describe_config(NEW_CONFIG, "new-model", MODEL_PACKAGE_ARN)
+
+        deploy.lambda_handler({"CodePipeline.job": {"id": "job", "data": {}}}, None)
+
+        self.sagemaker.assert_no_pending_responses()
+        self.put_job_continuation.assert_called_once_with(
+            endpoint_config_name=NEW_CONFIG, model_package_arn=MODEL_PACKAGE_ARN)
+        self.put_job_failure.assert_not_called()
+
+
+class ReadDeploymentRequestTest(unittest.TestCase):
+
+    def test_artifact_client_honours_endpoint_url(self):
+        job_data = {
+            "artifactCredentials": {"accessKeyId": "a", "secretAccessKey": "s",
+                                    "sessionToken": "t"},
+            "inputArtifacts": [{"location": {"s3Location": {"bucketName": "b",
+                                                            "objectKey": "k"}}}],
+        }
+        s3_client = mock.Mock()
+        s3_client.get_object.return_value = {"Body": io.BytesIO(json.dumps(
+            {deploy.MODEL_PACKAGE_ARN: "arn", deploy.DEPLOYMENT_MODE: deploy.SHADOW}).encode())}
+
+        with mock.patch.dict(os.environ, {"AWS_ENDPOINT_URL": "http://localhost:4566"}), \
+                mock.patch.object(deploy.boto3, "client", return_value=s3_client) as client:
+            self.assertEqual(deploy.read_deployment_request(job_data), ("arn", deploy.SHADOW))
+
+        self.assertEqual(client.call_args.kwargs["endpoint_url"], "http://localhost:4566")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Tests for the rollback alarms of endpoint_rollout.py against a stubbed CloudWatch client.
+
+Run from deploy-pipeline/: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+from botocore.stub import ANY, Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import endpoint_rollout  # noqa: E402
+
+
+class RollbackAlarmsTest(unittest.TestCase):
+
+    def test_latency_statistic_scales_with_new_fleet_share(self):
+        self.assertEqual(endpoint_rollout.latency_alarm_statistic(10), "p99")
+        self.assertEqual(endpoint_rollout.latency_alarm_statistic(5), "p99.5")
+        self.assertEqual(endpoint_rollout.latency_alarm_statistic(100), "p90")
+
+    def test_latency_alarm_uses_tail_statistic_of_canary_share(self):
+        dimensions = [{"Name": "EndpointName", "Value": "endpoint"},
+                      {"Name": "VariantName", "Value": "variant"}]
+        with Stubber(endpoint_rollout.cloudwatch_client) as cloudwatch, \
+                mock.patch.dict(os.environ, {"ROLLOUT_TYPE": "CANARY",
+                                             "ROLLOUT_TRAFFIC_STEP_PERCENT": "20"}):
+            cloudwatch.add_response("put_metric_alarm", {}, {
+                "AlarmName": endpoint_rollout.MODEL_LATENCY_ALARM_NAME,
+                "Namespace": endpoint_rollout.METRICS_NAMESPACE,
+                "MetricName": endpoint_rollout.MODEL_LATENCY,
+                "Dimensions": dimensions,
+                "ExtendedStatistic": "p98",
+                "Period": ANY, "EvaluationPeriods": ANY, "Threshold": ANY,
+                "ComparisonOperator": ANY, "TreatMissingData": ANY,
+            })
+            cloudwatch.add_response("put_metric_alarm", {}, None)
+
+            endpoint_rollout.ensure_rollback_alarms(endpoint_name="endpoint",
+                                                    variant_name="variant")
+            cloudwatch.assert_no_pending_responses()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests that endpoint_shadow.py promotes and tears down through the rollout of a production deploy.
+
+Run from deploy-pipeline/: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import endpoint_rollout  # noqa: E402
+import endpoint_shadow  # noqa: E402
+
+ENDPOINT_CONFIG = {
+    "ProductionVariants": [{"VariantName": "variant-1", "ModelName": "production-model",
+                            "InitialInstanceCount": 1, "InstanceType": "ml.m5.xlarge",
+                            "InitialVariantWeight": 1.0, "CurrentWeight": 1.0}],
+    "ShadowProductionVariants": [{"VariantName": endpoint_shadow.SHADOW_VARIANT_NAME,
+                                  "ModelName": "shadow-model",
+                                  "InitialInstanceCount": 1, "InstanceType": "ml.m5.xlarge",
+                                  "InitialVariantWeight": 1.0}],
+}
+
+
+class UpdateProductionVariantsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sagemaker_client = self.patch(endpoint_shadow, "sagemaker_client")
+        self.sagemaker_client.describe_endpoint_config.return_value = ENDPOINT_CONFIG
+        self.ensure_rollback_alarms = self.patch(endpoint_rollout, "ensure_rollback_alarms")
+        self.deregister = self.patch(endpoint_shadow.endpoint_autoscaling,
+                                     "deregister_scalable_target")
+        self.apply_scaling = self.patch(endpoint_shadow.endpoint_autoscaling,
+                                        "apply_scaling_policy")
+
+    def patch(self, target, name):
+        patcher = mock.patch.object(target, name)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def describe_endpoint(self, EndpointName):
+        """Serves the config of the last update_endpoint call, as after a completed rollout."""
+        update = self.sagemaker_client.update_endpoint.call_args
+        return {"EndpointConfigName":
+                update.kwargs["EndpointConfigName"] if update else "endpoint-config-old"}
+
+    def test_promote_rolls_out_shadow_model_behind_rollback_alarms(self):
+        self.sagemaker_client.describe_endpoint.side_effect = self.describe_endpoint
+
+        endpoint_shadow.promote("endpoint")
+
+        create_kwargs = self.sagemaker_client.create_endpoint_config.call_args.kwargs
+        self.assertEqual(create_kwargs["ProductionVariants"][0]["ModelName"], "shadow-model")
+        self.assertNotIn("ShadowProductionVariants", create_kwargs)
+        self.ensure_rollback_alarms.assert_called_once_with(endpoint_name="endpoint",
+                                                            variant_name="variant-1")
+        update_kwargs = self.sagemaker_client.update_endpoint.call_args.kwargs
+        self.assertEqual(update_kwargs["DeploymentConfig"],
+                         endpoint_rollout.build_deployment_config())
+        self.deregister.assert_called_once()
+        self.apply_scaling.assert_called_once()
+
+    def test_rolled_back_teardown_raises_after_restoring_scaling(self):
+        self.sagemaker_client.describe_endpoint.return_value = {
+            "EndpointConfigName": "endpoint-config-old"}
+
+        with self.assertRaises(RuntimeError):
+            endpoint_shadow.teardown("endpoint")
+
+        self.assertIn("DeploymentConfig", self.sagemaker_client.update_endpoint.call_args.kwargs)
+        self.apply_scaling.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,6 +12,9 @@ MODEL_PACKAGE_GROUP_NAME = "ModelPackageGroupName"
 NEWS_HEADLINES = "news-headlines"
 MODEL_APPROVAL_STATUS = "ModelApprovalStatus"
 MODEL_PACKAGE_ARN = "ModelPackageArn"
+CUSTOMER_METADATA_PROPERTIES = "CustomerMetadataProperties"
+DEPLOYMENT_MODE = "DeploymentMode"
+PRODUCTION = "Production"
 APPROVED = "Approved"
 OBJECT_KEY = "approved-model.json"
 
@@ -51,8 +54,11 @@ def lambda_handler(event, context):
         return
 
     log.info(f"Updating s3://{bucket_name}/{OBJECT_KEY}")
+    # a "DeploymentMode": "Shadow" metadata property deploys the package as a shadow variant
+    deployment_mode = detail.get(CUSTOMER_METADATA_PROPERTIES, {}).get(DEPLOYMENT_MODE, PRODUCTION)
     json_data = json.dumps({
-        MODEL_PACKAGE_ARN: model_package_arn
+        MODEL_PACKAGE_ARN: model_package_arn,
+        DEPLOYMENT_MODE: deployment_mode,
     })
     s3_client.put_object(Body=json_data, Bucket=bucket_name, Key=OBJECT_KEY)
 
@@ -6,6 +6,7 @@ import * as path from 'path'
 import * as s3 from 'aws-cdk-lib/aws-s3'
 
 const ASSET_PACKAGE_PATH = path.join("..", "deploy-pipeline")
+const SHADOW_CAPTURE_PREFIX = "shadow-capture"
 
 export interface DeploymentPipelineLambdasProps extends cdk.StackProps {
     dataBucket: s3.Bucket
@@ -40,12 +41,35 @@ export class DeploymentPipelineLambdasStack extends cdk.Stack {
         this.createOrUpdateEndpoint = new lambda.Function(this, "CreateOrUpdateEndpoint", {
             ...commonLambdaProps,
             handler: "create_or_update_endpoint.lambda_handler",
-            timeout: cdk.Duration.minutes(7),
+            timeout: cdk.Duration.minutes(3),
             environment: {
                 EXECUTION_ROLE_ARN: props.sagemakerExecutionRole.roleArn,
+                AUTOSCALING_MIN_CAPACITY: "1",
+                AUTOSCALING_MAX_CAPACITY: "4",
+                AUTOSCALING_TARGET_INVOCATIONS_PER_INSTANCE: "70",
+                AUTOSCALING_SCALE_IN_COOLDOWN: "300",
+                AUTOSCALING_SCALE_OUT_COOLDOWN: "60",
+                ROLLOUT_TYPE: "CANARY",
+                ROLLOUT_TRAFFIC_STEP_PERCENT: "10",
+                ROLLOUT_WAIT_INTERVAL_SECONDS: "300",
+                ROLLOUT_TERMINATION_WAIT_SECONDS: "300",
+                SHADOW_SAMPLING_PERCENT: "100",
+                SHADOW_CAPTURE_S3_URI: `s3://${props.dataBucket.bucketName}/${SHADOW_CAPTURE_PREFIX}`,
             },
         })
         this.setupCreateOrUpdateEndpoint(props.dataBucket)
+        this.setupShadowCapturePermissions(props.dataBucket, props.sagemakerExecutionRole)
+    }
+
+    setupShadowCapturePermissions(dataBucket: s3.Bucket, sagemakerExecutionRole: iam.Role) {
+        // endpoints run as the sagemaker execution role, which writes the shadow data capture
+        new iam.Policy(this, "ShadowCapturePolicy", {
+            roles: [sagemakerExecutionRole],
+            statements: [new iam.PolicyStatement({
+                actions: ["s3:PutObject"],
+                resources: [dataBucket.arnForObjects(`${SHADOW_CAPTURE_PREFIX}/*`)],
+            })],
+        })
     }
 
     setupTriggerModelDeployPermissions(dataBucket: s3.Bucket) {
@@ -78,9 +102,35 @@ export class DeploymentPipelineLambdasStack extends cdk.Stack {
                 "sagemaker:CreateEndpointConfig",
                 "sagemaker:CreateModel",
                 "sagemaker:DescribeEndpoint",
+                "sagemaker:DescribeEndpointConfig",
+                "sagemaker:DescribeModel",
                 "sagemaker:UpdateEndpoint",
+                "sagemaker:UpdateEndpointWeightsAndCapacities",
+            ],
+            resources: ["*"],
+        }))
+
+        this.createOrUpdateEndpoint.addToRolePolicy(new iam.PolicyStatement({
+            actions: [
+                "application-autoscaling:DeregisterScalableTarget",
+                "application-autoscaling:DescribeScalableTargets",
+                "application-autoscaling:PutScalingPolicy",
+                "application-autoscaling:RegisterScalableTarget",
+                "cloudwatch:DeleteAlarms",
+                "cloudwatch:DescribeAlarms",
+                "cloudwatch:GetMetricStatistics",
+                "cloudwatch:PutMetricAlarm",
             ],
             resources: ["*"],
         }))
+        this.createOrUpdateEndpoint.addToRolePolicy(new iam.PolicyStatement({
+            actions: ["iam:CreateServiceLinkedRole"],
+            resources: ["*"],
+            conditions: {
+                StringLike: {
+                    "iam:AWSServiceName": "sagemaker.application-autoscaling.amazonaws.com",
+                },
+            },
+        }))
     }
 }
@@ -7,10 +7,21 @@ import { DockerImageAsset } from 'aws-cdk-lib/aws-ecr-assets';
 import * as utility from './utility'
 import * as path from 'path'
 import * as logs from 'aws-cdk-lib/aws-logs'
-
-const APPLICATION_DIRECTORY = path.join("..", "application")
+import * as dynamodb from 'aws-cdk-lib/aws-dynamodb'
+
+// the application image also copies sm-pipeline/scripts/first_tier_model.py, so it is built
+// from the repository root with everything else excluded
+const REPOSITORY_ROOT = ".."
+const APPLICATION_DOCKERFILE = path.join("application", "Dockerfile")
+const APPLICATION_IMAGE_EXCLUDE = [
+  '*',
+  '!application',
+  '!sm-pipeline/scripts/first_tier_model.py',
+  '**/__pycache__',
+]
 const PORT = 80
 const LOG_GROUP_NAME = "EcsApplicationLogs"
+const RESULT_STORE_TTL_ATTRIBUTE = "expires_at"
 
 export class EcsApplicationStack extends cdk.Stack {
   constructor(scope: cdk.App, id: string, props?: cdk.StackProps) {
@@ -25,7 +36,9 @@ export class EcsApplicationStack extends cdk.Stack {
 
     // Create ECR asset
     const imageAsset = new DockerImageAsset(this, 'DockerImageAsset', {
-      directory: APPLICATION_DIRECTORY,
+      directory: REPOSITORY_ROOT,
+      file: APPLICATION_DOCKERFILE,
+      exclude: APPLICATION_IMAGE_EXCLUDE,
     });
 
     // Log group for ECS logs
@@ -33,6 +46,14 @@ export class EcsApplicationStack extends cdk.Stack {
         logGroupName: LOG_GROUP_NAME,
     })
 
+    // Result store shared by all tasks, entries expire through TTL
+    const resultStoreTable = new dynamodb.Table(this, 'ResultStoreTable', {
+      partitionKey: { name: 'key', type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: RESULT_STORE_TTL_ATTRIBUTE,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
     // Create Task definition
     const taskDefinition = new ecs.FargateTaskDefinition(this, 'FargetTaskDefinition');
 
@@ -44,6 +65,11 @@ export class EcsApplicationStack extends cdk.Stack {
         streamPrefix: "EcsApplication",
         logGroup: logGroup,
         }),
+      environment: {
+        RESULT_STORE_TABLE: resultStoreTable.tableName,
+        // first tier registered with the serving model package, see application/cascade.py
+        CASCADE_ENABLED: 'true',
+      },
     });
 
     container.addPortMappings({
@@ -52,9 +78,26 @@ export class EcsApplicationStack extends cdk.Stack {
 
     // Configure task permission
     taskDefinition.taskRole.addToPrincipalPolicy(new iam.PolicyStatement({
-      actions: ['sagemaker:InvokeEndpoint'],
+      actions: [
+        'sagemaker:InvokeEndpoint',
+        'sagemaker:DescribeEndpoint',
+        // resolve the model package serving the endpoint, the result store's model version
+        'sagemaker:DescribeEndpointConfig',
+        'sagemaker:DescribeModel',
+      ],
       resources: ['*'],
     }));
+    resultStoreTable.grantReadWriteData(taskDefinition.taskRole);
+
+    // Local multi-model engine reads model package artifacts
+    taskDefinition.taskRole.addToPrincipalPolicy(new iam.PolicyStatement({
+      actions: ['sagemaker:DescribeModelPackage', 'sagemaker:ListModelPackages'],
+      resources: ['*'],
+    }));
+    taskDefinition.taskRole.addToPrincipalPolicy(new iam.PolicyStatement({
+      actions: ['s3:GetObject'],
+      resources: ['arn:aws:s3:::sagemaker-*/*'],
+    }));
 
 
     // Create security group
@@ -4,14 +4,35 @@ import * as fs from 'fs'
 import * as iam from 'aws-cdk-lib/aws-iam'
 import * as path from 'path'
 import * as s3 from 'aws-cdk-lib/aws-s3'
+import * as s3deploy from 'aws-cdk-lib/aws-s3-deployment'
 import * as sagemaker from 'aws-cdk-lib/aws-sagemaker'
+import { DockerImageAsset } from 'aws-cdk-lib/aws-ecr-assets'
 import { execSync } from 'child_process'
 
-const PIPELINE_NAME = "NEWS-HEADLINES-PIPELINE"
 const SM_PIPELINE_PATH = path.join("..", "sm-pipeline");
 const PIPELINE_PY_PATH = path.join(SM_PIPELINE_PATH, "pipeline.py")
-const PIPELINE_JSON_PATH = path.join(SM_PIPELINE_PATH, "pipeline.json")
+// one pipeline per TRAINING_MODE of pipeline.py
+const PIPELINES = [
+    {
+        id: "ModelPipeline",
+        pipelineName: "NEWS-HEADLINES-PIPELINE",
+        trainingMode: "full",
+        jsonPath: path.join(SM_PIPELINE_PATH, "pipeline.json"),
+    },
+    {
+        id: "IncrementalModelPipeline",
+        pipelineName: "NEWS-HEADLINES-INCREMENTAL-PIPELINE",
+        trainingMode: "incremental",
+        jsonPath: path.join(SM_PIPELINE_PATH, "pipeline-incremental.json"),
+    },
+]
 const DATA_BUCKET_NAME = "DataBucketName"
+const ARTIFACT_BUCKET_NAME = "ArtifactBucketName"
+const PROCESSING_IMAGE_URI = "ProcessingImageUri"
+const PROCESSING_IMAGE_DOCKERFILE = path.join("processing-image", "Dockerfile")
+// processing steps read their scripts from here, see SCRIPTS_KEY_PREFIX in pipeline.py
+const SCRIPTS_PATH = path.join(SM_PIPELINE_PATH, "scripts")
+const SCRIPTS_KEY_PREFIX = "pipeline/scripts"
 
 export interface SagemakerModelPipelineStackProps extends cdk.StackProps {
     dataBucket: s3.Bucket
@@ -20,33 +41,78 @@ export interface SagemakerModelPipelineStackProps extends cdk.StackProps {
 export class SagemakerModelPipelineStack extends cdk.Stack {
     constructor(scope: cdk.App, id: string, props: SagemakerModelPipelineStackProps) {
         super(scope, id, props);
-        
-        // run the python script and fetch the pipeline body
-        execSync(`python ${PIPELINE_PY_PATH}`)
-        const pipelineDefinitionJson = fs.readFileSync(PIPELINE_JSON_PATH, 'utf-8')
-        const pipelineDefinitionBody = JSON.parse(pipelineDefinitionJson)
+
+        // processing image with the preprocessing and evaluation dependencies baked in
+        const processingImage = new DockerImageAsset(this, 'ProcessingImage', {
+            directory: SM_PIPELINE_PATH,
+            file: PROCESSING_IMAGE_DOCKERFILE,
+        })
+
+        // scripts run by the processing steps, the definitions only reference them
+        new s3deploy.BucketDeployment(this, 'DeployPipelineScripts', {
+            sources: [s3deploy.Source.asset(SCRIPTS_PATH, { exclude: ['__pycache__'] })],
+            destinationBucket: props.dataBucket,
+            destinationKeyPrefix: SCRIPTS_KEY_PREFIX,
+        })
+
+        // job outputs and model artifacts, the sagemaker- prefix keeps them readable by the
+        // application's model engine
+        const artifactBucket = new s3.Bucket(this, 'ArtifactBucket', {
+            bucketName: `sagemaker-news-headlines-${this.account}-${this.region}`,
+        })
+
+        // create the model pipelines
+        const role = this.createSagemakerPipelineRole(props, artifactBucket);
+        PIPELINES.forEach((pipeline) => {
+            // build the pipeline body, the file is only rewritten when the definition changed
+            execSync(`python ${PIPELINE_PY_PATH} --training-mode ${pipeline.trainingMode} ` +
+                `--output ${pipeline.jsonPath}`)
+            const pipelineDefinitionJson = fs.readFileSync(pipeline.jsonPath, 'utf-8')
+            const pipelineDefinitionBody = this.setParameterDefaults(
+                JSON.parse(pipelineDefinitionJson), props, artifactBucket, processingImage)
+
+            new sagemaker.CfnPipeline(this, pipeline.id, {
+                pipelineName: pipeline.pipelineName,
+                pipelineDefinition: {
+                    PipelineDefinitionBody: JSON.stringify(pipelineDefinitionBody),
+                },
+                roleArn: role.roleArn,
+            })
+        })
+    }
+
+    private setParameterDefaults(pipelineDefinitionBody: any,
+                                 props: SagemakerModelPipelineStackProps,
+                                 artifactBucket: s3.Bucket,
+                                 processingImage: DockerImageAsset) {
         let foundDataBucketNameParameter = false
+        let foundArtifactBucketNameParameter = false
+        let foundProcessingImageUriParameter = false
         pipelineDefinitionBody["Parameters"].forEach((param: any) => {
             if (param["Name"] == DATA_BUCKET_NAME) {
                 param["DefaultValue"] = props.dataBucket.bucketName
                 foundDataBucketNameParameter = true
             }
+            if (param["Name"] == ARTIFACT_BUCKET_NAME) {
+                param["DefaultValue"] = artifactBucket.bucketName
+                foundArtifactBucketNameParameter = true
+            }
+            if (param["Name"] == PROCESSING_IMAGE_URI) {
+                param["DefaultValue"] = processingImage.imageUri
+                foundProcessingImageUriParameter = true
+            }
         });
         assert.ok(foundDataBucketNameParameter,
             `Parameter with "Name" == ${DATA_BUCKET_NAME} not in pipelineDefinition`)
-
-        // create the model pipeline
-        const role = this.createSagemakerPipelineRole(props);
-        new sagemaker.CfnPipeline(this, 'ModelPipeline', {
-            pipelineName: PIPELINE_NAME,
-            pipelineDefinition: {
-                PipelineDefinitionBody: JSON.stringify(pipelineDefinitionBody),
-            },
-            roleArn: role.roleArn,
-        })
+        assert.ok(foundArtifactBucketNameParameter,
+            `Parameter with "Name" == ${ARTIFACT_BUCKET_NAME} not in pipelineDefinition`)
+        assert.ok(foundProcessingImageUriParameter,
+            `Parameter with "Name" == ${PROCESSING_IMAGE_URI} not in pipelineDefinition`)
+        return pipelineDefinitionBody
     }
 
-    private createSagemakerPipelineRole(props: SagemakerModelPipelineStackProps) {
+    private createSagemakerPipelineRole(props: SagemakerModelPipelineStackProps,
+                                        artifactBucket: s3.Bucket) {
         
         // create service-linked-role for sagemaker
         const role = new iam.Role(this, "SageMakerRole", {
@@ -65,6 +131,7 @@ export class SagemakerModelPipelineStack extends cdk.Stack {
                 `${props.dataBucket.bucketArn}/*`,
             ],
         }));
+        artifactBucket.grantReadWrite(role);
         return role;
     }
 }
@@ -1,39 +1,75 @@
+"""
+Builds the news-headlines model pipeline definition.
+
+Importing this module has no side effects. `PipelineBuilder` creates the session and each step
+on first use, and every location the SDK would otherwise resolve by calling AWS (the execution
+role, the region, the default bucket, uploads of local code) is either passed in or derived
+offline, so the definition can be generated and inspected without credentials or network:
+
+    builder = PipelineBuilder(role="arn:aws:iam::123456789012:role/SageMakerRole",
+                              region="us-east-1")
+    definition = builder.definition()
+
+The processing steps read `scripts/` from s3://<DataBucketName>/pipeline/scripts, which the
+SagemakerModelPipelineStack keeps in sync, instead of uploading them when the definition is
+generated.
+
+EXAMPLE:
+    python pipeline.py --training-mode incremental --role-arn arn:aws:iam::123456789012:role/r
+"""
+import argparse
+import functools
+import hashlib
 import json
 import os
+import pprint
 from os.path import join
 
+import boto3
 import sagemaker
-from sagemaker import Session, get_execution_role
-from sagemaker.amazon.amazon_estimator import get_image_uri
+from sagemaker import get_execution_role, image_uris
 from sagemaker.inputs import TrainingInput
 from sagemaker.model import Model
 from sagemaker.model_metrics import MetricsSource, ModelMetrics
-from sagemaker.processing import ProcessingInput, ProcessingOutput
-from sagemaker.sklearn.processing import SKLearnProcessor
+from sagemaker.processing import ProcessingInput, ProcessingOutput, Processor
 from sagemaker.transformer import Transformer
 from sagemaker.workflow import parameters
+from sagemaker.workflow.condition_step import ConditionStep
+from sagemaker.workflow.conditions import ConditionGreaterThanOrEqualTo, ConditionLessThanOrEqualTo
+from sagemaker.workflow.execution_variables import ExecutionVariables
+from sagemaker.workflow.fail_step import FailStep
+from sagemaker.workflow.functions import Join, JsonGet
 from sagemaker.workflow.model_step import ModelStep
 from sagemaker.workflow.pipeline import Pipeline
 from sagemaker.workflow.properties import PropertyFile
 from sagemaker.workflow.steps import ProcessingStep, TrainingStep, TransformStep
-from sagemaker.workflow.functions import Join
 
 from scripts import constants
 
-sagemaker_session = Session()
-boto_session = sagemaker_session.boto_session
 current_file_dir = os.path.dirname(__file__)
-role = get_execution_role()
-
-data_bucket_name = parameters.ParameterString(name="DataBucketName")
 
 BASE_JOB_NAME = "news-headlines-sentiment-analysis"
-IS_LOCAL_PIPELINE = False
 MODEL_PACKAGE_GROUP_NAME = "news-headlines"
-PIPELINE_DEFINITION_JSON_FILE_NAME = "pipeline.json"
-PIPELINE_NAME = "news-headlines"
-PRINT_DEFINITION = True
-SKLEARN_FRAMEWORK_VERSION = "1.0-1"
+PROCESSING_COMMAND = ["python3"]
+# where the SagemakerModelPipelineStack deploys scripts/ in the data bucket
+SCRIPTS_KEY_PREFIX = ["pipeline", "scripts"]
+
+# full: BlazingText trains from scratch, incremental: fastText retrains seeded by the latest
+# approved model, see scripts/incremental_training.py
+FULL_TRAINING_MODE = constants.FULL_TRAINING_MODE
+INCREMENTAL_TRAINING_MODE = constants.INCREMENTAL_TRAINING_MODE
+PIPELINE_NAMES = {
+    FULL_TRAINING_MODE: "news-headlines",
+    INCREMENTAL_TRAINING_MODE: "news-headlines-incremental",
+}
+PIPELINE_DEFINITION_JSON_FILE_NAMES = {
+    FULL_TRAINING_MODE: "pipeline.json",
+    INCREMENTAL_TRAINING_MODE: "pipeline-incremental.json",
+}
+
+data_bucket_name = parameters.ParameterString(name="DataBucketName")
+# prebuilt image with the processing dependencies, see processing-image/Dockerfile
+processing_image_uri = parameters.ParameterString(name="ProcessingImageUri")
 
 preprocessing_instance_type = parameters.ParameterString(
     name="PreprocessingInstanceType", default_value="ml.m5.large")
@@ -46,6 +82,11 @@ training_instance_count = parameters.ParameterInteger(
     name="TrainingInstanceCount", default_value=1)
 training_instance_max_run = parameters.ParameterInteger(
     name="TrainingInstanceMaxRun", default_value=3600)
+# BlazingText's supervised mode reads File or FastFile channels and trains on one instance.
+# Sharded vs replicated train channels are not compared: ShardedByS3Key would only give that
+# single instance part of the train set, so both channels stay FullyReplicated.
+training_input_mode = parameters.ParameterString(
+    name="TrainingInputMode", default_value="File", enum_values=["File", "FastFile"])
 
 model_instance_type = parameters.ParameterString(
     name="ModelInstanceType", default_value="ml.m5.xlarge")
@@ -63,6 +104,24 @@ evaluation_instance_count = parameters.ParameterInteger(
 inference_instance_type = parameters.ParameterString(
     name="InferenceInstanceType", default_value="ml.m5.xlarge")
 
+accuracy_threshold = parameters.ParameterFloat(
+    name="AccuracyThreshold", default_value=0.45)
+# in-process model compute, which ModelEvaluation measures at about 0.02-0.06 ms per headline,
+# not the endpoint's serving latency that the rollout alarms watch
+model_latency_budget_p99_ms = parameters.ParameterFloat(
+    name="ModelLatencyBudgetP99Ms", default_value=0.5)
+
+incremental_training_instance_type = parameters.ParameterString(
+    name="IncrementalTrainingInstanceType", default_value="ml.m5.xlarge")
+vocabulary_drift_threshold = parameters.ParameterFloat(
+    name="VocabularyDriftThreshold", default_value=0.2)
+accuracy_loss_threshold = parameters.ParameterFloat(
+    name="AccuracyLossThreshold", default_value=0.02)
+incremental_epochs = parameters.ParameterInteger(
+    name="IncrementalEpochs", default_value=5)
+replay_ratio = parameters.ParameterInteger(
+    name="ReplayRatio", default_value=4)
+
 
 def generate_step_name(step):
     """Generate a step name for the given step.
@@ -76,228 +135,502 @@ def generate_step_name(step):
     return f"{step}"
 
 
-if IS_LOCAL_PIPELINE:
-    pipeline_session = sagemaker.workflow.pipeline_context.LocalPipelineSession()
-else:
-    pipeline_session = sagemaker.workflow.pipeline_context.PipelineSession()
-
-
-# Preprocessing Step
-preprocessing_sklearn_processor = SKLearnProcessor(
-    framework_version=SKLEARN_FRAMEWORK_VERSION,
-    instance_type=preprocessing_instance_type,
-    instance_count=preprocessing_instance_count,
-    base_job_name=BASE_JOB_NAME,
-    role=role,
-    sagemaker_session=pipeline_session,
-)
-
-preprocessing_step = ProcessingStep(
-    name=generate_step_name("Preprocessing"),
-    processor=preprocessing_sklearn_processor,
-    inputs=[
-        ProcessingInput(
-            source=join(current_file_dir, "scripts"),
+class PipelineBuilder:
+    """Lazily builds the steps and the definition of one training mode of the model pipeline.
+
+    Args:
+        training_mode: FULL_TRAINING_MODE or INCREMENTAL_TRAINING_MODE.
+        role: Execution role ARN of the jobs, looked up with get_execution_role() if None.
+        region: AWS region, read from the local AWS configuration if None.
+        artifact_bucket: Default of the ArtifactBucketName parameter, the bucket for job outputs.
+            The SagemakerModelPipelineStack sets it to the bucket it creates.
+        local: Build for a LocalPipelineSession.
+    """
+
+    def __init__(self, training_mode=FULL_TRAINING_MODE, role=None, region=None,
+                 artifact_bucket=None, local=False):
+        assert training_mode in PIPELINE_NAMES, \
+            f"training_mode must be one of {list(PIPELINE_NAMES)}"
+        self.training_mode = training_mode
+        self.is_incremental = training_mode == INCREMENTAL_TRAINING_MODE
+        self.pipeline_name = PIPELINE_NAMES[training_mode]
+        self.region = region or boto3.Session().region_name
+        assert self.region, "region is not configured, pass it explicitly"
+        self.local = local
+        self._role = role
+        self._artifact_bucket = artifact_bucket
+
+    @functools.cached_property
+    def pipeline_session(self):
+        boto_session = boto3.Session(region_name=self.region)
+        if self.local:
+            return sagemaker.workflow.pipeline_context.LocalPipelineSession(
+                boto_session=boto_session)
+        return sagemaker.workflow.pipeline_context.PipelineSession(
+            boto_session=boto_session, default_bucket=self._artifact_bucket)
+
+    @functools.cached_property
+    def role(self):
+        if self._role:
+            return self._role
+        return get_execution_role(sagemaker.Session(boto3.Session(region_name=self.region)))
+
+    @functools.cached_property
+    def artifact_bucket(self):
+        return parameters.ParameterString(name="ArtifactBucketName",
+                                          default_value=self._artifact_bucket)
+
+    def output_uri(self, step_name, *names):
+        """S3 location for the outputs of a step of the current execution.
+
+        Same layout the SDK uses, in the ArtifactBucketName bucket so the default bucket is never
+        looked up.
+        """
+        return Join(on="/", values=["s3:/", self.artifact_bucket, self.pipeline_name,
+                                    ExecutionVariables.PIPELINE_EXECUTION_ID, step_name, *names])
+
+    def scripts_input(self):
+        return ProcessingInput(
+            source=Join(on="/", values=["s3:/", data_bucket_name, *SCRIPTS_KEY_PREFIX]),
             destination=str(constants.SCRIPTS_DIR),
-        ),
-        ProcessingInput(
+        )
+
+    def data_input(self):
+        return ProcessingInput(
             source=Join(
                 on="/",
                 values=["s3:/", data_bucket_name, "raw", "sentiment", "data", "data.csv"],
             ),
             destination=str(constants.INPUT_DIR),
-        ),
-    ],
-    outputs=[
-        ProcessingOutput(output_name=output_name, source=str(source))
-        for (output_name, source) in [
-            (constants.TRAIN_CHANNEL, constants.TRAIN_DIR),
-            (constants.VAL_CHANNEL, constants.VAL_DIR),
-            (constants.TEST_CHANNEL, constants.TEST_DIR),
-            (constants.LABELS_CHANNEL, constants.LABELS_DIR),
-        ]
-    ],
-    code=join(current_file_dir, "scripts/run_preprocessing.py"),
-)
-
-# Training Step
-blazing_text_container = get_image_uri(boto_session.region_name, "blazingtext", "latest")
-blazing_text_estimator = sagemaker.estimator.Estimator(
-    blazing_text_container,
-    role,
-    instance_count=training_instance_count,
-    instance_type=training_instance_type,
-    volume_size=30,
-    max_run=training_instance_max_run,
-    input_mode="File",
-    hyperparameters={
-        "mode": "supervised",
-        "epochs": 100,
-        "min_count": 2,
-        "learning_rate": 0.05,
-        "vector_dim": 10,
-        "early_stopping": True,
-        "patience": 4,
-        "min_epochs": 5,
-        "word_ngrams": 2,
-    },
-)
-
-preproc_step_outputs = preprocessing_step.properties.ProcessingOutputConfig.Outputs
-
-estimator_inputs = {
-    constants.TRAIN_CHANNEL: TrainingInput(
-        s3_data=preproc_step_outputs[constants.TRAIN_CHANNEL].S3Output.S3Uri,
-        distribution="FullyReplicated",
-        content_type="text/plain",
-        s3_data_type="S3Prefix",
-    ),
-    constants.VAL_CHANNEL: TrainingInput(
-        s3_data=preproc_step_outputs[constants.VAL_CHANNEL].S3Output.S3Uri,
-        distribution="FullyReplicated",
-        content_type="text/plain",
-        s3_data_type="S3Prefix",
-    ),
-}
-
-training_step = TrainingStep(
-    name=generate_step_name("Training"),
-    estimator=blazing_text_estimator,
-    inputs=estimator_inputs,
-)
-
-# Create Model step
-model = Model(
-    image_uri=blazing_text_estimator.training_image_uri(),
-    model_data=training_step.properties.ModelArtifacts.S3ModelArtifacts,
-    sagemaker_session=pipeline_session,
-    role=role,
-)
-
-model_step = ModelStep(
-   name=generate_step_name("CreateModel"),
-   step_args=model.create(instance_type=model_instance_type),
-)
-
-# Batch Transform step
-transformer = Transformer(
-    model_name=model_step.properties.ModelName,
-    instance_count=transform_instance_count,
-    instance_type=transform_instance_type,
-    sagemaker_session=pipeline_session,
-    assemble_with="Line",
-    strategy="SingleRecord",
-)
-
-transform_step = TransformStep(
-    name=generate_step_name("BatchTransform"),
-    step_args=transformer.transform(
-        data=preproc_step_outputs[constants.TEST_CHANNEL].S3Output.S3Uri,
-        split_type="Line",
-        content_type="application/jsonlines",
-    ),
-)
-
-# Model Evaluation step
-evaluation_sklearn_processor = sagemaker.sklearn.processing.SKLearnProcessor(
-    framework_version=SKLEARN_FRAMEWORK_VERSION,
-    instance_type=evaluation_instance_type,
-    instance_count=evaluation_instance_count,
-    base_job_name=BASE_JOB_NAME,
-    role=role,
-    sagemaker_session=pipeline_session,
-)
-
-evaluation_step = ProcessingStep(
-    name=generate_step_name("ModelEvaluation"),
-    processor=evaluation_sklearn_processor,
-    inputs=[
-        ProcessingInput(
-            source=join(current_file_dir, "scripts"),
-            destination=str(constants.SCRIPTS_DIR),
-        ),
-        ProcessingInput(
-            source=transform_step.properties.TransformOutput.S3OutputPath,
-            destination=str(constants.INPUT_TRANSFORM_DIR),
-        ),
-        ProcessingInput(
-            source=preproc_step_outputs[constants.LABELS_CHANNEL].S3Output.S3Uri,
-            destination=str(constants.INPUT_LABELS_DIR),
-        ),
-    ],
-    outputs=[
-        ProcessingOutput(
-            output_name=constants.EVALUATION_CHANNEL,
-            source=str(constants.EVALUATION_DIR),
-        ),
-    ],
-    code=join(current_file_dir, 'scripts/run_evaluation.py'),
-)
-
-# Register Model step
-evaluation_step_outputs = evaluation_step.properties.ProcessingOutputConfig.Outputs
-
-register_model_step_args = model.register(
-    content_types=["application/json"],
-    response_types=["application/json"],
-    inference_instances=[inference_instance_type],
-    transform_instances=[transform_instance_type],
-    model_package_group_name=MODEL_PACKAGE_GROUP_NAME,
-    model_metrics=ModelMetrics(
-        model_statistics=MetricsSource(
-            s3_uri=Join(
+        )
+
+    def processor(self, script_name, instance_type, instance_count):
+        """Processor running `scripts/<script_name>` in the prebuilt processing image."""
+        return Processor(
+            image_uri=processing_image_uri,
+            entrypoint=PROCESSING_COMMAND + [str(constants.SCRIPTS_DIR / script_name)],
+            instance_type=instance_type,
+            instance_count=instance_count,
+            base_job_name=BASE_JOB_NAME,
+            role=self.role,
+            sagemaker_session=self.pipeline_session,
+        )
+
+    # Preprocessing Step
+    @functools.cached_property
+    def dataset_report(self):
+        return PropertyFile(
+            name="DatasetReport",
+            output_name=constants.DATASET_CHANNEL,
+            path=constants.DATASET_FILE_NAME,
+        )
+
+    @functools.cached_property
+    def preprocessing_step(self):
+        step_name = generate_step_name("Preprocessing")
+        return ProcessingStep(
+            name=step_name,
+            processor=self.processor("preprocessing.py", preprocessing_instance_type,
+                                     preprocessing_instance_count),
+            inputs=[self.scripts_input(), self.data_input()],
+            outputs=[
+                ProcessingOutput(output_name=output_name, source=str(source),
+                                 destination=self.output_uri(step_name, output_name))
+                for (output_name, source) in [
+                    (constants.TRAIN_CHANNEL, constants.TRAIN_DIR),
+                    (constants.VAL_CHANNEL, constants.VAL_DIR),
+                    (constants.TEST_CHANNEL, constants.TEST_DIR),
+                    (constants.LABELS_CHANNEL, constants.LABELS_DIR),
+                    (constants.DATASET_CHANNEL, constants.DATASET_DIR),
+                    (constants.FIRST_TIER_CHANNEL, constants.FIRST_TIER_DIR),
+                ]
+            ],
+            property_files=[self.dataset_report],
+        )
+
+    @property
+    def preproc_step_outputs(self):
+        return self.preprocessing_step.properties.ProcessingOutputConfig.Outputs
+
+    # Training Step
+    @functools.cached_property
+    def blazing_text_container(self):
+        return image_uris.retrieve("blazingtext", self.region, "latest")
+
+    @functools.cached_property
+    def blazing_text_estimator(self):
+        return sagemaker.estimator.Estimator(
+            self.blazing_text_container,
+            self.role,
+            instance_count=training_instance_count,
+            instance_type=training_instance_type,
+            volume_size=30,
+            max_run=training_instance_max_run,
+            input_mode="File",
+            output_path=self.output_uri(generate_step_name("Training")),
+            sagemaker_session=self.pipeline_session,
+            hyperparameters={
+                "mode": "supervised",
+                "epochs": 100,
+                "min_count": 2,
+                "learning_rate": 0.05,
+                "vector_dim": 10,
+                "early_stopping": True,
+                "patience": 4,
+                "min_epochs": 5,
+                "word_ngrams": 2,
+            },
+        )
+
+    @functools.cached_property
+    def training_step(self):
+        if self.is_incremental:
+            return self.incremental_training_step
+        estimator_inputs = {
+            constants.TRAIN_CHANNEL: TrainingInput(
+                s3_data=self.preproc_step_outputs[constants.TRAIN_CHANNEL].S3Output.S3Uri,
+                distribution="FullyReplicated",
+                content_type="text/plain",
+                s3_data_type="S3Prefix",
+                input_mode=training_input_mode,
+            ),
+            constants.VAL_CHANNEL: TrainingInput(
+                s3_data=self.preproc_step_outputs[constants.VAL_CHANNEL].S3Output.S3Uri,
+                distribution="FullyReplicated",
+                content_type="text/plain",
+                s3_data_type="S3Prefix",
+                input_mode=training_input_mode,
+            ),
+        }
+        return TrainingStep(
+            name=generate_step_name("Training"),
+            estimator=self.blazing_text_estimator,
+            inputs=estimator_inputs,
+        )
+
+    # Incremental Training step, BlazingText cannot start from a previous model so this runs
+    # fastText directly and writes a BlazingText compatible model.tar.gz
+    @functools.cached_property
+    def incremental_training_step(self):
+        step_name = generate_step_name("IncrementalTraining")
+        return ProcessingStep(
+            name=step_name,
+            processor=self.processor("incremental_training.py",
+                                     incremental_training_instance_type, 1),
+            inputs=[
+                self.scripts_input(),
+                self.data_input(),
+                ProcessingInput(
+                    source=self.preproc_step_outputs[constants.TRAIN_CHANNEL].S3Output.S3Uri,
+                    destination=str(constants.INPUT_TRAIN_DIR),
+                ),
+                ProcessingInput(
+                    source=self.preproc_step_outputs[constants.VAL_CHANNEL].S3Output.S3Uri,
+                    destination=str(constants.INPUT_VAL_DIR),
+                ),
+            ],
+            outputs=[
+                ProcessingOutput(
+                    output_name=constants.MODEL_CHANNEL,
+                    source=str(constants.MODEL_DIR),
+                    destination=self.output_uri(step_name, constants.MODEL_CHANNEL),
+                ),
+            ],
+            job_arguments=[
+                "--vocabulary-drift-threshold", vocabulary_drift_threshold.to_string(),
+                "--accuracy-loss-threshold", accuracy_loss_threshold.to_string(),
+                "--epochs", incremental_epochs.to_string(),
+                "--replay-ratio", replay_ratio.to_string(),
+            ],
+        )
+
+    @functools.cached_property
+    def model_artifacts(self):
+        if self.is_incremental:
+            outputs = self.training_step.properties.ProcessingOutputConfig.Outputs
+            return Join(
                 on="/",
                 values=[
-                    evaluation_step_outputs[constants.EVALUATION_CHANNEL].S3Output.S3Uri,
-                    constants.EVALUATION_FILE_NAME,
+                    outputs[constants.MODEL_CHANNEL].S3Output.S3Uri,
+                    constants.MODEL_ARCHIVE_FILE_NAME,
                 ],
+            )
+        return self.training_step.properties.ModelArtifacts.S3ModelArtifacts
+
+    # Create Model step
+    @functools.cached_property
+    def model(self):
+        return Model(
+            image_uri=self.blazing_text_container,
+            model_data=self.model_artifacts,
+            sagemaker_session=self.pipeline_session,
+            role=self.role,
+        )
+
+    @functools.cached_property
+    def model_step(self):
+        return ModelStep(
+            name=generate_step_name("CreateModel"),
+            step_args=self.model.create(instance_type=model_instance_type),
+        )
+
+    # Batch Transform step
+    @functools.cached_property
+    def transform_step(self):
+        step_name = generate_step_name("BatchTransform")
+        transformer = Transformer(
+            model_name=self.model_step.properties.ModelName,
+            instance_count=transform_instance_count,
+            instance_type=transform_instance_type,
+            output_path=self.output_uri(step_name),
+            sagemaker_session=self.pipeline_session,
+            assemble_with="Line",
+            strategy="SingleRecord",
+        )
+        return TransformStep(
+            name=step_name,
+            step_args=transformer.transform(
+                data=self.preproc_step_outputs[constants.TEST_CHANNEL].S3Output.S3Uri,
+                split_type="Line",
+                content_type="application/jsonlines",
+            ),
+        )
+
+    # Model Evaluation step
+    @functools.cached_property
+    def evaluation_report(self):
+        return PropertyFile(
+            name="EvaluationReport",
+            output_name=constants.EVALUATION_CHANNEL,
+            path=constants.EVALUATION_FILE_NAME,
+        )
+
+    @functools.cached_property
+    def evaluation_step(self):
+        step_name = generate_step_name("ModelEvaluation")
+        return ProcessingStep(
+            name=step_name,
+            processor=self.processor("evaluation.py", evaluation_instance_type,
+                                     evaluation_instance_count),
+            inputs=[
+                self.scripts_input(),
+                ProcessingInput(
+                    source=self.transform_step.properties.TransformOutput.S3OutputPath,
+                    destination=str(constants.INPUT_TRANSFORM_DIR),
+                ),
+                ProcessingInput(
+                    source=self.preproc_step_outputs[constants.LABELS_CHANNEL].S3Output.S3Uri,
+                    destination=str(constants.INPUT_LABELS_DIR),
+                ),
+                ProcessingInput(
+                    source=self.preproc_step_outputs[constants.TEST_CHANNEL].S3Output.S3Uri,
+                    destination=str(constants.INPUT_TEST_DIR),
+                ),
+                ProcessingInput(
+                    source=self.model_artifacts,
+                    destination=str(constants.INPUT_MODEL_DIR),
+                ),
+                ProcessingInput(
+                    source=self.preproc_step_outputs[constants.FIRST_TIER_CHANNEL].S3Output.S3Uri,
+                    destination=str(constants.INPUT_FIRST_TIER_DIR),
+                ),
+            ],
+            outputs=[
+                ProcessingOutput(
+                    output_name=constants.EVALUATION_CHANNEL,
+                    source=str(constants.EVALUATION_DIR),
+                    destination=self.output_uri(step_name, constants.EVALUATION_CHANNEL),
+                ),
+            ],
+            property_files=[self.evaluation_report],
+        )
+
+    # Register Model step
+    @functools.cached_property
+    def register_model_step(self):
+        evaluation_step_outputs = self.evaluation_step.properties.ProcessingOutputConfig.Outputs
+        register_model_step_args = self.model.register(
+            content_types=["application/json"],
+            response_types=["application/json"],
+            inference_instances=[inference_instance_type],
+            transform_instances=[transform_instance_type],
+            model_package_group_name=MODEL_PACKAGE_GROUP_NAME,
+            model_metrics=ModelMetrics(
+                model_statistics=MetricsSource(
+                    s3_uri=Join(
+                        on="/",
+                        values=[
+                            evaluation_step_outputs[constants.EVALUATION_CHANNEL].S3Output.S3Uri,
+                            constants.EVALUATION_FILE_NAME,
+                        ],
+                    ),
+                    content_type="application/json"
+                ),
             ),
-            content_type="application/json"
-        ),
-    ),
-    image_uri=blazing_text_container,
-)
-
-register_model_step = ModelStep(
-    name=generate_step_name("RegisterModel"),
-    step_args=register_model_step_args,
-    depends_on=[evaluation_step], # sagemaker unable to infer this without help
-)
-
-# Create pipeline
-pipeline = Pipeline(
-   name=PIPELINE_NAME, 
-   parameters=[
-        data_bucket_name,
-        preprocessing_instance_type,
-        preprocessing_instance_count,
-        training_instance_type,
-        training_instance_count,
-        training_instance_max_run,
-        model_instance_type,
-        transform_instance_type,
-        transform_instance_count,
-        evaluation_instance_type,
-        evaluation_instance_count,
-        inference_instance_type,
-   ],
-   steps=[
-        preprocessing_step,
-        training_step,       
-        model_step,
-        transform_step,
-        evaluation_step,
-        register_model_step,
-   ],
-   sagemaker_session=pipeline_session,
-)
-
-# save the pipeline definition
-definition = json.loads(pipeline.definition())
-if PRINT_DEFINITION:
-    import pprint
-    pp = pprint.PrettyPrinter(indent=4)
-    pp.pprint(definition)
-
-with open(join(current_file_dir, PIPELINE_DEFINITION_JSON_FILE_NAME), "w+") as f:
-    json.dump(definition, f)
+            image_uri=self.blazing_text_container,
+            # lets the next incremental training run find the rows added since this model, and
+            # its full pipeline baseline
+            customer_metadata_properties={
+                constants.TRAINING_MODE: self.training_mode,
+                constants.TRAINED_ROWS: JsonGet(
+                    step_name=self.preprocessing_step.name,
+                    property_file=self.dataset_report,
+                    json_path=constants.ROWS,
+                ),
+                # the application's cascade loads the first tier matching the served model
+                constants.FIRST_TIER_URI: Join(
+                    on="/",
+                    values=[
+                        self.preproc_step_outputs[constants.FIRST_TIER_CHANNEL].S3Output.S3Uri,
+                        constants.FIRST_TIER_FILE_NAME,
+                    ],
+                ),
+            },
+        )
+        return ModelStep(
+            name=generate_step_name("RegisterModel"),
+            step_args=register_model_step_args,
+            depends_on=[self.evaluation_step], # sagemaker unable to infer this without help
+        )
+
+    # Quality gate step, registers only when both accuracy and model latency budget are met
+    @functools.cached_property
+    def quality_gate_step(self):
+        return ConditionStep(
+            name=generate_step_name("QualityGate"),
+            conditions=[
+                ConditionGreaterThanOrEqualTo(
+                    left=JsonGet(
+                        step_name=self.evaluation_step.name,
+                        property_file=self.evaluation_report,
+                        json_path=f"{constants.REGRESSION_METRICS}.{constants.ACCURACY}.{constants.VALUE}",
+                    ),
+                    right=accuracy_threshold,
+                ),
+                ConditionLessThanOrEqualTo(
+                    left=JsonGet(
+                        step_name=self.evaluation_step.name,
+                        property_file=self.evaluation_report,
+                        json_path=f"{constants.INFERENCE_METRICS}.{constants.LATENCY_P99}.{constants.VALUE}",
+                    ),
+                    right=model_latency_budget_p99_ms,
+                ),
+            ],
+            if_steps=[self.register_model_step],
+            else_steps=[
+                FailStep(
+                    name=generate_step_name("QualityGateFailed"),
+                    error_message=Join(
+                        on=" ",
+                        values=["Candidate model missed the accuracy threshold",
+                                accuracy_threshold, "or the p99 model latency budget (ms)",
+                                model_latency_budget_p99_ms],
+                    ),
+                ),
+            ],
+        )
+
+    # Create pipeline
+    @functools.cached_property
+    def pipeline(self):
+        pipeline_parameters = [
+            data_bucket_name,
+            self.artifact_bucket,
+            processing_image_uri,
+            preprocessing_instance_type,
+            preprocessing_instance_count,
+            training_instance_type,
+            training_instance_count,
+            training_instance_max_run,
+            training_input_mode,
+            model_instance_type,
+            transform_instance_type,
+            transform_instance_count,
+            evaluation_instance_type,
+            evaluation_instance_count,
+            inference_instance_type,
+            accuracy_threshold,
+            model_latency_budget_p99_ms,
+        ]
+        if self.is_incremental:
+            pipeline_parameters += [
+                incremental_training_instance_type,
+                vocabulary_drift_threshold,
+                accuracy_loss_threshold,
+                incremental_epochs,
+                replay_ratio,
+            ]
+        return Pipeline(
+            name=self.pipeline_name,
+            parameters=pipeline_parameters,
+            steps=[
+                self.preprocessing_step,
+                self.training_step,
+                self.model_step,
+                self.transform_step,
+                self.evaluation_step,
+                self.quality_gate_step,
+            ],
+            sagemaker_session=self.pipeline_session,
+        )
+
+    def definition(self):
+        """Returns the pipeline definition as a dict."""
+        return json.loads(self.pipeline.definition())
+
+
+def write_definition(definition, path):
+    """Writes the definition as canonical JSON, unless the file already holds the same one.
+
+    Args:
+        definition: The pipeline definition.
+        path: The JSON file to write.
+
+    Returns:
+        True if the file was written, False if its content hash was unchanged.
+    """
+    body = json.dumps(definition, sort_keys=True).encode()
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(body).digest():
+                return False
+    with open(path, "wb") as f:
+        f.write(body)
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--training-mode", choices=list(PIPELINE_NAMES),
+                        default=os.environ.get("TRAINING_MODE", FULL_TRAINING_MODE))
+    parser.add_argument("--role-arn", default=os.environ.get("SAGEMAKER_ROLE_ARN"),
+                        help="execution role of the jobs, defaults to get_execution_role()")
+    parser.add_argument("--region", help="defaults to the configured AWS region")
+    parser.add_argument("--artifact-bucket",
+                        help="default of the ArtifactBucketName parameter, the bucket for job outputs")
+    parser.add_argument("--output", help="defaults to the JSON file of the training mode")
+    parser.add_argument("--local", action="store_true", help="use a LocalPipelineSession")
+    parser.add_argument("--print", action="store_true", help="pretty-print the definition")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    builder = PipelineBuilder(training_mode=args.training_mode, role=args.role_arn,
+                              region=args.region, artifact_bucket=args.artifact_bucket,
+                              local=args.local)
+    definition = builder.definition()
+    if args.print:
+        pprint.PrettyPrinter(indent=4).pprint(definition)
+
+    output = args.output or join(current_file_dir,
+                                 PIPELINE_DEFINITION_JSON_FILE_NAMES[args.training_mode])
+    if write_definition(definition, output):
+        print(f"Wrote {output}")
+    else:
+        print(f"{output} is unchanged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Reports how much processing job time the prebuilt processing image saves.
+
+For the Preprocessing and ModelEvaluation steps of recent executions of the model pipeline this
+groups the processing jobs by step and container image and prints the average start-up time
+(job creation until the container starts) and run time (container start until the job ends).
+
+Each job is classified by its image: the execution's ProcessingImageUri parameter is the
+prebuilt image, the sagemaker-scikit-learn repository is the SKLearn framework image that jobs
+from before the prebuilt image used, installing their dependencies at run time. Per step, the
+prebuilt image is then compared with the SKLearn image, other images are only listed.
+
+EXAMPLE:
+    python processing_report.py --pipeline-name NEWS-HEADLINES-PIPELINE --max-executions 20
+"""
+import collections
+import logging
+
+import boto3
+
+from report_utils import average, format_seconds, list_step_job_arns, parse_args
+
+PROCESSING_STEP_NAMES = ["Preprocessing", "ModelEvaluation"]
+PROCESSING_IMAGE_URI_PARAMETER = "ProcessingImageUri"
+SKLEARN_IMAGE_REPOSITORY = "sagemaker-scikit-learn"
+PREBUILT = "prebuilt"
+SKLEARN = "sklearn"
+OTHER = "other"
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    args = parse_args(__doc__)
+
+    sagemaker_client = boto3.client("sagemaker")
+    prebuilt_image_uris = {}
+    rows = []
+    for (execution_arn, step_name, processing_job_arn) in list_step_job_arns(
+            sagemaker_client, args.pipeline_name, args.max_executions,
+            step_names=PROCESSING_STEP_NAMES, job_type="ProcessingJob"):
+        if execution_arn not in prebuilt_image_uris:
+            prebuilt_image_uris[execution_arn] = get_prebuilt_image_uri(sagemaker_client,
+                                                                        execution_arn)
+        rows.append(describe_processing_job(sagemaker_client, step_name, processing_job_arn,
+                                            prebuilt_image_uris[execution_arn]))
+    print_report(rows)
+
+
+def get_prebuilt_image_uri(sagemaker_client, execution_arn: str):
+    """Returns the ProcessingImageUri parameter of a pipeline execution.
+
+    Args:
+        sagemaker_client: The SageMaker client.
+        execution_arn (str): The pipeline execution ARN.
+
+    Returns:
+        str: The prebuilt image URI, None for executions from before the parameter existed.
+    """
+    paginator = sagemaker_client.get_paginator("list_pipeline_parameters_for_execution")
+    for page in paginator.paginate(PipelineExecutionArn=execution_arn):
+        for parameter in page["PipelineParameters"]:
+            if parameter["Name"] == PROCESSING_IMAGE_URI_PARAMETER:
+                return parameter["Value"]
+    return None
+
+
+def classify_image(image_uri: str, prebuilt_image_uri) -> str:
+    """Returns PREBUILT, SKLEARN or OTHER for the image a job ran in."""
+    if image_uri == prebuilt_image_uri:
+        return PREBUILT
+    # <account>.dkr.ecr.<region>.amazonaws.com/sagemaker-scikit-learn:<version>
+    repository = image_uri.split("/")[-1].split(":")[0]
+    return SKLEARN if repository == SKLEARN_IMAGE_REPOSITORY else OTHER
+
+
+def describe_processing_job(sagemaker_client, step_name: str, processing_job_arn: str,
+                            prebuilt_image_uri) -> dict:
+    """Extracts the image and timings of a processing job.
+
+    Args:
+        sagemaker_client: The SageMaker client.
+        step_name (str): The pipeline step that started the job.
+        processing_job_arn (str): The processing job ARN.
+        prebuilt_image_uri: The ProcessingImageUri of the job's pipeline execution, or None.
+
+    Returns:
+        dict: The processing job timings, in seconds, None while unavailable.
+    """
+    job = sagemaker_client.describe_processing_job(
+        ProcessingJobName=processing_job_arn.split("/")[-1])
+    started_at = job.get("ProcessingStartTime")
+    ended_at = job.get("ProcessingEndTime")
+    image_uri = job["AppSpecification"]["ImageUri"]
+    return {
+        "step": step_name,
+        "kind": classify_image(image_uri, prebuilt_image_uri),
+        "image": image_uri.split("/")[-1],
+        "startup_time": (started_at - job["CreationTime"]).total_seconds() if started_at else None,
+        "run_time": (ended_at - started_at).total_seconds() if started_at and ended_at else None,
+    }
+
+
+def print_report(rows: list):
+    """Prints the averages per (step, image) and the time the prebuilt image saves per step.
+
+    Args:
+        rows (list): The timings returned by describe_processing_job.
+    """
+    groups = collections.defaultdict(list)
+    for row in rows:
+        groups[(row["step"], row["kind"], row["image"])].append(row)
+
+    print(f"{'step':<16} {'kind':<9} {'image':<60} {'jobs':>5} {'start-up (s)':>13} "
+          f"{'run (s)':>8}")
+    for (step, kind, image), group in sorted(groups.items()):
+        print(f"{step:<16} {kind:<9} {image:<60} {len(group):>5} "
+              f"{format_seconds(average(group, 'startup_time')):>13} "
+              f"{format_seconds(average(group, 'run_time')):>8}")
+
+    print()
+    for step in PROCESSING_STEP_NAMES:
+        prebuilt = job_time([row for row in rows if row["step"] == step
+                             and row["kind"] == PREBUILT])
+        sklearn = job_time([row for row in rows if row["step"] == step
+                            and row["kind"] == SKLEARN])
+        if prebuilt is None or sklearn is None:
+            print(f"{step}: needs jobs in both the prebuilt and the SKLearn image to compare")
+            continue
+        print(f"{step}: the prebuilt image saves {sklearn - prebuilt:.0f}s per job over the "
+              f"SKLearn image ({prebuilt:.0f}s vs {sklearn:.0f}s)")
+
+
+def job_time(rows: list):
+    """Average start-up plus run time of the jobs, None without timings."""
+    startup_time = average(rows, "startup_time")
+    run_time = average(rows, "run_time")
+    if startup_time is None or run_time is None:
+        return None
+    return startup_time + run_time
+
+
+if __name__ == "__main__":
+    main()
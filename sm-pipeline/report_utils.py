@@ -0,0 +1,54 @@
+"""
+Shared helpers of the pipeline job reports, training_report.py and processing_report.py.
+"""
+import argparse
+import logging
+
+DEFAULT_PIPELINE_NAME = "NEWS-HEADLINES-PIPELINE"
+
+
+def parse_args(description: str):
+    """Parses the --pipeline-name and --max-executions arguments of a report."""
+    parser = argparse.ArgumentParser(description=description,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipeline-name", default=DEFAULT_PIPELINE_NAME)
+    parser.add_argument("--max-executions", type=int, default=20)
+    return parser.parse_args()
+
+
+def list_step_job_arns(sagemaker_client, pipeline_name: str, max_executions: int,
+                       step_names: list, job_type: str) -> list:
+    """Lists the jobs started by the given steps of recent pipeline executions.
+
+    Args:
+        sagemaker_client: The SageMaker client.
+        pipeline_name (str): The name of the deployed pipeline.
+        max_executions (int): The number of most recent executions to inspect.
+        step_names (list): The names of the steps to report on.
+        job_type (str): The step metadata key of the job, e.g. "TrainingJob".
+
+    Returns:
+        list: (pipeline execution ARN, step name, job ARN) triples.
+    """
+    executions = sagemaker_client.list_pipeline_executions(
+        PipelineName=pipeline_name, SortBy="CreationTime", SortOrder="Descending",
+        MaxResults=max_executions)["PipelineExecutionSummaries"]
+    job_arns = []
+    for execution in executions:
+        steps = sagemaker_client.list_pipeline_execution_steps(
+            PipelineExecutionArn=execution["PipelineExecutionArn"])["PipelineExecutionSteps"]
+        for step in steps:
+            if step["StepName"] in step_names and job_type in step.get("Metadata", {}):
+                job_arns.append((execution["PipelineExecutionArn"], step["StepName"],
+                                 step["Metadata"][job_type]["Arn"]))
+    logging.info(f"Found {len(job_arns)} jobs of the {step_names} steps")
+    return job_arns
+
+
+def average(rows: list, key: str):
+    values = [row[key] for row in rows if row[key] is not None]
+    return sum(values) / len(values) if values else None
+
+
+def format_seconds(value) -> str:
+    return "-" if value is None else f"{value:.0f}"
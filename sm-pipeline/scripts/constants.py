@@ -10,30 +10,68 @@ TRAIN_CHANNEL = "train"
 VAL_CHANNEL = "validation"
 LABELS_CHANNEL = "labels"
 TRANSFORM_CHANNEL = "transform"
+MODEL_CHANNEL = "model"
+DATASET_CHANNEL = "dataset"
+FIRST_TIER_CHANNEL = "first-tier"
 
 INPUT_TRANSFORM_DIR = INPUT_DIR / TRANSFORM_CHANNEL
 INPUT_LABELS_DIR = INPUT_DIR / LABELS_CHANNEL
+INPUT_TEST_DIR = INPUT_DIR / TEST_CHANNEL
+INPUT_MODEL_DIR = INPUT_DIR / MODEL_CHANNEL
+INPUT_TRAIN_DIR = INPUT_DIR / TRAIN_CHANNEL
+INPUT_VAL_DIR = INPUT_DIR / VAL_CHANNEL
+INPUT_FIRST_TIER_DIR = INPUT_DIR / FIRST_TIER_CHANNEL
 
 EVALUATION_DIR = ML_PROC / EVALUATION_CHANNEL
 TEST_DIR = ML_PROC / TEST_CHANNEL
 TRAIN_DIR = ML_PROC / TRAIN_CHANNEL
 VAL_DIR = ML_PROC / VAL_CHANNEL
 LABELS_DIR = ML_PROC / LABELS_CHANNEL
+MODEL_DIR = ML_PROC / MODEL_CHANNEL
+DATASET_DIR = ML_PROC / DATASET_CHANNEL
+FIRST_TIER_DIR = ML_PROC / FIRST_TIER_CHANNEL
 
 TEST_FILE_NAME = f"{TEST_CHANNEL}.jsonl"
 LABELS_FILE_NAME = f"{LABELS_CHANNEL}.csv"
+MODEL_ARCHIVE_FILE_NAME = "model.tar.gz"
+MODEL_BIN_FILE_NAME = "model.bin"
+DATASET_FILE_NAME = f"{DATASET_CHANNEL}.json"
+TRAINING_REPORT_FILE_NAME = "training_report.json"
+FIRST_TIER_FILE_NAME = "first_tier.json"
 
 TEST_PATH = TEST_DIR / TEST_FILE_NAME
 TRAIN_PATH = TRAIN_DIR / f"{TRAIN_CHANNEL}.csv"
 VAL_PATH = VAL_DIR / f"{VAL_CHANNEL}.csv"
 LABELS_PATH = LABELS_DIR / LABELS_FILE_NAME
+DATASET_PATH = DATASET_DIR / DATASET_FILE_NAME
+FIRST_TIER_PATH = FIRST_TIER_DIR / FIRST_TIER_FILE_NAME
 
 EVALUATION_FILE_NAME = f"evaluation.json"
 EVALUATION_PATH = EVALUATION_DIR / EVALUATION_FILE_NAME
 
+REGRESSION_METRICS = "regression_metrics"
+INFERENCE_METRICS = "inference_metrics"
+CASCADE_METRICS = "cascade_metrics"
+ACCURACY = "accuracy"
+THROUGHPUT = "throughput"
+LATENCY_P50 = "latency_p50_ms"
+LATENCY_P90 = "latency_p90_ms"
+LATENCY_P99 = "latency_p99_ms"
+VALUE = "value"
+
 DATA_FILE_NAME = f"data.csv"
 DATA_PATH = INPUT_DIR / DATA_FILE_NAME
 
 BAD = "bad"
 GOOD = "good"
 NEUTRAL = "neutral"
+
+# number of data.csv rows a model was trained on, stored in the model package metadata
+TRAINED_ROWS = "TrainedRows"
+# training mode of the pipeline that registered a model, stored in the model package metadata
+TRAINING_MODE = "TrainingMode"
+FULL_TRAINING_MODE = "full"
+INCREMENTAL_TRAINING_MODE = "incremental"
+ROWS = "rows"
+# s3 uri of the first_tier.json trained alongside a model, stored in the model package metadata
+FIRST_TIER_URI = "FirstTierUri"
@@ -14,23 +14,48 @@ EXAMPLE OUTPUT:
 ==> /opt/ml/processing/evaluation/evaluation.json <==
 {"regression_metrics": {"accuracy": {"value": 0.48760330578512395},
 "precision": {"value": 0.28342173262613896}, "recall": {"value": 0.30607037335482135},
-"f-score": {"value": 0.29269601677148843}}}
+"f-score": {"value": 0.29269601677148843}},
+"inference_metrics": {"throughput": {"value": 41235.7}, "latency_p50_ms": {"value": 0.021},
+"latency_p90_ms": {"value": 0.034}, "latency_p99_ms": {"value": 0.061}},
+"cascade_metrics": {"0.9": {"escalation_rate": {"value": 0.41}, "accuracy": {"value": 0.49},
+"accuracy_delta": {"value": 0.002}}, ...}}
 """
 import json
 import logging
+import tarfile
+import time
 from collections import namedtuple
 
+import fasttext
+import numpy as np
 import pandas as pd
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
 import constants
+import first_tier
+import first_tier_model
 
-ACCURACY = "accuracy"
+ACCURACY = constants.ACCURACY
 FSCORE = "f-score"
 PRECISION = "precision"
 RECALL = "recall"
-REGRESSION_METRICS = "regression_metrics"
-VALUE = "value"
+REGRESSION_METRICS = constants.REGRESSION_METRICS
+VALUE = constants.VALUE
+
+INFERENCE_METRICS = constants.INFERENCE_METRICS
+THROUGHPUT = constants.THROUGHPUT
+LATENCY_PERCENTILES = {
+    constants.LATENCY_P50: 50,
+    constants.LATENCY_P90: 90,
+    constants.LATENCY_P99: 99,
+}
+WARMUP_PREDICTIONS = 100
+
+CASCADE_METRICS = constants.CASCADE_METRICS
+ESCALATION_RATE = "escalation_rate"
+ACCURACY_DELTA = "accuracy_delta"
+# candidate values of the application's CASCADE_CONFIDENCE_THRESHOLD
+CASCADE_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95]
 
 LABEL = "label"
 TEST_FILE_NAME = f"{constants.TEST_FILE_NAME}.out"
@@ -43,6 +68,11 @@ def main():
     true_labels_df = read_true_labels_df()
     found_labels_df = read_found_labels_df()
     metrics = compute_metrics(true_labels_df=true_labels_df, found_labels_df=found_labels_df)
+    test_sources = read_test_sources()
+    metrics.update(measure_inference_performance(load_model(), test_sources))
+    metrics.update(compute_cascade_metrics(load_first_tier(), test_sources,
+                                           true_labels_df=true_labels_df,
+                                           found_labels_df=found_labels_df))
     logging.info(f"Found metrics={metrics}")
     create_evaluation_dir()
     save_metrics(metrics)
@@ -110,6 +140,116 @@ def compute_metrics(true_labels_df: pd.DataFrame, found_labels_df: pd.DataFrame)
     }
 
 
+def load_model() -> fasttext.FastText._FastText:
+    """Extracts the trained BlazingText artifacts and loads the fastText compatible model.
+
+    Returns:
+        The candidate model.
+    """
+    model_archive_path = constants.INPUT_MODEL_DIR / constants.MODEL_ARCHIVE_FILE_NAME
+    logging.info(f"Extracting model from {model_archive_path}")
+    with tarfile.open(model_archive_path) as archive:
+        archive.extractall(constants.INPUT_MODEL_DIR)
+    return fasttext.load_model(str(constants.INPUT_MODEL_DIR / constants.MODEL_BIN_FILE_NAME))
+
+
+def read_test_sources() -> list:
+    """Reads the preprocessed test headlines sent to batch transform.
+
+    Returns:
+        list: The test headlines.
+    """
+    test_file_path = constants.INPUT_TEST_DIR / constants.TEST_FILE_NAME
+    logging.info(f"Reading test headlines from {test_file_path}")
+    with open(test_file_path, "r") as f:
+        return [json.loads(line)["source"] for line in f]
+
+
+def measure_inference_performance(model, sources: list) -> dict:
+    """Measures prediction throughput and per-headline latency percentiles of the model.
+
+    This is the in-process compute time of the model, without the serving container's HTTP and
+    JSON overhead, so the pipeline's ModelLatencyBudgetP99Ms is sized for it.
+
+    Args:
+        model: The candidate model.
+        sources (list): The test headlines.
+
+    Returns:
+        dict: A dictionary containing the inference metrics.
+    """
+    for source in sources[:WARMUP_PREDICTIONS]:
+        model.predict(source)
+
+    latencies = []
+    for source in sources:
+        started_at = time.perf_counter()
+        model.predict(source)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+
+    started_at = time.perf_counter()
+    model.predict(sources)
+    throughput = len(sources) / (time.perf_counter() - started_at)
+
+    inference_metrics = {THROUGHPUT: {VALUE: throughput}}
+    for (name, percentile) in LATENCY_PERCENTILES.items():
+        inference_metrics[name] = {VALUE: float(np.percentile(latencies, percentile))}
+    logging.info(f"Found inference metrics={inference_metrics}")
+    return {INFERENCE_METRICS: inference_metrics}
+
+
+def load_first_tier() -> dict:
+    """Loads the first-tier classifier exported by preprocessing.
+
+    Returns:
+        dict: The exported first-tier model.
+    """
+    first_tier_path = constants.INPUT_FIRST_TIER_DIR / constants.FIRST_TIER_FILE_NAME
+    logging.info(f"Reading first-tier classifier from {first_tier_path}")
+    with open(first_tier_path, "r") as f:
+        return json.load(f)
+
+
+def compute_cascade_metrics(first_tier_classifier: dict, sources: list,
+                            true_labels_df: pd.DataFrame, found_labels_df: pd.DataFrame) -> dict:
+    """Simulates the application's model cascade on the test set for several thresholds.
+
+    Headlines the first tier scores at or above a threshold keep its label, the others are
+    escalated and keep the candidate model's batch transform label.
+
+    Args:
+        first_tier_classifier (dict): The exported first-tier model.
+        sources (list): The test headlines, in the order of the labels.
+        true_labels_df (pd.DataFrame): A DataFrame containing the true labels.
+        found_labels_df (pd.DataFrame): A DataFrame containing the candidate model's labels.
+
+    Returns:
+        dict: Escalation rate, cascade accuracy and its change against the candidate model
+            alone, per threshold.
+    """
+    true_labels = true_labels_df[LABEL].to_numpy()
+    found_labels = found_labels_df[LABEL].to_numpy()
+    first_tier_results = [first_tier_model.predict(first_tier_classifier, source)
+                          for source in sources]
+    first_tier_labels = np.array([f"{first_tier.LABEL_PREFIX}{label}"
+                                  for (label, _) in first_tier_results])
+    probabilities = np.array([probability for (_, probability) in first_tier_results])
+    model_accuracy = accuracy_score(true_labels, found_labels)
+
+    cascade_metrics = {}
+    for threshold in CASCADE_THRESHOLDS:
+        escalated = probabilities < threshold
+        cascade_labels = np.where(escalated, found_labels, first_tier_labels)
+        accuracy = accuracy_score(true_labels, cascade_labels)
+        cascade_metrics[str(threshold)] = {
+            ESCALATION_RATE: {VALUE: float(escalated.mean())},
+            ACCURACY: {VALUE: accuracy},
+            ACCURACY_DELTA: {VALUE: accuracy - model_accuracy},
+        }
+    logging.info(f"Found cascade metrics={cascade_metrics}")
+    return {CASCADE_METRICS: cascade_metrics}
+
+
 def create_evaluation_dir():
     """Creates the evaluation directory if it doesn't exist."""
     logging.info("Creating directories")
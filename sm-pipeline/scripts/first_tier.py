@@ -0,0 +1,55 @@
+"""
+Cheap first-tier classifier of the model cascade.
+
+A logistic regression over binary token features, trained on the preprocessed train set and
+exported as plain JSON so the application can score it in-process without scikit-learn:
+
+==> /opt/ml/processing/first_tier/first_tier.json <==
+{"labels": ["bad", "good", "neutral"], "bias": [-1.2, -0.4, 1.6],
+"weights": {"profit": [-0.8, 1.9, -1.1], "fell": [1.7, -0.9, -0.8], ...}}
+
+first_tier_model.predict scores it, in evaluation.py and in the application. There is one bias
+and one weight per token for each label, also when the train set only has two labels.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.linear_model import LogisticRegression
+
+LABEL_PREFIX = "__label__"
+MIN_TOKEN_COUNT = 2
+WEIGHT_DECIMALS = 4
+
+
+def train(train_df: pd.DataFrame, tokens_column: str, labels_column: str) -> dict:
+    """Trains the first-tier classifier and exports it.
+
+    Args:
+        train_df: The preprocessed train set.
+        tokens_column: Column holding the space separated tokens.
+        labels_column: Column holding the __label__ prefixed labels.
+
+    Returns:
+        The exported model.
+    """
+    vectorizer = CountVectorizer(analyzer=str.split, binary=True, min_df=MIN_TOKEN_COUNT)
+    features = vectorizer.fit_transform(train_df[tokens_column])
+    classifier = LogisticRegression(max_iter=1000)
+    classifier.fit(features, train_df[labels_column])
+
+    coef, intercept = classifier.coef_, classifier.intercept_
+    if len(classifier.classes_) == 2:
+        # a binary model has a single row scoring classes_[1] against classes_[0], the softmax
+        # of a zero row for classes_[0] and that row is the same sigmoid
+        coef = np.vstack([np.zeros_like(coef), coef])
+        intercept = np.concatenate([np.zeros_like(intercept), intercept])
+
+    weights = coef.T
+    return {
+        "labels": [label[len(LABEL_PREFIX):] for label in classifier.classes_],
+        "bias": [round(float(bias), WEIGHT_DECIMALS) for bias in intercept],
+        "weights": {
+            token: [round(float(weight), WEIGHT_DECIMALS) for weight in weights[index]]
+            for (token, index) in vectorizer.vocabulary_.items()
+        },
+    }
@@ -0,0 +1,31 @@
+"""
+Scoring of the exported first-tier classifier, see first_tier.py for the export format.
+
+Dependency free, so the application scores the same model in-process with the same code: the
+application image copies this file next to the application code.
+
+A headline's class probabilities are the softmax of `bias` plus the weights of each distinct
+known token.
+"""
+import math
+
+
+def predict(model: dict, tokens: str) -> tuple:
+    """Scores one preprocessed headline.
+
+    Args:
+        model: The exported model.
+        tokens: The space separated tokens.
+
+    Returns:
+        (label, probability) of the most likely label.
+    """
+    scores = list(model["bias"])
+    for token in set(tokens.split()):
+        token_weights = model["weights"].get(token)
+        if token_weights is not None:
+            scores = [score + weight for (score, weight) in zip(scores, token_weights)]
+    top = max(scores)
+    best = scores.index(top)
+    exps = [math.exp(score - top) for score in scores]
+    return model["labels"][best], exps[best] / sum(exps)
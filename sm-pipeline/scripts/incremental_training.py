@@ -0,0 +1,391 @@
+"""
+Incremental training seeded by the latest approved model.
+
+BlazingText and fastText cannot continue training a saved supervised model, so this is not a
+true warm start: the previous model's word vectors seed the new model's embeddings, while the
+classifier layer starts fresh. The new model trains on the train rows added to data.csv since
+the previous model plus a replayed sample of the earlier train rows, so that neither the
+vocabulary nor the classifier is fit to the new rows alone.
+
+Falls back to a retrain from scratch when there is no approved model, when the vocabulary of
+the new rows drifted too far from the previous model or when the incremental model loses too
+much validation accuracy compared with the previous one. The validation set is the fixed
+hash-based held-out set of preprocessing.py, which neither model trained on.
+
+The baseline is the latest approved model of the full (BlazingText) pipeline, scored on the same
+validation set, together with the test accuracy registered with its model package and the
+training time of its training job.
+
+EXAMPLE INPUT:
+==> /opt/ml/processing/input/data.csv <==
+==> /opt/ml/processing/input/train/train.csv <==
+==> /opt/ml/processing/input/validation/validation.csv <==
+
+EXAMPLE OUTPUT:
+==> /opt/ml/processing/model/model.tar.gz <==
+==> /opt/ml/processing/model/training_report.json <==
+{"mode": "incremental", "reason": "incremental model accepted", "new_rows": 212,
+"replayed_rows": 848, "vocabulary_drift": 0.031, "previous": {"accuracy": 0.71},
+"incremental": {"accuracy": 0.72, "training_seconds": 0.4},
+"full_pipeline": {"model_package_arn": "arn:...:model-package/news-headlines/4",
+"accuracy": 0.73, "registered_test_accuracy": 0.74, "training_seconds": 95,
+"billable_seconds": 95}}
+"""
+import argparse
+import json
+import logging
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import boto3
+import fasttext
+import pandas as pd
+from botocore.exceptions import ClientError
+
+import constants
+import preprocessing
+
+MODEL_PACKAGE_GROUP_NAME = "news-headlines"
+INCREMENTAL = "incremental"
+RETRAIN = "retrain"
+PREVIOUS = "previous"
+FULL_PIPELINE = "full_pipeline"
+ACCURACY = "accuracy"
+TRAINING_SECONDS = "training_seconds"
+REPLAY_SEED = 0
+
+# mirrors the BlazingText hyperparameters in pipeline.py
+VECTOR_DIM = 10
+LEARNING_RATE = 0.05
+WORD_NGRAMS = 2
+RETRAIN_MIN_COUNT = 2
+RETRAIN_EPOCHS = 25
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    """Main entry point of the program."""
+    args = parse_args()
+    train_df = read_training_df(constants.INPUT_TRAIN_DIR / f"{constants.TRAIN_CHANNEL}.csv")
+    val_path = constants.INPUT_VAL_DIR / f"{constants.VAL_CHANNEL}.csv"
+    work_dir = Path(tempfile.mkdtemp())
+    sagemaker_client = boto3.client("sagemaker")
+    report = {}
+
+    previous_package = find_approved_package(sagemaker_client, lambda package: True)
+    full_package = find_approved_package(sagemaker_client, is_full_pipeline_package)
+    if full_package is not None:
+        report[FULL_PIPELINE] = describe_full_pipeline_model(sagemaker_client, full_package,
+                                                             val_path, work_dir)
+
+    trained_rows = None
+    if previous_package is not None:
+        trained_rows = previous_package.get("CustomerMetadataProperties", {}).get(
+            constants.TRAINED_ROWS)
+    model = None
+    if trained_rows is None:
+        report["reason"] = "no approved model recording its trained rows to start from"
+    else:
+        previous_model = load_package_model(previous_package, work_dir / PREVIOUS)
+        model = train_from_previous(previous_model, train_df, pd.read_csv(constants.DATA_PATH),
+                                    int(trained_rows), val_path, work_dir, args, report)
+
+    if model is None:
+        model, training_seconds = train_retrain(train_df, work_dir)
+        report[RETRAIN] = {ACCURACY: accuracy(model, val_path),
+                           TRAINING_SECONDS: training_seconds}
+        report["mode"] = RETRAIN
+
+    logging.info(f"Training report={report}")
+    save_outputs(model, report, work_dir)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the job arguments.
+
+    Returns:
+        The parsed arguments.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vocabulary-drift-threshold", type=float, default=0.2,
+                        help="Max fraction of new-row tokens unknown to the previous model")
+    parser.add_argument("--accuracy-loss-threshold", type=float, default=0.02,
+                        help="Max validation accuracy drop compared with the previous model")
+    parser.add_argument("--epochs", type=int, default=5, help="Incremental training epochs")
+    parser.add_argument("--replay-ratio", type=int, default=4,
+                        help="Earlier train rows replayed per new train row")
+    return parser.parse_args()
+
+
+def read_training_df(train_path: Path) -> pd.DataFrame:
+    """Reads the train file written by preprocessing.
+
+    Args:
+        train_path: The train.csv of the train channel.
+
+    Returns:
+        A DataFrame with the labels and tokens of the train rows.
+    """
+    return pd.read_csv(train_path, sep=" ", header=None,
+                       names=[preprocessing.LABELS, preprocessing.TOKENS], keep_default_na=False)
+
+
+def find_approved_package(sagemaker_client, predicate) -> Optional[dict]:
+    """Describes the most recently created approved model package matching `predicate`.
+
+    Args:
+        sagemaker_client: The SageMaker client.
+        predicate: Called with each described model package, newest first.
+
+    Returns:
+        The model package, or None if no approved package matches.
+    """
+    paginator = sagemaker_client.get_paginator("list_model_packages")
+    for page in paginator.paginate(ModelPackageGroupName=MODEL_PACKAGE_GROUP_NAME,
+                                   ModelApprovalStatus="Approved",
+                                   SortBy="CreationTime", SortOrder="Descending"):
+        for summary in page["ModelPackageSummaryList"]:
+            package = sagemaker_client.describe_model_package(
+                ModelPackageName=summary["ModelPackageArn"])
+            if predicate(package):
+                return package
+    logging.info("No matching approved model package found")
+    return None
+
+
+def is_full_pipeline_package(package: dict) -> bool:
+    """Whether the full (BlazingText) pipeline registered the package.
+
+    Packages registered before TrainingMode was recorded all come from the full pipeline.
+    """
+    training_mode = package.get("CustomerMetadataProperties", {}).get(constants.TRAINING_MODE)
+    return training_mode in (None, constants.FULL_TRAINING_MODE)
+
+
+def load_package_model(package: dict, model_dir: Path):
+    """Downloads and loads the model of a model package.
+
+    Args:
+        package: The described model package.
+        model_dir: Directory the artifacts are extracted to.
+
+    Returns:
+        The fastText model.
+    """
+    model_data_url = package["InferenceSpecification"]["Containers"][0]["ModelDataUrl"]
+    logging.info(f"Loading {package['ModelPackageArn']} from {model_data_url}")
+    bucket, _, key = model_data_url.replace("s3://", "", 1).partition("/")
+    model_dir.mkdir(parents=True, exist_ok=True)
+    archive_path = model_dir / constants.MODEL_ARCHIVE_FILE_NAME
+    boto3.client("s3").download_file(bucket, key, str(archive_path))
+    with tarfile.open(archive_path) as archive:
+        archive.extractall(model_dir)
+    return fasttext.load_model(str(model_dir / constants.MODEL_BIN_FILE_NAME))
+
+
+def describe_full_pipeline_model(sagemaker_client, package: dict, val_path: Path,
+                                 work_dir: Path) -> dict:
+    """Scores the full pipeline's model on the validation set and reads its registered metrics.
+
+    Returns:
+        The package ARN, the validation accuracy, the registered test accuracy and the training
+        and billable seconds of the BlazingText training job, None if it cannot be described.
+    """
+    model = load_package_model(package, work_dir / FULL_PIPELINE)
+    metrics_uri = package["ModelMetrics"]["ModelQuality"]["Statistics"]["S3Uri"]
+    bucket, _, key = metrics_uri.replace("s3://", "", 1).partition("/")
+    metrics = json.loads(boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read())
+    training_seconds, billable_seconds = describe_training_time(sagemaker_client, package)
+    return {
+        "model_package_arn": package["ModelPackageArn"],
+        ACCURACY: accuracy(model, val_path),
+        "registered_test_accuracy":
+            metrics[constants.REGRESSION_METRICS][constants.ACCURACY][constants.VALUE],
+        TRAINING_SECONDS: training_seconds,
+        "billable_seconds": billable_seconds,
+    }
+
+
+def describe_training_time(sagemaker_client, package: dict) -> Tuple[Optional[int], Optional[int]]:
+    """Reads TrainingTimeInSeconds and BillableTimeInSeconds of the job that trained the package.
+
+    The job is named by the model artifact's location, <output path>/<job>/output/model.tar.gz.
+    Its time covers the whole job, including the data download, while the incremental
+    training_seconds only time fastText itself.
+
+    Returns:
+        (training seconds, billable seconds), (None, None) if the job cannot be described.
+    """
+    model_data_url = package["InferenceSpecification"]["Containers"][0]["ModelDataUrl"]
+    parts = model_data_url.split("/")
+    if len(parts) < 3 or parts[-2] != "output":
+        logging.warning(f"No training job in the model data location {model_data_url}")
+        return None, None
+    try:
+        job = sagemaker_client.describe_training_job(TrainingJobName=parts[-3])
+    except ClientError:
+        logging.exception(f"Unable to describe training job {parts[-3]}")
+        return None, None
+    return job.get("TrainingTimeInSeconds"), job.get("BillableTimeInSeconds")
+
+
+def split_new_rows(train_df: pd.DataFrame, data_df: pd.DataFrame,
+                   trained_rows: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Splits the train rows into those added to data.csv after `trained_rows` and the rest.
+
+    A row added again after `trained_rows` that was already among the first `trained_rows`, such
+    as a re-ingested headline, is not new: the previous model trained on it.
+
+    Args:
+        train_df: The train rows of this run.
+        data_df: The rows of data.csv.
+        trained_rows: Number of data.csv rows the previous model was trained on.
+
+    Returns:
+        (new train rows, earlier train rows)
+    """
+    new_keys = row_keys(data_df.iloc[trained_rows:]) - row_keys(data_df.iloc[:trained_rows])
+    is_new = pd.Series([key in new_keys for key in zip(train_df[preprocessing.LABELS],
+                                                       train_df[preprocessing.TOKENS])],
+                       index=train_df.index, dtype=bool)
+    return train_df[is_new], train_df[~is_new]
+
+
+def row_keys(data_df: pd.DataFrame) -> set:
+    """The (label, tokens) pairs of data.csv rows once preprocessed."""
+    if data_df.empty:
+        return set()
+    df = preprocessing.create_output_df(data_df)
+    return set(zip(df[preprocessing.LABELS], df[preprocessing.TOKENS]))
+
+
+def train_from_previous(previous_model, train_df: pd.DataFrame, data_df: pd.DataFrame,
+                        trained_rows: int, val_path: Path, work_dir: Path,
+                        args: argparse.Namespace, report: dict):
+    """Trains the incremental model from the previous one, recording each decision in `report`.
+
+    Returns:
+        The model to keep, the previous or the incremental one, or None to retrain from scratch
+        because the vocabulary drifted or the incremental model lost too much accuracy.
+    """
+    report[PREVIOUS] = {ACCURACY: accuracy(previous_model, val_path)}
+    new_train_df, old_train_df = split_new_rows(train_df, data_df, trained_rows)
+    report["new_rows"] = len(new_train_df)
+    report["vocabulary_drift"] = vocabulary_drift(previous_model, new_train_df)
+
+    if new_train_df.empty:
+        report["reason"] = "no new rows, keeping the previous model"
+        report["mode"] = PREVIOUS
+        return previous_model
+    if report["vocabulary_drift"] > args.vocabulary_drift_threshold:
+        report["reason"] = f"vocabulary drift above {args.vocabulary_drift_threshold}"
+        return None
+
+    replay_df = sample_replay_rows(old_train_df, len(new_train_df) * args.replay_ratio)
+    report["replayed_rows"] = len(replay_df)
+    incremental_model, training_seconds = train_incremental(
+        previous_model, pd.concat([new_train_df, replay_df]), work_dir, epochs=args.epochs)
+    report[INCREMENTAL] = {ACCURACY: accuracy(incremental_model, val_path),
+                           TRAINING_SECONDS: training_seconds}
+    accuracy_loss = report[PREVIOUS][ACCURACY] - report[INCREMENTAL][ACCURACY]
+    if accuracy_loss > args.accuracy_loss_threshold:
+        report["reason"] = f"accuracy loss {accuracy_loss:.4f} above " \
+                           f"{args.accuracy_loss_threshold}"
+        return None
+    report["reason"] = "incremental model accepted"
+    report["mode"] = INCREMENTAL
+    return incremental_model
+
+
+def sample_replay_rows(old_train_df: pd.DataFrame, count: int) -> pd.DataFrame:
+    """Samples up to `count` earlier train rows to train on next to the new rows."""
+    return old_train_df.sample(n=min(count, len(old_train_df)), random_state=REPLAY_SEED)
+
+
+def vocabulary_drift(model, train_df: pd.DataFrame) -> float:
+    """Fraction of tokens in the rows that the model's dictionary does not know.
+
+    Args:
+        model: The previous model.
+        train_df: The new train rows.
+
+    Returns:
+        The out-of-vocabulary token rate.
+    """
+    vocabulary = set(model.get_words())
+    tokens = [token for line in train_df[preprocessing.TOKENS] for token in line.split()]
+    if not tokens:
+        return 0.0
+    return sum(token not in vocabulary for token in tokens) / len(tokens)
+
+
+def train_incremental(previous_model, train_df: pd.DataFrame, work_dir: Path,
+                      epochs: int) -> tuple:
+    """Trains on the new and replayed rows, seeded with the previous model's word vectors.
+
+    Returns:
+        (model, training seconds)
+    """
+    vectors_path = work_dir / "previous.vec"
+    words = previous_model.get_words()
+    with open(vectors_path, "w") as f:
+        f.write(f"{len(words)} {previous_model.get_dimension()}\n")
+        for word in words:
+            vector = " ".join(f"{value:.6f}" for value in previous_model.get_word_vector(word))
+            f.write(f"{word} {vector}\n")
+
+    train_path = work_dir / "incremental_train.csv"
+    train_df.sample(frac=1, random_state=REPLAY_SEED).to_csv(
+        train_path, sep=" ", index=False, header=False)
+    started_at = time.perf_counter()
+    model = fasttext.train_supervised(
+        input=str(train_path), pretrainedVectors=str(vectors_path),
+        dim=previous_model.get_dimension(), epoch=epochs, lr=LEARNING_RATE,
+        wordNgrams=WORD_NGRAMS, minCount=1, verbose=0)
+    return model, round(time.perf_counter() - started_at, 3)
+
+
+def train_retrain(train_df: pd.DataFrame, work_dir: Path) -> tuple:
+    """Trains from scratch on every train row, with the full pipeline's hyperparameters.
+
+    Returns:
+        (model, training seconds)
+    """
+    train_path = work_dir / "retrain_train.csv"
+    train_df.to_csv(train_path, sep=" ", index=False, header=False)
+    started_at = time.perf_counter()
+    model = fasttext.train_supervised(
+        input=str(train_path), dim=VECTOR_DIM, epoch=RETRAIN_EPOCHS, lr=LEARNING_RATE,
+        wordNgrams=WORD_NGRAMS, minCount=RETRAIN_MIN_COUNT, verbose=0)
+    return model, round(time.perf_counter() - started_at, 3)
+
+
+def accuracy(model, val_path: Path) -> float:
+    """Precision at 1 on the validation set, which is accuracy for single-label rows."""
+    (_, precision_at_1, _) = model.test(str(val_path))
+    return precision_at_1
+
+
+def save_outputs(model, report: dict, work_dir: Path):
+    """Saves the chosen model as a BlazingText compatible model.tar.gz and the report.
+
+    Args:
+        model: The chosen model.
+        report: The training report.
+        work_dir: Scratch directory.
+    """
+    constants.MODEL_DIR.mkdir(exist_ok=True)
+    model_bin_path = work_dir / constants.MODEL_BIN_FILE_NAME
+    model.save_model(str(model_bin_path))
+    with tarfile.open(constants.MODEL_DIR / constants.MODEL_ARCHIVE_FILE_NAME, "w:gz") as archive:
+        archive.add(model_bin_path, arcname=constants.MODEL_BIN_FILE_NAME)
+    with open(constants.MODEL_DIR / constants.TRAINING_REPORT_FILE_NAME, "w+") as f:
+        f.write(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
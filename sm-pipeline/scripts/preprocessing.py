@@ -25,17 +25,20 @@ __label__neutral "destia oy is a finnish infrastructure and construction service
 __label__good
 __label__good
 __label__neutral
+
+==> /opt/ml/processing/first-tier/first_tier.json <==
+{"labels": ["bad", "good", "neutral"], "bias": [-1.2, -0.4, 1.6], "weights": {...}}
 """
+import hashlib
 import json
 import logging
 from typing import Tuple
 
-import nltk
 import pandas as pd
 from nltk.tokenize import RegexpTokenizer
-from sklearn.model_selection import train_test_split
 
 import constants
+import first_tier
 
 TOKENS = "tokens"
 LABELS = "labels"
@@ -45,6 +48,7 @@ HEADLINE_IDX = 1
 
 VAL_FRAC = 0.15
 TEST_FRAC = 0.05
+SHUFFLE_SEED = 0
 INDEX2LABEL = {
     0: constants.BAD,
     1: constants.GOOD,
@@ -56,9 +60,6 @@ logging.basicConfig(level=logging.INFO)
 
 def main():
     """Main entry point of the program."""
-    logging.info("Downloading 'punkt")
-    nltk.download('punkt')
-
     logging.info("Reading input DataFrame...")
     df = pd.read_csv(constants.DATA_PATH)
 
@@ -76,6 +77,14 @@ def main():
     logging.info("Saving datasets...")
     save_datasets(train_df=train_df, val_df=val_df, test_df=test_df)
 
+    logging.info(f"Saving first-tier classifier to {constants.FIRST_TIER_PATH}")
+    with open(constants.FIRST_TIER_PATH, "w+") as f:
+        f.write(json.dumps(first_tier.train(train_df, tokens_column=TOKENS, labels_column=LABELS)))
+
+    logging.info(f"Saving dataset size to {constants.DATASET_PATH}")
+    with open(constants.DATASET_PATH, "w+") as f:
+        f.write(json.dumps({constants.ROWS: str(len(df))}))
+
 
 def create_output_df(df: pd.DataFrame) -> pd.DataFrame:
     """Create the output DataFrame with tokens and labels.
@@ -97,17 +106,35 @@ def create_output_df(df: pd.DataFrame) -> pd.DataFrame:
 def train_val_test_split(output_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """Split the output DataFrame into train, validation, and test sets.
 
+    Rows are assigned by a hash of their tokens instead of at random, so every run holds out the
+    same headlines: a model trained by an earlier run, which incremental training starts from and
+    compares with, never saw this run's validation or test rows.
+
     Args:
         output_df: Output DataFrame.
 
     Returns:
         A tuple containing train, validation, and test DataFrames.
     """
-    n_val = int(VAL_FRAC * len(output_df))
-    n_test = int(TEST_FRAC * len(output_df))
-    train_val, test = train_test_split(output_df, test_size=n_test)
-    train, val = train_test_split(train_val, test_size=n_val)
-    return train, val, test
+    buckets = output_df[TOKENS].map(split_bucket)
+    test = buckets < TEST_FRAC
+    val = ~test & (buckets < TEST_FRAC + VAL_FRAC)
+    # fastText reads its input in order, so the train rows are shuffled reproducibly
+    train = output_df[~test & ~val].sample(frac=1, random_state=SHUFFLE_SEED)
+    return train, output_df[val], output_df[test]
+
+
+def split_bucket(tokens: str) -> float:
+    """Maps a row's tokens to a stable number in [0, 1).
+
+    Args:
+        tokens: The space separated tokens.
+
+    Returns:
+        The bucket of the row, compared with the split fractions.
+    """
+    digest = hashlib.sha256(tokens.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
 
 
 def create_output_directories():
@@ -116,6 +143,8 @@ def create_output_directories():
     constants.VAL_DIR.mkdir(exist_ok=True)
     constants.TEST_DIR.mkdir(exist_ok=True)
     constants.LABELS_DIR.mkdir(exist_ok=True)
+    constants.DATASET_DIR.mkdir(exist_ok=True)
+    constants.FIRST_TIER_DIR.mkdir(exist_ok=True)
 
 
 def save_datasets(train_df: pd.DataFrame, val_df: pd.DataFrame, test_df: pd.DataFrame):
@@ -0,0 +1,69 @@
+"""
+Tests for the inference metrics of scripts/evaluation.py, which the QualityGate step reads.
+
+Run from sm-pipeline/: python -m pytest tests
+"""
+import itertools
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "scripts"))
+
+import evaluation  # noqa: E402
+
+SOURCES = [f"headline {i}" for i in range(200)]
+
+
+class CountingModel:
+    """Records the single headlines and batches it is asked to predict."""
+
+    def __init__(self):
+        self.single = 0
+        self.batches = []
+
+    def predict(self, text):
+        if isinstance(text, list):
+            self.batches.append(len(text))
+        else:
+            self.single += 1
+        return [["__label__neutral"]], [[0.9]]
+
+
+class MeasureInferencePerformanceTest(unittest.TestCase):
+
+    def measure(self):
+        model = CountingModel()
+        # every perf_counter call is one second after the previous one
+        with mock.patch.object(evaluation.time, "perf_counter", side_effect=itertools.count()):
+            return model, evaluation.measure_inference_performance(model, SOURCES)
+
+    def test_reports_throughput_and_latency_percentiles(self):
+        model, metrics = self.measure()
+
+        self.assertEqual(set(metrics), {evaluation.INFERENCE_METRICS})
+        inference_metrics = metrics[evaluation.INFERENCE_METRICS]
+        self.assertEqual(set(inference_metrics),
+                         {evaluation.THROUGHPUT, *evaluation.LATENCY_PERCENTILES})
+        self.assertEqual(inference_metrics[evaluation.THROUGHPUT],
+                         {evaluation.VALUE: len(SOURCES)})
+        for name in evaluation.LATENCY_PERCENTILES:
+            self.assertEqual(inference_metrics[name], {evaluation.VALUE: 1000.0})
+        self.assertEqual(model.single, evaluation.WARMUP_PREDICTIONS + len(SOURCES))
+        self.assertEqual(model.batches, [len(SOURCES)])
+
+    def test_quality_gate_path_resolves_to_a_number(self):
+        _, metrics = self.measure()
+
+        # the JsonGet path of the QualityGate latency condition, see tests/test_pipeline.py
+        value = json.loads(json.dumps(metrics))
+        for key in "inference_metrics.latency_p99_ms.value".split("."):
+            value = value[key]
+        self.assertIsInstance(value, float)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Tests for the export of scripts/first_tier.py and its scoring by scripts/first_tier_model.py.
+
+Run from sm-pipeline/: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.linear_model import LogisticRegression
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "scripts"))
+
+import first_tier  # noqa: E402
+import first_tier_model  # noqa: E402
+
+HEADLINES = [
+    ("good", "profit rose sharply"), ("good", "profit rose again"), ("good", "shares rose"),
+    ("bad", "shares fell sharply"), ("bad", "profit fell again"), ("bad", "sales fell"),
+    ("neutral", "company holds meeting"), ("neutral", "meeting held again"),
+    ("neutral", "company names chair"),
+]
+
+
+def make_train_df(labels):
+    rows = [(f"{first_tier.LABEL_PREFIX}{label}", tokens) for (label, tokens) in HEADLINES
+            if label in labels]
+    return pd.DataFrame(rows, columns=["labels", "tokens"])
+
+
+class ExportTest(unittest.TestCase):
+
+    def assert_matches_classifier(self, train_df):
+        model = first_tier.train(train_df, "tokens", "labels")
+
+        vectorizer = CountVectorizer(analyzer=str.split, binary=True,
+                                     min_df=first_tier.MIN_TOKEN_COUNT)
+        features = vectorizer.fit_transform(train_df["tokens"])
+        classifier = LogisticRegression(max_iter=1000).fit(features, train_df["labels"])
+        probabilities = classifier.predict_proba(features)
+
+        labels = len(model["labels"])
+        self.assertEqual(labels, len(model["bias"]))
+        self.assertTrue(all(len(weights) == labels for weights in model["weights"].values()))
+        for (tokens, expected) in zip(train_df["tokens"], probabilities):
+            label, probability = first_tier_model.predict(model, tokens)
+            best = expected.argmax()
+            self.assertEqual(classifier.classes_[best], f"{first_tier.LABEL_PREFIX}{label}")
+            self.assertAlmostEqual(expected[best], probability, places=3)
+
+    def test_three_labels(self):
+        self.assert_matches_classifier(make_train_df({"good", "bad", "neutral"}))
+
+    def test_two_labels_export_a_row_per_label(self):
+        self.assert_matches_classifier(make_train_df({"good", "bad"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Tests for the new-row split and the fallbacks of scripts/incremental_training.py.
+
+Run from sm-pipeline/: python -m pytest tests
+"""
+import argparse
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "scripts"))
+
+import incremental_training  # noqa: E402
+import preprocessing  # noqa: E402
+
+ARGS = argparse.Namespace(vocabulary_drift_threshold=0.5, accuracy_loss_threshold=0.02,
+                          epochs=5, replay_ratio=4)
+
+
+def make_data_df(rows):
+    """data.csv rows as (label index, headline), in the column order preprocessing expects."""
+    return pd.DataFrame(rows)
+
+
+def make_train_df(data_df):
+    return preprocessing.create_output_df(data_df)
+
+
+class FakeModel:
+    """Stands in for the previous fastText model."""
+
+    def __init__(self, words):
+        self.words = words
+
+    def get_words(self):
+        return self.words
+
+
+class SplitNewRowsTest(unittest.TestCase):
+
+    def test_rows_after_trained_rows_are_new(self):
+        data_df = make_data_df([(1, "Profit rose"), (0, "Sales fell"), (2, "Plans announced")])
+        train_df = make_train_df(data_df)
+
+        new_df, old_df = incremental_training.split_new_rows(train_df, data_df, trained_rows=2)
+
+        self.assertEqual(list(new_df[preprocessing.TOKENS]), ["plans announced"])
+        self.assertEqual(list(old_df[preprocessing.TOKENS]), ["profit rose", "sales fell"])
+
+    def test_reingested_row_is_not_new(self):
+        data_df = make_data_df([(1, "Profit rose"), (0, "Sales fell"), (1, "PROFIT rose!"),
+                                (2, "Plans announced")])
+        train_df = make_train_df(data_df)
+
+        new_df, old_df = incremental_training.split_new_rows(train_df, data_df, trained_rows=2)
+
+        self.assertEqual(list(new_df[preprocessing.TOKENS]), ["plans announced"])
+        self.assertEqual(len(old_df), 3)
+
+    def test_no_added_rows(self):
+        data_df = make_data_df([(1, "Profit rose")])
+        train_df = make_train_df(data_df)
+
+        new_df, old_df = incremental_training.split_new_rows(train_df, data_df, trained_rows=1)
+
+        self.assertTrue(new_df.empty)
+        self.assertEqual(len(old_df), 1)
+
+
+class TrainFromPreviousTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_df = make_data_df([(1, "profit rose"), (0, "sales fell"),
+                                     (1, "profit rose again")])
+        self.train_df = make_train_df(self.data_df)
+        self.previous_model = FakeModel(["profit", "rose", "sales", "fell"])
+        self.incremental_model = FakeModel([])
+        patcher = mock.patch.object(incremental_training, "train_incremental",
+                                    return_value=(self.incremental_model, 0.1))
+        self.train_incremental = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def train_from_previous(self, accuracies, args=ARGS):
+        report = {}
+        with mock.patch.object(incremental_training, "accuracy",
+                               side_effect=lambda model, val_path: accuracies[model]):
+            model = incremental_training.train_from_previous(
+                self.previous_model, self.train_df, self.data_df, 2, Path("validation.csv"),
+                Path("work"), args, report)
+        return model, report
+
+    def test_accepts_incremental_model_within_accuracy_loss(self):
+        model, report = self.train_from_previous(
+            {self.previous_model: 0.80, self.incremental_model: 0.79})
+
+        self.assertIs(model, self.incremental_model)
+        self.assertEqual(report["mode"], incremental_training.INCREMENTAL)
+        self.assertEqual((report["new_rows"], report["replayed_rows"]), (1, 2))
+        self.assertAlmostEqual(report["vocabulary_drift"], 1 / 3)
+
+    def test_falls_back_on_vocabulary_drift(self):
+        args = argparse.Namespace(**{**vars(ARGS), "vocabulary_drift_threshold": 0.2})
+        model, report = self.train_from_previous({self.previous_model: 0.80}, args=args)
+
+        self.assertIsNone(model)
+        self.assertIn("vocabulary drift", report["reason"])
+        self.train_incremental.assert_not_called()
+
+    def test_falls_back_on_accuracy_loss(self):
+        model, report = self.train_from_previous(
+            {self.previous_model: 0.80, self.incremental_model: 0.70})
+
+        self.assertIsNone(model)
+        self.assertIn("accuracy loss", report["reason"])
+        self.assertNotIn("mode", report)
+
+
+class DescribeTrainingTimeTest(unittest.TestCase):
+
+    def package(self, model_data_url):
+        return {"InferenceSpecification": {"Containers": [{"ModelDataUrl": model_data_url}]}}
+
+    def test_reads_times_of_the_job_named_by_the_artifact(self):
+        sagemaker_client = mock.Mock()
+        sagemaker_client.describe_training_job.return_value = {
+            "TrainingTimeInSeconds": 95, "BillableTimeInSeconds": 90}
+
+        times = incremental_training.describe_training_time(sagemaker_client, self.package(
+            "s3://bucket/news-headlines/execution/Training/job-1/output/model.tar.gz"))
+
+        self.assertEqual(times, (95, 90))
+        sagemaker_client.describe_training_job.assert_called_once_with(TrainingJobName="job-1")
+
+    def test_artifact_without_training_job(self):
+        times = incremental_training.describe_training_time(
+            mock.Mock(), self.package("s3://bucket/model/model.tar.gz"))
+
+        self.assertEqual(times, (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
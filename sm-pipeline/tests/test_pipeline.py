@@ -0,0 +1,101 @@
+"""
+Tests that pipeline.py builds both definitions without AWS access and only rewrites changed ones.
+
+Run from sm-pipeline/: python -m pytest tests
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import botocore.endpoint
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline  # noqa: E402
+
+ROLE_ARN = "arn:aws:iam::123456789012:role/SageMakerRole"
+# credentials are never used, they only keep botocore from looking them up remotely
+OFFLINE_ENVIRONMENT = {"AWS_ACCESS_KEY_ID": "testing", "AWS_SECRET_ACCESS_KEY": "testing"}
+
+
+def refuse_network(*args, **kwargs):
+    raise AssertionError("the pipeline definition must be built without network access")
+
+
+class PipelineDefinitionTest(unittest.TestCase):
+
+    def build_definition(self, training_mode):
+        with mock.patch.dict(os.environ, OFFLINE_ENVIRONMENT), \
+                mock.patch.object(botocore.endpoint.Endpoint, "make_request", refuse_network), \
+                mock.patch.object(socket.socket, "connect", refuse_network):
+            builder = pipeline.PipelineBuilder(training_mode=training_mode, role=ROLE_ARN,
+                                               region="us-east-1")
+            return builder.definition()
+
+    def test_builds_every_training_mode_offline(self):
+        training_steps = {
+            pipeline.FULL_TRAINING_MODE: "Training",
+            pipeline.INCREMENTAL_TRAINING_MODE: "IncrementalTraining",
+        }
+        for (training_mode, training_step) in training_steps.items():
+            with self.subTest(training_mode=training_mode):
+                definition = self.build_definition(training_mode)
+                step_names = [step["Name"] for step in definition["Steps"]]
+                self.assertEqual(step_names[:2], ["Preprocessing", training_step])
+                self.assertEqual(step_names[-1], "QualityGate")
+
+    def test_quality_gate_fails_below_either_threshold(self):
+        for training_mode in [pipeline.FULL_TRAINING_MODE, pipeline.INCREMENTAL_TRAINING_MODE]:
+            with self.subTest(training_mode=training_mode):
+                definition = self.build_definition(training_mode)
+                parameter_names = [parameter["Name"] for parameter in definition["Parameters"]]
+                quality_gate = next(step for step in definition["Steps"]
+                                    if step["Name"] == "QualityGate")
+                arguments = quality_gate["Arguments"]
+
+                thresholds = {
+                    condition["LeftValue"]["Std:JsonGet"]["Path"]:
+                        (condition["Type"], condition["RightValue"])
+                    for condition in arguments["Conditions"]
+                }
+                self.assertEqual(thresholds, {
+                    "regression_metrics.accuracy.value":
+                        ("GreaterThanOrEqualTo", {"Get": "Parameters.AccuracyThreshold"}),
+                    "inference_metrics.latency_p99_ms.value":
+                        ("LessThanOrEqualTo", {"Get": "Parameters.ModelLatencyBudgetP99Ms"}),
+                })
+                self.assertIn("AccuracyThreshold", parameter_names)
+                self.assertIn("ModelLatencyBudgetP99Ms", parameter_names)
+                self.assertEqual([step["Type"] for step in arguments["IfSteps"]],
+                                 ["RegisterModel"])
+                self.assertEqual([step["Type"] for step in arguments["ElseSteps"]], ["Fail"])
+
+    def test_outputs_go_to_artifact_bucket_parameter(self):
+        definition = self.build_definition(pipeline.FULL_TRAINING_MODE)
+        parameter_names = [parameter["Name"] for parameter in definition["Parameters"]]
+        self.assertIn("ArtifactBucketName", parameter_names)
+        body = json.dumps(definition)
+        self.assertIn("Parameters.ArtifactBucketName", body)
+        self.assertNotIn("sagemaker-us-east-1-", body)
+
+    def test_write_definition_skips_unchanged_definition(self):
+        definition = self.build_definition(pipeline.FULL_TRAINING_MODE)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pipeline.json")
+            self.assertTrue(pipeline.write_definition(definition, path))
+            modified_at = os.stat(path).st_mtime_ns
+            self.assertFalse(pipeline.write_definition(definition, path))
+            self.assertEqual(os.stat(path).st_mtime_ns, modified_at)
+
+            definition["Parameters"].append({"Name": "Extra", "Type": "String"})
+            self.assertTrue(pipeline.write_definition(definition, path))
+            with open(path) as f:
+                self.assertEqual(json.load(f), definition)
+
+
+if __name__ == "__main__":
+    unittest.main()
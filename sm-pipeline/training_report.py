@@ -0,0 +1,94 @@
+"""
+Reports BlazingText training start-up and total time per input mode, File vs FastFile.
+
+For the Training step of recent executions of the model pipeline this prints the channel input
+mode, the time to first epoch (from the job start until the "Training" secondary status, i.e.
+provisioning plus data download or mount) and the total training time, then averages them per
+input mode.
+
+Only the File and FastFile input modes are compared. Supervised BlazingText trains on a single
+instance with a fully replicated train channel, so there is no sharded vs replicated comparison.
+
+EXAMPLE:
+    python training_report.py --pipeline-name NEWS-HEADLINES-PIPELINE --max-executions 20
+"""
+import collections
+import logging
+
+import boto3
+
+from report_utils import average, format_seconds, list_step_job_arns, parse_args
+
+TRAINING_STEP_NAME = "Training"
+TRAIN_CHANNEL = "train"
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    args = parse_args(__doc__)
+
+    sagemaker_client = boto3.client("sagemaker")
+    rows = [
+        describe_training_job(sagemaker_client, training_job_arn)
+        for (_, _, training_job_arn) in list_step_job_arns(
+            sagemaker_client, args.pipeline_name, args.max_executions,
+            step_names=[TRAINING_STEP_NAME], job_type="TrainingJob")
+    ]
+    print_report(rows)
+
+
+def describe_training_job(sagemaker_client, training_job_arn: str) -> dict:
+    """Extracts the input mode and timings of a training job.
+
+    Args:
+        sagemaker_client: The SageMaker client.
+        training_job_arn (str): The training job ARN.
+
+    Returns:
+        dict: The training job timings, in seconds, None while unavailable.
+    """
+    job = sagemaker_client.describe_training_job(TrainingJobName=training_job_arn.split("/")[-1])
+    train_channel = next(channel for channel in job["InputDataConfig"]
+                         if channel["ChannelName"] == TRAIN_CHANNEL)
+    input_mode = train_channel.get("InputMode", job["AlgorithmSpecification"]["TrainingInputMode"])
+
+    training_started_at = next((transition["StartTime"]
+                                for transition in job.get("SecondaryStatusTransitions", [])
+                                if transition["Status"] == "Training"), None)
+    time_to_first_epoch = None
+    if training_started_at is not None:
+        time_to_first_epoch = (training_started_at - job["CreationTime"]).total_seconds()
+    return {
+        "job": job["TrainingJobName"],
+        "input_mode": input_mode,
+        "instances": job["ResourceConfig"]["InstanceCount"],
+        "time_to_first_epoch": time_to_first_epoch,
+        "total_training_time": job.get("TrainingTimeInSeconds"),
+    }
+
+
+def print_report(rows: list):
+    """Prints one line per training job and the averages per input mode.
+
+    Args:
+        rows (list): The timings returned by describe_training_job.
+    """
+    print(f"{'job':<60} {'mode':<9} {'first epoch (s)':>16} {'total (s)':>10}")
+    groups = collections.defaultdict(list)
+    for row in rows:
+        print(f"{row['job']:<60} {row['input_mode']:<9} "
+              f"{format_seconds(row['time_to_first_epoch']):>16} "
+              f"{format_seconds(row['total_training_time']):>10}")
+        groups[row["input_mode"]].append(row)
+
+    print()
+    print(f"{'mode':<9} {'jobs':>5} {'first epoch (s)':>16} {'total (s)':>10}")
+    for input_mode, group in sorted(groups.items()):
+        print(f"{input_mode:<9} {len(group):>5} "
+              f"{format_seconds(average(group, 'time_to_first_epoch')):>16} "
+              f"{format_seconds(average(group, 'total_training_time')):>10}")
+
+
+if __name__ == "__main__":
+    main()